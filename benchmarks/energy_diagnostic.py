@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+import os
+import time
+import shutil
+import tempfile
+
+import click
+
+from veros import runtime_state as rst
+from veros.distributed import barrier
+
+"""
+Measures the cost of a single sample of the energy diagnostic on the global_4deg setup
+(or on the ACC setup on a grid of the same size, which does not need any forcing files).
+
+Not part of run_benchmarks.py, since this only times one diagnostic instead of whole time steps.
+"""
+
+
+def get_setup(setup):
+    if setup == 'global_4deg':
+        from veros.setup.global_4deg import GlobalFourDegreeSetup
+        return GlobalFourDegreeSetup(override=dict(
+            diskless_mode=True,
+            runlen=0.,
+        ))
+
+    from veros.setup.acc import ACCSetup
+    return ACCSetup(override=dict(
+        nx=90, ny=40, nz=15,
+        diskless_mode=True,
+        runlen=0.,
+    ))
+
+
+@click.option('--setup', type=click.Choice(['global_4deg', 'acc']), default='global_4deg')
+@click.option('--timesteps', type=int, default=5, help='Number of time steps before sampling')
+@click.option('--repetitions', type=int, default=100, help='Number of samples')
+@click.command()
+def main(setup, timesteps, repetitions):
+    outdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(outdir)
+
+    try:
+        sim = get_setup(setup)
+        sim.setup()
+
+        vs = sim.state
+        # spin up to get non-trivial fields
+        vs.runlen = timesteps * vs.dt_tracer
+        sim.run()
+
+        energy = vs.diagnostics['energy']
+        energy.initialize(vs)
+
+        timings = []
+        for _ in range(repetitions):
+            barrier()
+            start = time.perf_counter()
+            energy.diagnose(vs)
+            barrier()
+            timings.append(time.perf_counter() - start)
+
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(outdir)
+
+    if rst.proc_rank == 0:
+        timings.sort()
+        print('energy diagnostic on {} ({} x {} x {} cells), {} samples'.format(
+            setup, vs.nx, vs.ny, vs.nz, repetitions
+        ))
+        print('{:<10} {:>12}'.format('', 'time [ms]'))
+        print('{:<10} {:>12.3f}'.format('mean', 1e3 * sum(timings) / len(timings)))
+        print('{:<10} {:>12.3f}'.format('median', 1e3 * timings[len(timings) // 2]))
+        print('{:<10} {:>12.3f}'.format('min', 1e3 * timings[0]))
+
+
+if __name__ == '__main__':
+    main()
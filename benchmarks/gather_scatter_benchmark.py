@@ -0,0 +1,81 @@
+import time
+
+import click
+
+from veros import VerosLegacy, tools, distributed, runtime_state as rst
+from veros.variables import T_GRID, allocate
+
+
+class GatherScatterBenchmark(VerosLegacy):
+    """Times a full gather of a 3D array to rank 0 and the subsequent scatter back to all ranks,
+    as done for every ``dist_safe=False`` method and by the SciPy streamfunction solver.
+    """
+    def __init__(self, timesteps, *args, **kwargs):
+        self.repetitions = timesteps
+        super(GatherScatterBenchmark, self).__init__(*args, **kwargs)
+
+    def set_parameter(self, vs):
+        vs.identifier = 'gather_scatter_benchmark'
+        vs.diskless_mode = True
+
+    def set_grid(self, vs):
+        pass
+
+    def set_coriolis(self, vs):
+        pass
+
+    def set_topography(self, vs):
+        pass
+
+    def set_initial_conditions(self, vs):
+        pass
+
+    def set_forcing(self, vs):
+        pass
+
+    def set_diagnostics(self, vs):
+        pass
+
+    def after_timestep(self, vs):
+        pass
+
+    def setup(self):
+        if self.legacy_mode:
+            raise RuntimeError('gather / scatter benchmark has no Fortran equivalent')
+
+        vs = self.state
+        self.set_parameter(vs)
+
+        for setting, value in self.override_settings.items():
+            setattr(vs, setting, value)
+
+        distributed.validate_decomposition(vs)
+
+    def run(self):
+        vs = self.state
+        np = rst.backend_module
+
+        np.random.seed(123456789)
+        arr = allocate(vs, T_GRID)
+        arr[...] = np.random.randn(*arr.shape)
+
+        for _ in range(self.repetitions):
+            start = time.time()
+            global_arr = distributed.gather(vs, arr, T_GRID)
+            arr[...] = distributed.scatter(vs, global_arr, T_GRID)
+            distributed.barrier()
+            if rst.proc_rank == 0:
+                print('Time step took {:.2e}s'.format(time.time() - start))
+
+
+@click.option('-f', '--fortran', type=click.Path(exists=True), default=None)
+@click.option('--timesteps', type=int, default=100)
+@tools.cli
+def main(*args, **kwargs):
+    sim = GatherScatterBenchmark(*args, **kwargs)
+    sim.setup()
+    sim.run()
+
+
+if __name__ == '__main__':
+    main()
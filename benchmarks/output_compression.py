@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+import os
+import time
+import shutil
+import tempfile
+
+import click
+
+from veros.setup.global_4deg import GlobalFourDegreeSetup
+from veros.diagnostics import flush_output
+
+"""
+Compares write throughput and output size of snapshot output of the global_4deg setup
+for different compression settings.
+
+Not part of run_benchmarks.py, since this measures output sizes rather than time steps.
+"""
+
+CONFIGURATIONS = (
+    ('none', dict(compression='none')),
+    ('gzip-1', dict(compression='gzip', compression_level=1)),
+    ('gzip-1 + shuffle', dict(compression='gzip', compression_level=1, shuffle=True)),
+    ('gzip-6 + shuffle', dict(compression='gzip', compression_level=6, shuffle=True)),
+    ('lzf + shuffle', dict(compression='lzf', shuffle=True)),
+    ('blosc-zstd-3', dict(compression='blosc', compression_level=3, shuffle=True)),
+    ('zstd-3 + shuffle', dict(compression='zstd', compression_level=3, shuffle=True)),
+    ('gzip-1 + shuffle, 4 digits', dict(compression='gzip', compression_level=1, shuffle=True,
+                                        significant_digits=4)),
+    ('zstd-3 + shuffle, 3 digits', dict(compression='zstd', compression_level=3, shuffle=True,
+                                        significant_digits=3)),
+)
+
+
+def get_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+
+    total_size = 0
+    for root, _, files in os.walk(path):
+        total_size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total_size
+
+
+@click.option('--output-backend', type=click.Choice(['netcdf', 'zarr']), default='netcdf')
+@click.option('--repetitions', type=int, default=10, help='Number of snapshots per file')
+@click.command()
+def main(output_backend, repetitions):
+    outdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(outdir)
+
+    try:
+        sim = GlobalFourDegreeSetup(override=dict(
+            output_backend=output_backend,
+            restart_output_filename='',
+        ))
+        sim.setup()
+
+        vs = sim.state
+        snapshot = vs.diagnostics['snapshot']
+
+        results = []
+        for i, (name, options) in enumerate(CONFIGURATIONS):
+            snapshot.output_options = options
+            snapshot.output_path = 'compression_{}.snapshot.nc'.format(i)
+            snapshot.initialize(vs)
+            flush_output(vs)
+
+            start = time.time()
+            for _ in range(repetitions):
+                snapshot.output(vs)
+            flush_output(vs)
+            elapsed = time.time() - start
+
+            results.append((name, elapsed, get_size(snapshot.get_output_file_name(vs))))
+
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(outdir)
+
+    uncompressed_size = results[0][2]
+
+    print('{:<28} {:>12} {:>10} {:>8} {:>12}'.format(
+        'codec', 'write [s]', 'size [MB]', 'ratio', 'MB/s'
+    ))
+    for name, elapsed, size in results:
+        print('{:<28} {:>12.3f} {:>10.2f} {:>8.2f} {:>12.1f}'.format(
+            name, elapsed / repetitions, size / 1e6, uncompressed_size / size,
+            uncompressed_size / 1e6 / elapsed
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import time
+
+import click
+
+from veros import (
+    VerosLegacy, core, tools, runtime_settings as rs,
+    runtime_state as rst, distributed
+)
+from veros.core.density import gsw
+
+
+class ThreadingBenchmark(VerosLegacy):
+    """Times the kernels that are split into y-slabs when running with ``num_threads > 1``
+    (isoneutral_diffusion_pre, adv_flux_superbee, and GSW density).
+
+    Run with ``-t <num_threads>`` for different thread counts to measure scaling.
+    """
+    def __init__(self, timesteps, *args, **kwargs):
+        self.repetitions = timesteps
+        super(ThreadingBenchmark, self).__init__(*args, **kwargs)
+
+    def set_parameter(self, vs):
+        vs.identifier = 'threading_benchmark'
+        vs.diskless_mode = True
+        vs.dt_tracer = vs.dt_mom = 86400.
+        vs.enable_cyclic_x = True
+        vs.eq_of_state_type = 5
+        vs.enable_neutral_diffusion = True
+        vs.iso_slopec = 1e-3
+        vs.K_iso_0 = 1000.
+        vs.K_iso_steep = 50.
+        vs.iso_dslope = 1e-3
+
+    def setup(self):
+        if self.legacy_mode:
+            raise RuntimeError('threading benchmark has no Fortran equivalent')
+
+        vs = self.state
+        self.set_parameter(vs)
+
+        for setting, value in self.override_settings.items():
+            setattr(vs, setting, value)
+
+        distributed.validate_decomposition(vs)
+        vs.allocate_variables()
+
+        np = rst.backend_module
+        np.random.seed(123456789)
+        vs.dxt[...] = vs.dxu[...] = 1e4 * (1 + np.random.rand(*vs.dxt.shape))
+        vs.dyt[...] = vs.dyu[...] = 1e4 * (1 + np.random.rand(*vs.dyt.shape))
+        vs.dzt[...] = vs.dzw[...] = 10 * (1 + np.random.rand(*vs.dzt.shape))
+        vs.zt[...] = -np.cumsum(vs.dzt[::-1])[::-1]
+        vs.zw[...] = vs.zt + 0.5 * vs.dzt
+        vs.cost[...] = vs.cosu[...] = 1.
+
+        vs.kbot[2:-2, 2:-2] = np.random.randint(1, vs.nz, size=vs.kbot[2:-2, 2:-2].shape)
+        core.numerics.calc_topo(vs)
+
+        vs.salt[...] = 35 + np.random.randn(*vs.salt.shape)
+        vs.temp[...] = 20 + 5 * np.random.rand(*vs.temp.shape)
+        vs.u[...] = np.random.randn(*vs.u.shape)
+        vs.v[...] = np.random.randn(*vs.v.shape)
+        vs.w[...] = 1e-3 * np.random.randn(*vs.w.shape)
+        core.density.get_rho(vs, vs.salt[..., vs.tau], vs.temp[..., vs.tau], vs.zt)
+
+    def set_grid(self, vs):
+        pass
+
+    def set_coriolis(self, vs):
+        pass
+
+    def set_topography(self, vs):
+        pass
+
+    def set_initial_conditions(self, vs):
+        pass
+
+    def set_forcing(self, vs):
+        pass
+
+    def set_diagnostics(self, vs):
+        pass
+
+    def after_timestep(self, vs):
+        pass
+
+    def run(self):
+        vs = self.state
+        if rst.proc_rank == 0:
+            print('Running with {} thread(s)'.format(rs.num_threads))
+
+        for _ in range(self.repetitions):
+            start = time.time()
+            gsw.gsw_rho(vs, vs.salt[..., vs.tau], vs.temp[..., vs.tau], -vs.zt)
+            core.isoneutral.isoneutral_diffusion_pre(vs)
+            core.advection.adv_flux_superbee(
+                vs, vs.flux_east, vs.flux_north, vs.flux_top, vs.temp[..., vs.tau]
+            )
+            distributed.barrier()
+            if rst.proc_rank == 0:
+                print('Time step took {:.2e}s'.format(time.time() - start))
+
+
+@click.option('-f', '--fortran', type=click.Path(exists=True), default=None)
+@click.option('--timesteps', type=int, default=100)
+@tools.cli
+def main(*args, **kwargs):
+    sim = ThreadingBenchmark(*args, **kwargs)
+    sim.setup()
+    sim.run()
+
+
+if __name__ == '__main__':
+    main()
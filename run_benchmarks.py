@@ -20,11 +20,12 @@ Runs selected Veros benchmarks back to back and writes timing results to a YAML
 """
 
 TESTDIR = os.path.join(os.path.dirname(__file__), os.path.relpath('benchmarks'))
-COMPONENTS = ['numpy', 'numpy-mpi', 'bohrium', 'bohrium-opencl', 'bohrium-cuda', 'bohrium-mpi', 'fortran', 'fortran-mpi']
+COMPONENTS = ['numpy', 'numpy-mpi', 'numpy-threads', 'bohrium', 'bohrium-opencl', 'bohrium-cuda', 'bohrium-mpi', 'fortran', 'fortran-mpi']
 STATIC_SETTINGS = '-v debug -s nx {nx} -s ny {ny} -s nz {nz} -s default_float_type {float_type} --timesteps {timesteps}'
 BENCHMARK_COMMANDS = {
     'numpy': '{python} {filename} -b numpy ' + STATIC_SETTINGS,
     'numpy-mpi': '{mpiexec} -n {nproc} {python} {filename} -b numpy -n {decomp} ' + STATIC_SETTINGS,
+    'numpy-threads': '{python} {filename} -b numpy -t {nproc} ' + STATIC_SETTINGS,
     'bohrium': 'OMP_NUM_THREADS={nproc} BH_STACK=openmp BH_OPENMP_PROF=1 {python} {filename} -b bohrium '  + STATIC_SETTINGS,
     'bohrium-opencl': 'BH_STACK=opencl BH_OPENCL_PROF=1 {python} {filename} -b bohrium ' + STATIC_SETTINGS,
     'bohrium-cuda': 'BH_STACK=cuda BH_CUDA_PROF=1 {python} {filename} -b bohrium ' + STATIC_SETTINGS,
@@ -35,6 +36,7 @@ BENCHMARK_COMMANDS = {
 SLURM_COMMANDS = {
     'numpy': 'srun --ntasks 1 --cpus-per-task {nproc} -- {python} {filename} -b numpy ' + STATIC_SETTINGS,
     'numpy-mpi': 'srun --ntasks {nproc} --cpus-per-task 1 -- {python} {filename} -b numpy -n {decomp} ' + STATIC_SETTINGS,
+    'numpy-threads': 'srun --ntasks 1 --cpus-per-task {nproc} -- {python} {filename} -b numpy -t {nproc} ' + STATIC_SETTINGS,
     'bohrium': 'OMP_NUM_THREADS={nproc} BH_STACK=openmp BH_OPENMP_PROF=1 srun --ntasks 1 --cpus-per-task {nproc} -- {python} {filename} -b bohrium ' + STATIC_SETTINGS,
     'bohrium-opencl': 'BH_STACK=opencl BH_OPENCL_PROF=1 srun --ntasks 1 --cpus-per-task {nproc} -- {python} {filename} -b bohrium ' + STATIC_SETTINGS,
     'bohrium-cuda': 'BH_STACK=cuda BH_CUDA_PROF=1 srun --ntasks 1 --cpus-per-task {nproc} -- {python} {filename} -b bohrium ' + STATIC_SETTINGS,
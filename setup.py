@@ -38,6 +38,9 @@ EXTRAS_REQUIRE = {
         'codecov',
         'petsc4py',
         'mpi4py'
+    ],
+    'zarr': [
+        'zarr>=2.4,<3'
     ]
 }
 
@@ -46,7 +49,9 @@ CONSOLE_SCRIPTS = [
     'veros-run = veros.cli.veros_run:cli',
     'veros-copy-setup = veros.cli.veros_copy_setup:cli',
     'veros-resubmit = veros.cli.veros_resubmit:cli',
-    'veros-create-mask = veros.cli.veros_create_mask:cli'
+    'veros-create-mask = veros.cli.veros_create_mask:cli',
+    'veros-merge-output = veros.cli.veros_merge_output:cli',
+    'veros-restart-info = veros.cli.veros_restart_info:cli'
 ]
 
 PACKAGE_DATA = ['setup/*/assets.yml', 'setup/*/*.npy', 'setup/*/*.png']
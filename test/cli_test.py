@@ -32,3 +32,24 @@ def test_veros_copy_setup(runner):
 
             comparer = filecmp.dircmp(outpath, srcpath, ignore=ignore)
             assert not comparer.left_only and not comparer.right_only and not comparer.diff_files
+
+
+def test_veros_restart_info(runner, tmpdir):
+    import h5py
+    import numpy as np
+
+    restart_file = str(tmpdir.join('test.restart.h5'))
+    with h5py.File(restart_file, 'w') as f:
+        f.attrs['veros_grid_hash'] = 'abc'
+        f.create_dataset('snapshot/temp', data=np.zeros((4, 5, 3), dtype='float32'))
+        f['snapshot/temp'].attrs['dims'] = ['xt', 'yt', 'zt']
+        f['snapshot'].attrs['itt'] = 10
+
+    result = runner.invoke(veros.cli.veros_restart_info.cli, [restart_file])
+    assert result.exit_code == 0, result.output
+    assert 'veros_grid_hash = abc' in result.output
+    assert 'itt = 10' in result.output
+    assert 'float32' in result.output and '(4, 5, 3) (xt, yt, zt)' in result.output
+
+    result = runner.invoke(veros.cli.veros_restart_info.cli, [str(tmpdir.join('missing.h5'))])
+    assert result.exit_code != 0
@@ -160,6 +160,360 @@ def test_scatter(backend):
     run_dist_kernel(test_kernel)
 
 
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+def test_scatter_gather_1d(backend):
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    import numpy as np
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst, VerosState
+    from veros.distributed import scatter, gather
+
+    rs.backend = '{backend}'
+
+    global_arr = np.arange(12 * 3, dtype='float64').reshape(12, 3)
+
+    if rst.proc_num == 1:
+        import sys
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=4
+        )
+
+        res = np.empty((8, 3))
+        for proc in range(4):
+            comm.Recv(res, proc)
+            px = proc % 2
+            assert np.array_equal(res, global_arr[px * 4:px * 4 + 8])
+
+        res = np.empty((12, 3))
+        comm.Recv(res, 0)
+        assert np.array_equal(res, global_arr)
+
+    else:
+        rs.num_proc = (2, 2)
+
+        assert rst.proc_num == 4
+
+        vs = VerosState()
+        vs.nx = 8
+        vs.ny = 4
+
+        if rst.proc_rank == 0:
+            a = global_arr.copy()
+        else:
+            a = np.empty((8, 3))
+
+        b = scatter(vs, a, ('xt', None))
+
+        try:
+            b = b.copy2numpy()
+        except AttributeError:
+            pass
+
+        rs.mpi_comm.Get_parent().Send(b, 0)
+
+        c = gather(vs, b, ('xt', None))
+
+        if rst.proc_rank == 0:
+            try:
+                c = c.copy2numpy()
+            except AttributeError:
+                pass
+
+            rs.mpi_comm.Get_parent().Send(c, 0)
+
+    '''.format(
+        backend=backend
+    ))
+
+    run_dist_kernel(test_kernel)
+
+
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+def test_uneven_decomposition(backend):
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    import numpy as np
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst, VerosState
+    from veros.distributed import scatter, gather, validate_decomposition
+
+    rs.backend = '{backend}'
+
+    global_arr = np.arange(14 * 11 * 2, dtype='float64').reshape(14, 11, 2)
+    chunk_sizes = ((3, 7), (4, 3))
+
+    if rst.proc_num == 1:
+        import sys
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=4
+        )
+
+        for proc in range(4):
+            px, py = proc % 2, proc // 2
+            nx, ny = chunk_sizes[0][px], chunk_sizes[1][py]
+            ox, oy = sum(chunk_sizes[0][:px]), sum(chunk_sizes[1][:py])
+            res = np.empty((nx + 4, ny + 4, 2))
+            comm.Recv(res, proc)
+            assert np.array_equal(res, global_arr[ox:ox + nx + 4, oy:oy + ny + 4])
+
+        res = np.empty((14, 11, 2))
+        comm.Recv(res, 0)
+        assert np.array_equal(res, global_arr)
+
+    else:
+        rs.num_proc = (2, 2)
+
+        assert rst.proc_num == 4
+
+        vs = VerosState()
+        vs.nx = 10
+        vs.ny = 7
+        vs.chunk_sizes = chunk_sizes
+        validate_decomposition(vs)
+
+        if rst.proc_rank == 0:
+            a = global_arr.copy()
+        else:
+            a = np.empty((14, 11, 2))
+
+        b = scatter(vs, a, ('xt', 'yt', None))
+
+        try:
+            b = b.copy2numpy()
+        except AttributeError:
+            pass
+
+        rs.mpi_comm.Get_parent().Send(np.ascontiguousarray(b), 0)
+
+        c = gather(vs, b, ('xt', 'yt', None))
+
+        if rst.proc_rank == 0:
+            try:
+                c = c.copy2numpy()
+            except AttributeError:
+                pass
+
+            rs.mpi_comm.Get_parent().Send(c, 0)
+
+    '''.format(
+        backend=backend
+    ))
+
+    run_dist_kernel(test_kernel)
+
+
+def test_balanced_chunk_sizes():
+    import numpy as np
+    from veros.distributed import get_balanced_chunk_sizes
+
+    # land in the western half
+    weights = np.ones((40, 20), dtype='int')
+    weights[:20] = 0
+
+    chunks_x, chunks_y = get_balanced_chunk_sizes(weights, (4, 2))
+    assert sum(chunks_x) == 40 and sum(chunks_y) == 20
+    assert min(chunks_x) >= 2 and min(chunks_y) >= 2
+
+    offsets_x = np.cumsum((0,) + chunks_x)
+    offsets_y = np.cumsum((0,) + chunks_y)
+    loads = [
+        weights[offsets_x[i]:offsets_x[i + 1], offsets_y[j]:offsets_y[j + 1]].sum()
+        for i in range(4) for j in range(2)
+    ]
+    assert max(loads) == weights.sum() // 8
+
+
+@pytest.mark.parametrize('chunk_sizes, message', [
+    (((10,), (4, 3)), 'number of chunks in y-direction'),
+    (((9,), (7,)), 'do not add up'),
+])
+def test_validate_chunk_sizes_without_mpi(monkeypatch, chunk_sizes, message):
+    from veros import runtime_settings as rs, VerosState
+    from veros.distributed import validate_decomposition
+
+    monkeypatch.setattr(rs, 'mpi_comm', None)
+
+    vs = VerosState()
+    vs.nx = 10
+    vs.ny = 7
+    vs.chunk_sizes = chunk_sizes
+    with pytest.raises(ValueError, match=message):
+        validate_decomposition(vs)
+
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+def test_land_tiles(backend):
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    import numpy as np
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst, VerosState
+    from veros.distributed import scatter, gather, global_sum, exchange_overlap
+
+    rs.backend = '{backend}'
+
+    global_arr = np.arange(12 * 12, dtype='float64').reshape(12, 12)
+
+    if rst.proc_num == 1:
+        import sys
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=3
+        )
+
+        expected = global_arr.copy()
+        # land tile is not covered by any process
+        expected[6:, 6:] = 0
+
+        res = np.empty((12, 12))
+        comm.Recv(res, 0)
+        assert np.array_equal(res, expected)
+
+        res = np.empty(1)
+        comm.Recv(res, 0)
+        assert res[0] == global_arr[2:-2, 2:-2].sum() - global_arr[6:-2, 6:-2].sum()
+
+    else:
+        rs.num_proc = (2, 2)
+        rs.land_tiles = ((1, 1),)
+
+        assert rst.proc_num == 3
+
+        vs = VerosState()
+        vs.nx = 8
+        vs.ny = 8
+
+        if rst.proc_rank == 0:
+            a = global_arr.copy()
+        else:
+            a = np.empty((12, 12))
+
+        b = scatter(vs, a, ('xt', 'yt'))
+        exchange_overlap(vs, b, ('xt', 'yt'))
+        c = gather(vs, b, ('xt', 'yt'))
+        total = global_sum(vs, b[2:-2, 2:-2].sum())
+
+        if rst.proc_rank == 0:
+            try:
+                c = c.copy2numpy()
+            except AttributeError:
+                pass
+
+            rs.mpi_comm.Get_parent().Send(c, 0)
+            rs.mpi_comm.Get_parent().Send(np.array([float(total)]), 0)
+
+    '''.format(
+        backend=backend
+    ))
+
+    run_dist_kernel(test_kernel)
+
+
+def test_get_land_tiles():
+    import numpy as np
+    from veros.distributed import get_land_tiles
+
+    wet_cells = np.ones((12, 8), dtype='int')
+    wet_cells[4:, 4:] = 0
+    wet_cells[8:, :] = 0
+
+    land_tiles = get_land_tiles(wet_cells, ((4, 4, 4), (4, 4)))
+
+    # last column of tiles is all land, so one of its tiles is kept
+    assert land_tiles == ((1, 1), (2, 1))
+
+
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+def test_read_only_cache(backend):
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    import numpy as np
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst, VerosState, veros_method, distributed
+    from veros.variables import MAIN_VARIABLES, allocate
+
+    rs.backend = '{backend}'
+
+    if rst.proc_num == 1:
+        import sys
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=4
+        )
+
+        res = np.empty(6)
+        for proc in range(4):
+            comm.Recv(res, proc)
+            num_gathers, r1, r2, r3, num_gathers_2, unchanged = res
+            assert num_gathers == 1
+            assert r1 == r2 == 8
+            assert num_gathers_2 == 2
+            assert r3 == 12
+            assert unchanged
+
+    else:
+        rs.num_proc = (2, 2)
+
+        assert rst.proc_num == 4
+
+        vs = VerosState()
+        vs.nx = 8
+        vs.ny = 8
+        vs.variables['dxt'] = MAIN_VARIABLES['dxt']
+        vs.dxt = allocate(vs, ('xt',))
+        vs.dxt[...] = 1.
+
+        @veros_method(dist_safe=False, read_only_variables=['dxt'])
+        def get_dxt_sum(vs):
+            return float(vs.dxt[2:-2].sum())
+
+        calls = []
+        orig_gather = distributed.gather
+
+        def counting_gather(*args, **kwargs):
+            calls.append(1)
+            return orig_gather(*args, **kwargs)
+
+        distributed.gather = counting_gather
+
+        r1 = get_dxt_sum(vs)
+        r2 = get_dxt_sum(vs)
+        num_gathers = len(calls)
+
+        if rst.proc_rank == 1:
+            vs.dxt[...] += 1
+
+        dxt_before = vs.dxt.copy()
+        r3 = get_dxt_sum(vs)
+
+        res = np.array([num_gathers, r1, r2, r3, len(calls), np.array_equal(dxt_before, vs.dxt)], dtype='float64')
+        rs.mpi_comm.Get_parent().Send(res, 0)
+
+    '''.format(
+        backend=backend
+    ))
+
+    run_dist_kernel(test_kernel)
+
+
 @pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
 def test_acc(backend):
     test_kernel = dedent('''
@@ -244,3 +598,473 @@ def test_acc_nompirun(backend):
         '-s' 'diskless_mode', '1',
         '-s', 'runlen', '864000'
     ], stderr=subprocess.STDOUT)
+
+
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+def test_io_procs(backend, tmpdir):
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    import numpy as np
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst
+    from veros.setup.acc import ACCSetup
+
+    rs.backend = '{backend}'
+    rs.linear_solver = 'scipy'
+
+    class ACCOutput(ACCSetup):
+        def set_diagnostics(self, vs):
+            super(ACCOutput, self).set_diagnostics(vs)
+            vs.diagnostics['snapshot'].output_frequency = vs.dt_tracer * 2
+
+    def read_file(filename):
+        import h5netcdf
+        with h5netcdf.File(filename, 'r') as f:
+            return {{key: var[...] for key, var in f.variables.items()}}
+
+    settings = dict(
+        runlen=86400 * 4,
+        restart_output_filename='acc.restart.h5',
+    )
+
+    if MPI.Comm.Get_parent() == MPI.COMM_NULL:
+        import sys
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=3
+        )
+
+        os.chdir('{serial_dir}')
+        sim = ACCOutput(override=settings)
+        sim.setup()
+        sim.run()
+
+        # sent by I/O process when all output is written
+        assert comm.recv(source=2) == 'done'
+
+        reference = read_file(os.path.join('{serial_dir}', 'acc.snapshot.nc'))
+        result = read_file(os.path.join('{dist_dir}', 'acc.snapshot.nc'))
+
+        assert sorted(reference.keys()) == sorted(result.keys())
+        assert len(result['Time']) == 4
+        np.testing.assert_array_equal(reference['Time'], result['Time'])
+        np.testing.assert_array_equal(reference['xt'], result['xt'])
+
+        for var in ('temp', 'psi'):
+            scale = np.abs(reference[var]).max()
+            np.testing.assert_allclose(reference[var] / scale, result[var] / scale, rtol=0, atol=1e-5)
+
+        import h5py
+        with h5py.File(os.path.join('{dist_dir}', 'acc.restart.h5'), 'r') as f:
+            assert f['snapshot'].attrs['itt'] == sim.state.itt
+            assert f['snapshot']['temp'].shape == sim.state.temp.shape
+            assert f['averages']['temp'].shape == sim.state.temp.shape[:-1]
+
+    else:
+        rs.num_proc = (2, 1)
+        rs.num_io_procs = 1
+
+        os.chdir('{dist_dir}')
+        sim = ACCOutput(override=settings)
+
+        assert rst.proc_num == (1 if rst.is_io_proc else 2)
+
+        sim.setup()
+        sim.run()
+
+        if rst.is_io_proc:
+            MPI.Comm.Get_parent().send('done', dest=0)
+
+    '''.format(
+        backend=backend,
+        serial_dir=tmpdir.mkdir('serial'),
+        dist_dir=tmpdir.mkdir('dist'),
+    ))
+
+    run_dist_kernel(test_kernel)
+
+
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+def test_io_procs_error(backend, tmpdir):
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst
+    from veros.setup.acc import ACCSetup
+
+    rs.backend = '{backend}'
+    rs.linear_solver = 'scipy'
+
+    class ACCOutput(ACCSetup):
+        def set_diagnostics(self, vs):
+            super(ACCOutput, self).set_diagnostics(vs)
+            # cannot be written, since the directory does not exist
+            vs.diagnostics['snapshot'].output_path = os.path.join('missing', 'acc.snapshot.nc')
+            vs.diagnostics['snapshot'].output_frequency = vs.dt_tracer * 2
+
+    if MPI.Comm.Get_parent() == MPI.COMM_NULL:
+        import sys
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=3
+        )
+
+        # every compute process sees the error
+        assert comm.recv(source=0) == 'raised'
+        assert comm.recv(source=1) == 'raised'
+
+    else:
+        rs.num_proc = (2, 1)
+        rs.num_io_procs = 1
+
+        os.chdir('{dist_dir}')
+        sim = ACCOutput(override=dict(runlen=86400 * 4, restart_output_filename=''))
+        sim.setup()
+
+        if not rst.is_io_proc:
+            try:
+                sim.run()
+            except RuntimeError as e:
+                assert 'missing' in str(e), str(e)
+                result = 'raised'
+            else:
+                result = 'not raised'
+
+            MPI.Comm.Get_parent().send(result, dest=0)
+
+    '''.format(
+        backend=backend,
+        dist_dir=tmpdir.mkdir('dist'),
+    ))
+
+    run_dist_kernel(test_kernel)
+
+
+def test_io_procs_from_environment():
+    test_kernel = dedent('''
+    import os
+    os.environ['VEROS_NUM_IO_PROCS'] = '1'
+
+    from veros import runtime_settings as rs
+    from veros.diagnostics.io_tools import io_server
+
+    assert rs.num_io_procs == 1
+
+    # a single process cannot be split into compute and I/O processes
+    try:
+        io_server.init()
+    except RuntimeError as exc:
+        assert 'I/O processes' in str(exc)
+    else:
+        raise AssertionError('expected RuntimeError')
+    ''')
+
+    run_dist_kernel(test_kernel)
+
+
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+@pytest.mark.parametrize('async_output', [False, True])
+def test_zarr_output(backend, tmpdir, async_output):
+    pytest.importorskip('zarr')
+
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    import numpy as np
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst
+    from veros.setup.acc import ACCSetup
+
+    rs.backend = '{backend}'
+    rs.linear_solver = 'scipy'
+
+    class ACCOutput(ACCSetup):
+        def set_parameter(self, vs):
+            super(ACCOutput, self).set_parameter(vs)
+            if rst.proc_num > 1:
+                # chunks of the output arrays are shared between processes
+                vs.chunk_sizes = ((12, 18), (20, 22))
+
+        def set_diagnostics(self, vs):
+            super(ACCOutput, self).set_diagnostics(vs)
+            vs.diagnostics['snapshot'].output_frequency = vs.dt_tracer * 2
+
+    settings = dict(
+        runlen=86400 * 4,
+        restart_output_filename='',
+    )
+
+    if rst.proc_num == 1:
+        import sys
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=4
+        )
+
+        os.chdir('{serial_dir}')
+        sim = ACCOutput(override=settings)
+        sim.setup()
+        sim.run()
+
+        assert comm.recv(source=0) == 'done'
+
+        import h5netcdf
+        import zarr
+
+        with h5netcdf.File(os.path.join('{serial_dir}', 'acc.snapshot.nc'), 'r') as f:
+            reference = {{key: var[...] for key, var in f.variables.items()}}
+
+        group = zarr.open_group(os.path.join('{dist_dir}', 'acc.snapshot.zarr'), mode='r')
+        result = {{key: var[...] for key, var in group.arrays()}}
+
+        assert sorted(reference.keys()) == sorted(result.keys())
+        assert len(result['Time']) == 4
+        np.testing.assert_array_equal(reference['Time'], result['Time'])
+        np.testing.assert_array_equal(reference['xt'], result['xt'])
+
+        for var in ('temp', 'psi'):
+            scale = np.abs(reference[var]).max()
+            np.testing.assert_allclose(reference[var] / scale, result[var] / scale, rtol=0, atol=1e-5)
+
+    else:
+        rs.num_proc = (2, 2)
+
+        os.chdir('{dist_dir}')
+        sim = ACCOutput(override=dict(output_backend='zarr', enable_async_output={async_output}, **settings))
+        sim.setup()
+        sim.run()
+
+        if {async_output}:
+            from veros.diagnostics.io_tools import async_writer
+            # collective writes in the background use a communicator of their own
+            writer_comm = async_writer.get_writer(sim.state).comm
+            assert writer_comm is not None
+            assert MPI.Comm.Compare(writer_comm, rs.mpi_comm) == MPI.CONGRUENT
+
+        rs.mpi_comm.Barrier()
+        if rst.proc_rank == 0:
+            rs.mpi_comm.Get_parent().send('done', dest=0)
+
+    '''.format(
+        backend=backend,
+        async_output=async_output,
+        serial_dir=tmpdir.mkdir('serial'),
+        dist_dir=tmpdir.mkdir('dist'),
+    ))
+
+    run_dist_kernel(test_kernel)
+
+
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+def test_output_subset(backend, tmpdir):
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    import numpy as np
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst
+    from veros.setup.acc import ACCSetup
+
+    rs.backend = '{backend}'
+    rs.linear_solver = 'scipy'
+
+    class ACCOutput(ACCSetup):
+        def set_parameter(self, vs):
+            super(ACCOutput, self).set_parameter(vs)
+            if rst.proc_num > 1:
+                # coarse cells are split between processes
+                vs.chunk_sizes = ((13, 17), (21, 21))
+
+        def set_diagnostics(self, vs):
+            # only diagnostics with spatial subsets, which do not need parallel I/O
+            for name in ('snapshot', 'averages'):
+                diagnostic = vs.diagnostics[name]
+                diagnostic.output_frequency = vs.dt_tracer * 2
+                diagnostic.output_region = dict(x=slice(2, 28), y=(-30., 30.))
+                diagnostic.output_coarsening = dict(x=4, y=3, z=5)
+
+            vs.diagnostics['averages'].output_variables = ('temp', 'u', 'psi')
+            vs.diagnostics['averages'].sampling_frequency = vs.dt_tracer
+
+    settings = dict(
+        runlen=86400 * 4,
+        restart_output_filename='',
+    )
+
+    if rst.proc_num == 1:
+        import sys
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=4
+        )
+
+        os.chdir('{serial_dir}')
+        sim = ACCOutput(override=settings)
+        sim.setup()
+        sim.run()
+
+        assert comm.recv(source=0) == 'done'
+
+        import h5netcdf
+
+        def read_file(filename):
+            with h5netcdf.File(filename, 'r') as f:
+                return {{key: var[...] for key, var in f.variables.items()}}
+
+        for diagnostic in ('snapshot', 'averages'):
+            filename = 'acc.{{}}.nc'.format(diagnostic)
+            reference = read_file(os.path.join('{serial_dir}', filename))
+            result = read_file(os.path.join('{dist_dir}', filename))
+
+            assert sorted(reference.keys()) == sorted(result.keys())
+            assert reference['temp'].shape == (4, 3, 10, 7)
+
+            for var in ('xt', 'yu', 'zt', 'temp', 'u', 'psi'):
+                assert reference[var].shape == result[var].shape
+                scale = np.abs(reference[var]).max()
+                np.testing.assert_allclose(reference[var] / scale, result[var] / scale, rtol=0, atol=1e-5)
+
+    else:
+        rs.num_proc = (2, 2)
+
+        os.chdir('{dist_dir}')
+        sim = ACCOutput(override=settings)
+        sim.setup()
+        sim.run()
+
+        rs.mpi_comm.Barrier()
+        if rst.proc_rank == 0:
+            rs.mpi_comm.Get_parent().send('done', dest=0)
+
+    '''.format(
+        backend=backend,
+        serial_dir=tmpdir.mkdir('serial'),
+        dist_dir=tmpdir.mkdir('dist'),
+    ))
+
+    run_dist_kernel(test_kernel)
+
+
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+def test_per_process_output(backend, tmpdir):
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    import numpy as np
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst
+    from veros.setup.acc import ACCSetup
+
+    rs.backend = '{backend}'
+    rs.linear_solver = 'scipy'
+
+    class ACCOutput(ACCSetup):
+        def set_parameter(self, vs):
+            super(ACCOutput, self).set_parameter(vs)
+            if rst.proc_num > 1:
+                vs.chunk_sizes = ((12, 18), (20, 22))
+
+        def set_diagnostics(self, vs):
+            super(ACCOutput, self).set_diagnostics(vs)
+            vs.diagnostics['snapshot'].output_frequency = vs.dt_tracer * 2
+
+    settings = dict(
+        runlen=86400 * 4,
+        restart_output_filename='acc.restart.h5',
+    )
+
+    def read_file(filename):
+        import h5netcdf
+        with h5netcdf.File(filename, 'r') as f:
+            return {{key: var[...] for key, var in f.variables.items()}}
+
+    if rst.proc_num == 1:
+        import sys
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=4
+        )
+
+        os.chdir('{serial_dir}')
+        sim = ACCOutput(override=settings)
+        sim.setup()
+        sim.run()
+
+        assert comm.recv(source=0) == 'done'
+
+        from veros.diagnostics.io_tools import merge
+
+        snapshot_file = os.path.join('{dist_dir}', 'acc.snapshot.nc')
+        process_files = merge.find_process_files(snapshot_file)
+        assert len(process_files) == 4
+
+        import h5py
+        with h5py.File(process_files[0], 'r') as f:
+            assert f['temp'].compression == 'gzip'
+
+        merge.merge_files(process_files, snapshot_file)
+
+        reference = read_file(os.path.join('{serial_dir}', 'acc.snapshot.nc'))
+        result = read_file(snapshot_file)
+
+        assert sorted(reference.keys()) == sorted(result.keys())
+        np.testing.assert_array_equal(reference['Time'], result['Time'])
+        np.testing.assert_array_equal(reference['xt'], result['xt'])
+
+        for var in ('temp', 'psi'):
+            scale = np.abs(reference[var]).max()
+            np.testing.assert_allclose(reference[var] / scale, result[var] / scale, rtol=0, atol=1e-5)
+
+        # per-process restart files are merged when reading them
+        os.chdir('{restart_dir}')
+        restarted_sim = ACCOutput(override=dict(
+            runlen=86400, restart_output_filename='',
+            restart_input_filename=os.path.join('{dist_dir}', 'acc.restart.h5'),
+        ))
+        restarted_sim.setup()
+
+        assert os.path.isfile(os.path.join('{dist_dir}', 'acc.restart.h5'))
+        assert restarted_sim.state.itt == sim.state.itt
+
+        for var in ('temp', 'psi'):
+            reference, result = getattr(sim.state, var), getattr(restarted_sim.state, var)
+            scale = np.abs(reference).max()
+            np.testing.assert_allclose(reference / scale, result / scale, rtol=0, atol=1e-5)
+
+    else:
+        rs.num_proc = (2, 2)
+
+        os.chdir('{dist_dir}')
+        sim = ACCOutput(override=dict(enable_per_process_output=True, **settings))
+        sim.setup()
+        sim.run()
+
+        rs.mpi_comm.Barrier()
+        if rst.proc_rank == 0:
+            rs.mpi_comm.Get_parent().send('done', dest=0)
+
+    '''.format(
+        backend=backend,
+        serial_dir=tmpdir.mkdir('serial'),
+        dist_dir=tmpdir.mkdir('dist'),
+        restart_dir=tmpdir.mkdir('restart'),
+    ))
+
+    run_dist_kernel(test_kernel)
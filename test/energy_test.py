@@ -0,0 +1,140 @@
+import os
+import sys
+import subprocess
+
+from tempfile import NamedTemporaryFile
+from textwrap import dedent
+
+import pytest
+import numpy as np
+
+ON_GPU = os.environ.get('BH_STACK', '').lower() in ('opencl', 'cuda')
+
+# accumulated energy terms after 10 samples on ACC with IDEMIX, as computed by the
+# original implementation (one global sum per term)
+REFERENCE_VALUES = {
+    'Hd_diss_m': -459602441.1132021,
+    'Hd_m': -4.156867164438609e+19,
+    'adv_diss_m': -37240.47035314976,
+    'cabb_iso_m': -17735.113241964966,
+    'cabb_m': -242598973.80781087,
+    'dE_tot_m': 4656233635.499101,
+    'dHd_m': -452591707.99312454,
+    'dHd_sources_m': 0.0,
+    'deke_m': 13808787.445947962,
+    'diw_m': 587020315.7668774,
+    'dk_m': 576588574.6211342,
+    'dtke_m': -115589666.27501903,
+    'eke_diss_m': 576584.7479400074,
+    'eke_iw_m': 576584.7479400074,
+    'eke_m': 1538871231431.8052,
+    'eke_tke_m': 0.0,
+    'hd_eke_m': 43178.247030044884,
+    'iw_diss_m': 8845977.660557259,
+    'iw_forc_m': 594041666.245101,
+    'iw_m': 114867793216580.81,
+    'k_m': 31051202087058.734,
+    'ke_diss_m': 919115787.8977683,
+    'ke_eke_m': 14342193.946857926,
+    'ke_hd_m': 8748364.19943571,
+    'ke_iw_m': 1248042.4343901738,
+    'ke_tke_m': 903525551.5165199,
+    'tke_diss_m': 1819527816.3738022,
+    'tke_forc_m': 332007358.0555341,
+    'tke_hd_m': 459559262.866172,
+    'tke_m': -1829886128030.9343,
+    'wind_m': 1504452726.7183373,
+}
+
+# terms are summed in a different order than in the original implementation
+RTOL = 1e-9
+
+
+def run_acc():
+    """Energy terms after 10 samples on ACC with IDEMIX, ordered by name."""
+    from veros.setup.acc import ACCSetup
+
+    class ACCEnergy(ACCSetup):
+        def set_diagnostics(self, vs):
+            super(ACCEnergy, self).set_diagnostics(vs)
+            vs.diagnostics['energy'].sampling_frequency = vs.dt_tracer
+            vs.diagnostics['energy'].output_frequency = 365 * 86400.
+
+    sim = ACCEnergy(override=dict(diskless_mode=True, enable_idemix=True))
+    sim.setup()
+    sim.state.runlen = sim.state.dt_tracer * 10
+    sim.run()
+
+    diagnostic = sim.state.diagnostics['energy']
+    assert diagnostic.nitts == 10
+    return np.array([getattr(diagnostic, key) for key in sorted(diagnostic.variables)], dtype='float64')
+
+
+def check_result(result):
+    for key, val in zip(sorted(REFERENCE_VALUES), result):
+        np.testing.assert_allclose(val, REFERENCE_VALUES[key], rtol=RTOL, atol=0, err_msg=key)
+
+
+def test_energy_integrals():
+    from veros import runtime_settings as rs
+
+    old_linear_solver = rs.linear_solver
+    rs.linear_solver = 'scipy'
+    try:
+        result = run_acc()
+    finally:
+        rs.linear_solver = old_linear_solver
+
+    check_result(result)
+
+
+@pytest.mark.skipif(ON_GPU, reason='Cannot run MPI and OpenCL')
+def test_energy_integrals_distributed(backend):
+    test_kernel = dedent('''
+    import os
+    os.environ['OMP_NUM_THREADS'] = '1'
+
+    import sys
+    sys.path.insert(0, '{test_dir}')
+
+    import numpy as np
+    from mpi4py import MPI
+
+    from veros import runtime_settings as rs, runtime_state as rst
+    from energy_test import REFERENCE_VALUES, run_acc, check_result
+
+    rs.backend = '{backend}'
+    rs.linear_solver = 'scipy'
+
+    if rst.proc_num == 1:
+        comm = MPI.COMM_SELF.Spawn(
+            sys.executable,
+            args=['-m', 'mpi4py', sys.argv[-1]],
+            maxprocs=4
+        )
+
+        result = np.empty(len(REFERENCE_VALUES))
+        comm.Recv(result, 0)
+        check_result(result)
+
+    else:
+        rs.num_proc = (2, 2)
+
+        assert rst.proc_num == 4
+
+        result = run_acc()
+
+        if rst.proc_rank == 0:
+            rs.mpi_comm.Get_parent().Send(result, 0)
+    '''.format(
+        backend=backend,
+        test_dir=os.path.dirname(os.path.abspath(__file__))
+    ))
+
+    with NamedTemporaryFile(prefix='vs_test_', suffix='.py', mode='w') as f:
+        f.write(test_kernel)
+        f.flush()
+
+        subprocess.check_call(
+            [sys.executable, '-m', 'mpi4py', f.name], stderr=subprocess.STDOUT
+        )
@@ -0,0 +1,498 @@
+import os
+
+import numpy as np
+import pytest
+
+from veros.setup.acc import ACCSetup
+
+DIAGNOSTICS = ('snapshot', 'averages', 'overturning', 'energy')
+
+
+class ACCOutputTest(ACCSetup):
+    def set_diagnostics(self, vs):
+        super(ACCOutputTest, self).set_diagnostics(vs)
+        vs.diagnostics['averages'].sampling_frequency = vs.dt_tracer
+        for diag in DIAGNOSTICS:
+            vs.diagnostics[diag].output_frequency = vs.dt_tracer * 2
+        for diag in ('overturning', 'energy'):
+            vs.diagnostics[diag].sampling_frequency = vs.dt_tracer
+
+
+def _run_acc(outdir, setup_class=ACCOutputTest, **settings):
+    cwd = os.getcwd()
+    os.makedirs(outdir)
+    os.chdir(outdir)
+
+    try:
+        sim = setup_class(override=dict(restart_output_filename='', **settings))
+        sim.setup()
+        sim.state.runlen = sim.state.dt_tracer * 6
+        sim.run()
+    finally:
+        os.chdir(cwd)
+
+
+def _read_file(filename):
+    if filename.endswith('.zarr'):
+        import zarr
+        return {key: var[...] for key, var in zarr.open_group(filename, mode='r').arrays()}
+
+    import h5netcdf
+
+    with h5netcdf.File(filename, 'r') as f:
+        return {key: var[...] for key, var in f.variables.items()}
+
+
+def _compare_outputs(reference_dir, result_dir, result_extension='.nc'):
+    for diag in DIAGNOSTICS:
+        filename = 'acc.{}'.format(diag)
+        reference = _read_file(os.path.join(reference_dir, filename + '.nc'))
+        result = _read_file(os.path.join(result_dir, filename + result_extension))
+
+        assert sorted(reference.keys()) == sorted(result.keys())
+        assert len(reference['Time']) == 3
+
+        for key in reference:
+            np.testing.assert_array_equal(reference[key], result[key], err_msg='{}: {}'.format(filename, key))
+
+
+@pytest.mark.parametrize('io_queue_size', [1, 4])
+def test_async_output(tmpdir, io_queue_size):
+    sync_dir = os.path.join(str(tmpdir), 'sync')
+    async_dir = os.path.join(str(tmpdir), 'async')
+
+    _run_acc(sync_dir)
+    _run_acc(async_dir, enable_async_output=True, io_queue_size=io_queue_size)
+
+    _compare_outputs(sync_dir, async_dir)
+
+
+def test_keep_output_files_open(tmpdir):
+    from veros.diagnostics.io_tools import file_handles
+
+    reopen_dir = os.path.join(str(tmpdir), 'reopen')
+    keep_open_dir = os.path.join(str(tmpdir), 'keep_open')
+
+    _run_acc(reopen_dir, keep_output_files_open=False)
+
+    reused_before = file_handles.stats['reused']
+    _run_acc(keep_open_dir, keep_output_files_open=True, output_flush_frequency=2)
+
+    # every file is only opened once
+    assert file_handles.stats['reused'] - reused_before == 3 * len(DIAGNOSTICS)
+
+    _compare_outputs(reopen_dir, keep_open_dir)
+
+
+def test_zarr_output(tmpdir):
+    pytest.importorskip('zarr')
+
+    netcdf_dir = os.path.join(str(tmpdir), 'netcdf')
+    zarr_dir = os.path.join(str(tmpdir), 'zarr')
+
+    _run_acc(netcdf_dir)
+    _run_acc(zarr_dir, output_backend='zarr')
+
+    _compare_outputs(netcdf_dir, zarr_dir, result_extension='.zarr')
+
+
+@pytest.mark.parametrize('output_backend', ['netcdf', 'zarr'])
+@pytest.mark.parametrize('settings', [
+    dict(output_compression='none'),
+    dict(output_compression='gzip', output_compression_level=6, output_shuffle=True),
+    dict(output_compression='lzf'),
+])
+def test_output_compression(tmpdir, output_backend, settings):
+    if output_backend == 'zarr':
+        pytest.importorskip('zarr')
+
+    reference_dir = os.path.join(str(tmpdir), 'reference')
+    result_dir = os.path.join(str(tmpdir), 'result')
+
+    if output_backend == 'zarr' and settings['output_compression'] == 'lzf':
+        with pytest.raises(ValueError, match='not supported by Zarr'):
+            _run_acc(result_dir, output_backend=output_backend, **settings)
+        return
+
+    _run_acc(reference_dir)
+    _run_acc(result_dir, output_backend=output_backend, **settings)
+
+    result_extension = '.zarr' if output_backend == 'zarr' else '.nc'
+    _compare_outputs(reference_dir, result_dir, result_extension=result_extension)
+
+
+def test_output_options(tmpdir):
+    class ACCOutputOptionsTest(ACCOutputTest):
+        def set_diagnostics(self, vs):
+            super(ACCOutputOptionsTest, self).set_diagnostics(vs)
+            vs.diagnostics['snapshot'].output_options = dict(significant_digits=3)
+            vs.diagnostics['snapshot'].variable_output_options = {
+                'temp': dict(significant_digits=0, chunks={'Time': 2, 'zt': 1})
+            }
+
+    reference_dir = os.path.join(str(tmpdir), 'reference')
+    result_dir = os.path.join(str(tmpdir), 'result')
+
+    _run_acc(reference_dir)
+    _run_acc(result_dir, setup_class=ACCOutputOptionsTest, output_shuffle=True)
+
+    import h5netcdf
+
+    reference = _read_file(os.path.join(reference_dir, 'acc.snapshot.nc'))
+    result = _read_file(os.path.join(result_dir, 'acc.snapshot.nc'))
+
+    np.testing.assert_array_equal(reference['temp'], result['temp'])
+    np.testing.assert_array_equal(reference['xt'], result['xt'])
+    np.testing.assert_allclose(reference['salt'], result['salt'], rtol=1e-3)
+    assert not np.array_equal(reference['salt'], result['salt'])
+
+    with h5netcdf.File(os.path.join(result_dir, 'acc.snapshot.nc'), 'r') as f:
+        assert f.variables['temp'].chunks[:2] == (2, 1)
+        assert f.variables['salt'].attrs['significant_digits'] == 3
+        assert 'significant_digits' not in f.variables['temp'].attrs
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'float64'])
+@pytest.mark.parametrize('significant_digits', [1, 3, 5])
+def test_round_significant_digits(dtype, significant_digits):
+    from veros.diagnostics.io_tools.netcdf import round_significant_digits
+
+    np.random.seed(17)
+    data = (np.random.randn(1000) * 10. ** np.random.randint(-10, 10, size=1000)).astype(dtype)
+
+    rounded = round_significant_digits(data, significant_digits)
+
+    assert rounded.dtype == data.dtype
+    np.testing.assert_allclose(rounded, data, rtol=10. ** -significant_digits, atol=0)
+    # data only differs in the least significant bits
+    assert len(np.unique(rounded)) <= len(np.unique(data))
+    assert np.array_equal(round_significant_digits(rounded, significant_digits), rounded)
+
+
+@pytest.mark.parametrize('hdf5_version', [(1, 10, 1), (1, 10, 2)])
+def test_parallel_compression(tmpdir, monkeypatch, hdf5_version):
+    import h5py
+    import h5netcdf
+    from loguru import logger
+    from veros.diagnostics.io_tools import hdf5, netcdf
+
+    monkeypatch.setattr(h5py.version, 'hdf5_version_tuple', hdf5_version)
+    monkeypatch.setattr(hdf5, '_warned_parallel_filters', False)
+
+    var_spec = dict(
+        dims=('x',), dtype='float64', chunks=(5,), attrs={},
+        compression=dict(codec='gzip', level=1, shuffle=True)
+    )
+
+    messages = []
+    handler = logger.add(messages.append, level='WARNING')
+    try:
+        with h5netcdf.File(os.path.join(str(tmpdir), 'test.nc'), 'w') as f:
+            f.dimensions['x'] = 10
+            for key in ('a', 'b'):
+                netcdf.create_variable(f, key, var_spec, parallel=True)
+            compression = [f.variables[key].compression for key in ('a', 'b')]
+    finally:
+        logger.remove(handler)
+
+    if hdf5_version >= hdf5.PARALLEL_FILTERS_MIN_VERSION:
+        assert compression == ['gzip', 'gzip']
+        assert not messages
+    else:
+        assert compression == [None, None]
+        # warned only once
+        assert len(messages) == 1
+        assert 'enable_per_process_output' in messages[0]
+
+
+def test_parallel_write_without_dataset_access(tmpdir):
+    import h5netcdf
+    from veros.diagnostics.io_tools import netcdf
+
+    snapshot = netcdf.VariableSnapshot(
+        np.arange(10.), None, 1., ('x',), (slice(0, 10),), 0
+    )
+
+    with h5netcdf.File(os.path.join(str(tmpdir), 'test.nc'), 'w') as f:
+        f.dimensions['x'] = 10
+        f.create_variable('a', ('x',), 'float64')
+
+        # not opened through MPI-IO, so this is an ordinary write
+        netcdf.write_variable_snapshot('a', snapshot, f, parallel=True)
+        np.testing.assert_array_equal(f.variables['a'][...], np.arange(10.))
+
+    class OpaqueVariable(object):
+        name = 'a'
+
+    # h5netcdf does not expose datasets publicly, so this may change with any version
+    with pytest.raises(RuntimeError, match='enable_per_process_output'):
+        netcdf._get_h5_dataset(OpaqueVariable())
+
+def test_output_subset(tmpdir):
+    class ACCOutputSubsetTest(ACCOutputTest):
+        def set_diagnostics(self, vs):
+            super(ACCOutputSubsetTest, self).set_diagnostics(vs)
+            vs.diagnostics['snapshot'].output_region = dict(x=slice(5, 20), y=(-20., 20.), z=slice(-3, None))
+            vs.diagnostics['averages'].output_region = dict(x=slice(4, 20))
+            vs.diagnostics['averages'].output_coarsening = dict(x=4, y=3, z=5)
+
+    reference_dir = os.path.join(str(tmpdir), 'reference')
+    result_dir = os.path.join(str(tmpdir), 'result')
+
+    _run_acc(reference_dir)
+    _run_acc(result_dir, setup_class=ACCOutputSubsetTest)
+
+    reference = _read_file(os.path.join(reference_dir, 'acc.snapshot.nc'))
+    result = _read_file(os.path.join(result_dir, 'acc.snapshot.nc'))
+
+    yt = reference['yt']
+    y_slice = slice(np.argmax(yt >= -20.), len(yt) - np.argmax(yt[::-1] <= 20.))
+    subset_idx = dict(xt=slice(5, 20), xu=slice(5, 20), yt=y_slice, yu=y_slice,
+                      zt=slice(-3, None), zw=slice(-3, None))
+
+    import h5netcdf
+    with h5netcdf.File(os.path.join(reference_dir, 'acc.snapshot.nc'), 'r') as f:
+        dimensions = {key: var.dimensions for key, var in f.variables.items()}
+
+    assert sorted(reference.keys()) == sorted(result.keys())
+    for key in reference:
+        idx = tuple(subset_idx.get(dim, slice(None)) for dim in dimensions[key])
+        np.testing.assert_array_equal(reference[key][idx], result[key], err_msg=key)
+
+    # block averages weighted with cell volumes
+    grid = _read_file(os.path.join(reference_dir, 'acc.snapshot.nc'))
+    reference = _read_file(os.path.join(reference_dir, 'acc.averages.nc'))
+    result = _read_file(os.path.join(result_dir, 'acc.averages.nc'))
+
+    from veros.variables import FILL_VALUE
+
+    temp = np.ma.masked_equal(reference['temp'][:, :, :, 4:20], FILL_VALUE)
+    volume = (
+        grid['dzt'][:, np.newaxis, np.newaxis]
+        * (grid['dyt'] * np.cos(np.radians(grid['yt'])))[:, np.newaxis]
+        * grid['dxt'][4:20]
+    )
+    volume = np.ma.masked_array(np.broadcast_to(volume, temp.shape), mask=temp.mask)
+
+    nt, nz, ny, nx = temp.shape
+    block_shape = (nt, nz // 5, 5, ny // 3, 3, nx // 4, 4)
+    expected = (
+        (temp * volume).reshape(block_shape).sum(axis=(2, 4, 6))
+        / volume.reshape(block_shape).sum(axis=(2, 4, 6))
+    )
+
+    assert result['temp'].shape == expected.shape
+    assert result['xt'].shape == (4,)
+    np.testing.assert_array_equal(result['temp'] == FILL_VALUE, expected.mask)
+    np.testing.assert_allclose(result['temp'][~expected.mask], expected.compressed(), rtol=1e-10)
+
+
+@pytest.mark.parametrize('accumulator_dtype', [None, 'float32'])
+def test_average_statistics(tmpdir, accumulator_dtype):
+    class ACCStatisticsTest(ACCOutputTest):
+        def set_diagnostics(self, vs):
+            super(ACCStatisticsTest, self).set_diagnostics(vs)
+            vs.diagnostics['snapshot'].output_frequency = vs.dt_tracer
+            vs.diagnostics['averages'].accumulator_dtype = accumulator_dtype
+            vs.diagnostics['averages'].output_statistics = ('mean', 'variance', 'std', 'min', 'max')
+            vs.diagnostics['averages'].output_products = [('u', 'temp')]
+
+    outdir = os.path.join(str(tmpdir), 'statistics')
+    _run_acc(outdir, setup_class=ACCStatisticsTest)
+
+    snapshots = _read_file(os.path.join(outdir, 'acc.snapshot.nc'))
+    averages = _read_file(os.path.join(outdir, 'acc.averages.nc'))
+
+    # two samples per averaging interval
+    np.testing.assert_array_equal(snapshots['Time'][1::2], averages['Time'])
+
+    from veros.variables import FILL_VALUE
+
+    samples = {key: snapshots[key] for key in ('temp', 'u')}
+    samples['u_temp'] = samples['u'] * samples['temp']
+
+    # accumulators are rounded to float32, but sums are compensated
+    if accumulator_dtype is None:
+        rtol, mean_tol = 1e-10, 1e-13
+    else:
+        rtol, mean_tol = 1e-7, 1e-9
+
+    for key, sample in samples.items():
+        sample = sample.reshape((-1, 2) + sample.shape[1:])
+        mask = averages[key] == FILL_VALUE
+        expected = {
+            '': sample.mean(axis=1),
+            '_variance': sample.var(axis=1),
+            '_std': sample.std(axis=1),
+            '_min': sample.min(axis=1),
+            '_max': sample.max(axis=1),
+        }
+
+        # errors of the running mean are amplified in (small) deviations from it
+        mean_error = mean_tol * np.abs(expected[''])
+        atol = {
+            '_variance': 2 * mean_error * (expected['_std'] + mean_error),
+            '_std': 2 * mean_error,
+        }
+
+        for suffix, expected_values in expected.items():
+            result = averages[key + suffix]
+            np.testing.assert_array_equal(result == FILL_VALUE, mask, err_msg=key + suffix)
+
+            tolerance = rtol * np.abs(expected_values) + atol.get(suffix, 0)
+            assert np.all(np.abs(result - expected_values)[~mask] <= tolerance[~mask]), key + suffix
+
+
+@pytest.mark.parametrize('accumulator', ['sum', 'm2'])
+def test_compensated_average_accumulation(accumulator):
+    from veros.state import VerosState
+    from veros.diagnostics.averages import _add_to_sum, _get_sum, _COMPENSATED_ACCUMULATORS
+
+    np.random.seed(17)
+    num_samples, size = 1000, 10000
+    samples = 15. + np.random.randn(num_samples, size) * 10. ** np.random.uniform(-6, 1, size=size)
+
+    vs = VerosState()
+    acc = {
+        accumulator: np.zeros(size, dtype='float32'),
+        _COMPENSATED_ACCUMULATORS[accumulator]: np.zeros(size, dtype='float16'),
+    }
+    plain_sum = np.zeros(size, dtype='float32')
+    for sample in samples:
+        _add_to_sum(vs, acc, sample, accumulator=accumulator)
+        plain_sum += sample
+
+    reference = np.sum(samples, axis=0)
+    max_partial_sum = np.abs(np.cumsum(samples, axis=0)).max(axis=0)
+
+    error = np.abs(_get_sum(vs, acc, accumulator=accumulator) - reference)
+    assert np.all(error <= num_samples * 2. ** -36 * max_partial_sum)
+    # means are as accurate as a single rounding to float32
+    assert np.all(error / num_samples <= 2. ** -24 * np.abs(reference / num_samples))
+    assert error.max() < 0.01 * np.abs(plain_sum - reference).max()
+
+
+def test_regional_means(tmpdir):
+    from collections import OrderedDict
+
+    class ACCRegionalMeansTest(ACCOutputTest):
+        def set_diagnostics(self, vs):
+            super(ACCRegionalMeansTest, self).set_diagnostics(vs)
+            means = vs.diagnostics['regional_means']
+            means.output_variables = ['temp', 'forc_temp_surface']
+            means.output_integrals = True
+            means.regions = OrderedDict([
+                ('global', {}),
+                ('north', {'y': (0., 90.)}),
+                ('box', lambda vs: (vs.xt[:, np.newaxis] < 20.) & (vs.yt[np.newaxis, :] < 0.)),
+            ])
+            means.depth_bands = [(-1000., 0.), (-6000., -1000.)]
+            means.sampling_frequency = means.output_frequency = vs.dt_tracer * 2
+
+    outdir = os.path.join(str(tmpdir), 'regional_means')
+    _run_acc(outdir, setup_class=ACCRegionalMeansTest)
+
+    snapshots = _read_file(os.path.join(outdir, 'acc.snapshot.nc'))
+    means = _read_file(os.path.join(outdir, 'acc.regional_means.nc'))
+
+    # sampled and written in the same iterations as snapshots
+    np.testing.assert_array_equal(snapshots['Time'], means['Time'])
+
+    from veros.variables import FILL_VALUE
+
+    temp = np.ma.masked_equal(snapshots['temp'], FILL_VALUE)
+    forc = np.ma.masked_equal(snapshots['forc_temp_surface'], FILL_VALUE)
+    xt, yt, zt = snapshots['xt'], snapshots['yt'], snapshots['zt']
+    area = (snapshots['dyt'] * np.cos(np.radians(yt)))[:, np.newaxis] * snapshots['dxt']
+    volume = snapshots['dzt'][:, np.newaxis, np.newaxis] * area
+
+    region_masks = [
+        np.ones(area.shape, dtype='bool'),
+        np.broadcast_to((yt >= 0.)[:, np.newaxis], area.shape),
+        (xt[np.newaxis, :] < 20.) & (yt[:, np.newaxis] < 0.),
+    ]
+    band_masks = [(zt >= -1000.) & (zt < 0.), zt < -1000.]
+
+    for r, region_mask in enumerate(region_masks):
+        region_area = np.where(region_mask & ~forc.mask[0], area, 0.)
+        np.testing.assert_allclose(means['region_area'][r], region_area.sum(), rtol=1e-10)
+        np.testing.assert_allclose(
+            means['forc_temp_surface_integral'][:, r],
+            np.sum(forc.filled(0.) * region_area, axis=(1, 2)), rtol=1e-10
+        )
+        np.testing.assert_allclose(
+            means['forc_temp_surface'][:, r],
+            np.sum(forc.filled(0.) * region_area, axis=(1, 2)) / region_area.sum(), rtol=1e-10
+        )
+
+        for b, band_mask in enumerate(band_masks):
+            cell_volume = np.where(region_mask & band_mask[:, np.newaxis, np.newaxis] & ~temp.mask[0],
+                                   volume, 0.)
+            np.testing.assert_allclose(means['region_volume'][b, r], cell_volume.sum(), rtol=1e-10)
+            np.testing.assert_allclose(
+                means['temp'][:, b, r],
+                np.sum(temp.filled(0.) * cell_volume, axis=(1, 2, 3)) / cell_volume.sum(), rtol=1e-10
+            )
+
+
+def test_meridional_transport(tmpdir):
+    class ACCTransportTest(ACCOutputTest):
+        def set_diagnostics(self, vs):
+            super(ACCTransportTest, self).set_diagnostics(vs)
+            transport = vs.diagnostics['meridional_transport']
+            transport.zonal_mean_variables = ('temp', 'forc_temp_surface')
+            transport.basins = {'west': {'x': (0., 20.)}}
+            transport.sampling_frequency = transport.output_frequency = vs.dt_tracer * 2
+
+    outdir = os.path.join(str(tmpdir), 'meridional_transport')
+    _run_acc(outdir, setup_class=ACCTransportTest)
+
+    snapshots = _read_file(os.path.join(outdir, 'acc.snapshot.nc'))
+    result = _read_file(os.path.join(outdir, 'acc.meridional_transport.nc'))
+
+    # sampled and written in the same iterations as snapshots
+    np.testing.assert_array_equal(snapshots['Time'], result['Time'])
+
+    from veros.variables import FILL_VALUE
+
+    temp = np.ma.masked_equal(snapshots['temp'], FILL_VALUE)
+    salt = np.ma.masked_equal(snapshots['salt'], FILL_VALUE)
+    v = np.ma.masked_equal(snapshots['v'], FILL_VALUE).filled(0.)
+    xt, yt = snapshots['xt'], snapshots['yt']
+
+    # dimensions of snapshots are (Time, zt, yu, xt), basins are the second dimension of the output
+    area_v = (snapshots['dzt'][:, np.newaxis, np.newaxis]
+              * np.cos(np.radians(snapshots['yu']))[:, np.newaxis] * snapshots['dxt'])
+    temp_v = 0.5 * (temp[:, :, :-1] + temp[:, :, 1:]).filled(0.)
+    salt_v = 0.5 * (salt[:, :, :-1] + salt[:, :, 1:]).filled(0.)
+
+    in_basin = np.broadcast_to((xt >= 0.) & (xt <= 20.), (len(yt), len(xt)))
+    basin_masks_t = [np.ones_like(in_basin), in_basin]
+
+    for b, basin_mask_t in enumerate(basin_masks_t):
+        basin_mask_v = basin_mask_t[:-1] | basin_mask_t[1:]
+        expected = np.sum(v[:, :, :-1] * temp_v * area_v[:, :-1] * basin_mask_v, axis=-1)
+        result_temp = result['temp_transport'][:, b]
+        scale = np.abs(expected).max()
+        np.testing.assert_allclose(result_temp[:, :, :-1] / scale, expected / scale, rtol=0, atol=1e-12)
+
+        expected = np.sum(v[:, :, :-1] * salt_v * area_v[:, :-1] * basin_mask_v, axis=-1)
+        result_salt = result['salt_transport'][:, b]
+        scale = np.abs(expected).max()
+        np.testing.assert_allclose(result_salt[:, :, :-1] / scale, expected / scale, rtol=0, atol=1e-12)
+
+        np.testing.assert_allclose(result['heat_transport'][:, b],
+                                   1024. * 3991.86795711963 * result_temp.sum(axis=1), rtol=1e-12)
+
+        weights = np.where(basin_mask_t & ~temp.mask[0], snapshots['dxt'], 0.)
+        has_water = weights.sum(axis=-1) > 0
+        expected = np.sum(temp.filled(0.) * weights, axis=-1) / np.where(has_water, weights.sum(axis=-1), 1.)
+        np.testing.assert_array_equal(result['temp_zonal_mean'][:, b] == FILL_VALUE,
+                                      np.broadcast_to(~has_water, expected.shape))
+        np.testing.assert_allclose(result['temp_zonal_mean'][:, b][:, has_water],
+                                   expected[:, has_water], rtol=1e-12)
+
+        forc = np.ma.masked_equal(snapshots['forc_temp_surface'], FILL_VALUE)
+        weights = np.where(basin_mask_t & ~forc.mask[0], snapshots['dxt'], 0.)
+        expected = np.sum(forc.filled(0.) * weights, axis=-1) / weights.sum(axis=-1)
+        np.testing.assert_allclose(result['forc_temp_surface_zonal_mean'][:, b], expected, rtol=1e-12)
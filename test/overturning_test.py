@@ -0,0 +1,77 @@
+import numpy as np
+
+from veros.state import VerosState
+from veros.diagnostics.overturning import Overturning
+
+
+def test_integrate_below_isopycnals():
+    np.random.seed(17)
+    nx, ny, nz, nlevel = 12, 9, 7, 20
+
+    diag = Overturning.__new__(Overturning)
+    diag.nlevel = nlevel
+    diag.sigma = np.linspace(1030., 1040., nlevel)
+
+    sig = np.random.uniform(1028., 1042., size=(nx, ny, nz))
+    # values on sigma levels are not denser than the level
+    sig[0, :, 0] = diag.sigma[3]
+    weights = [np.random.randn(nx, ny, nz), np.random.rand(nx, ny, nz)]
+
+    result = diag._integrate_below_isopycnals(VerosState(), sig, weights)
+
+    assert result.shape == (len(weights), ny, nlevel)
+    for i, weight in enumerate(weights):
+        for m in range(nlevel):
+            expected = np.sum(np.where(sig > diag.sigma[m], weight, 0.), axis=(0, 2))
+            np.testing.assert_allclose(result[i, :, m], expected, rtol=1e-12, atol=1e-12)
+
+
+def _interpolate_reference(coords, arr, interp_coords):
+    """Previous implementation of Overturning._interpolate_along_axis (along axis 0)."""
+    diff = coords[np.newaxis, :, ...] - interp_coords[:, np.newaxis, ...]
+    diff_m = np.where(diff <= 0., np.abs(diff), np.inf)
+    diff_p = np.where(diff > 0., np.abs(diff), np.inf)
+    i_m = np.asarray(np.argmin(diff_m, axis=1))
+    i_p = np.asarray(np.argmin(diff_p, axis=1))
+    mask = np.all(np.isinf(diff_m), axis=1)
+    i_m[mask] = i_p[mask]
+    mask = np.all(np.isinf(diff_p), axis=1)
+    i_p[mask] = i_m[mask]
+    ii = np.indices(i_p.shape)
+    i_p_slice = (i_p,) + tuple(ii[1:])
+    i_m_slice = (i_m,) + tuple(ii[1:])
+    dx = (coords[i_p_slice] - coords[i_m_slice])
+    pos = np.where(dx == 0., 0., (coords[i_p_slice] - interp_coords) / (dx + 1e-12))
+    return arr[i_p_slice] * (1. - pos) + arr[i_m_slice] * pos
+
+
+def test_interpolate_along_axis():
+    np.random.seed(17)
+    ny, nz, nlevel = 9, 15, 60
+
+    diag = Overturning.__new__(Overturning)
+
+    # area (in m^2) and transport below isopycnals, constant for levels without any water
+    # in between (as computed by the diagnostic)
+    layer_area = 1e10 * np.random.rand(ny, nlevel) * (np.random.rand(ny, nlevel) > 0.6)
+    layer_trans = np.where(layer_area > 0, np.random.randn(ny, nlevel), 0.)
+    z_sig = np.cumsum(layer_area[:, ::-1], axis=1)[:, ::-1]
+    trans = np.cumsum(layer_trans[:, ::-1], axis=1)[:, ::-1]
+
+    # includes points outside the range of z_sig
+    zarea = np.sort(np.random.uniform(-0.5, 1.2, size=(ny, nz)) * z_sig.max(axis=1, keepdims=True), axis=1)
+    zarea[:, -1] = z_sig[:, 0]
+
+    expected = _interpolate_reference(z_sig.T, trans.T, zarea.T).T
+    result = diag._interpolate_along_axis(VerosState(), z_sig[:, ::-1], trans[:, ::-1], zarea, 1)
+    # reproduces the previous implementation exactly
+    np.testing.assert_array_equal(result, expected)
+
+    # increasing coordinates along the first axis
+    coords = np.sort(1e6 * np.random.randn(nlevel, ny), axis=0)
+    arr = np.random.randn(nlevel, ny)
+    interp_coords = 1.5e6 * np.random.randn(nz, ny)
+
+    expected = _interpolate_reference(coords, arr, interp_coords)
+    result = diag._interpolate_along_axis(VerosState(), coords, arr, interp_coords)
+    np.testing.assert_array_equal(result, expected)
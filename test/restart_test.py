@@ -1,6 +1,7 @@
 import os
 import tempfile
 import numpy as np
+import pytest
 
 from veros import VerosSetup, veros_method, settings, runtime_settings as rs
 
@@ -138,24 +139,47 @@ class ACC2(VerosSetup):
 class RestartTest:
     timesteps = 10
 
-    def __init__(self, backend):
+    def __init__(self, backend, static_restart=False, async_output=False, memmap=False):
         rs.backend = backend
         rs.linear_solver = 'scipy'
 
         self.restart_file = tempfile.NamedTemporaryFile(suffix='.h5', delete=False).name
+        self.static_file = None
 
         self.acc_no_restart = ACC2()
         self.acc_no_restart.state.restart_output_filename = self.restart_file
 
+        if static_restart:
+            self.static_file = self.restart_file.replace('.h5', '.static.h5')
+            self.acc_no_restart.state.restart_static_filename = self.static_file
+
+        if async_output:
+            self.acc_no_restart.state.enable_async_output = True
+
         self.acc_restart = ACC2()
         self.acc_restart.state.restart_input_filename = self.restart_file
         self.acc_restart.state.restart_output_filename = None
 
+        self.memmap = memmap
+        for acc in (self.acc_no_restart, self.acc_restart):
+            acc.state.enable_restart_memmap = memmap
+
     def run(self):
         self.acc_no_restart.setup()
+        if self.static_file is not None:
+            self.acc_no_restart.state.restart_frequency = 2 * self.acc_no_restart.state.dt_tracer
         self.acc_no_restart.state.runlen = self.acc_no_restart.state.dt_tracer * (self.timesteps - 5)
         self.acc_no_restart.run()
 
+        # restart files are moved into place when complete
+        assert not os.path.exists(self.restart_file + '.incomplete')
+
+        if self.static_file is not None:
+            self.check_links()
+
+        if self.memmap:
+            self.check_memmap()
+
         self.acc_restart.setup()
         self.acc_restart.state.runlen = self.acc_no_restart.state.dt_tracer * self.timesteps - self.acc_no_restart.state.time
         self.acc_restart.run()
@@ -164,8 +188,37 @@ class RestartTest:
         self.acc_no_restart.run()
 
         os.remove(self.restart_file)
+        if self.static_file is not None:
+            os.remove(self.static_file)
+
         return self.test_passed()
 
+    def check_links(self):
+        import h5py
+
+        with h5py.File(self.restart_file, 'r') as f:
+            links = {}
+            for group in f.values():
+                for key in group:
+                    links[key] = isinstance(group.get(key, getlink=True), h5py.ExternalLink)
+                    # links resolve to the static file
+                    assert group[key].dtype
+
+            # diagnostics are not active in this setup
+            assert links['trans']
+            assert not links['temp']
+
+    def check_memmap(self):
+        import h5py
+        from veros.diagnostics.io_tools.hdf5 import get_memmap
+
+        with h5py.File(self.restart_file, 'r') as f:
+            for group in f.values():
+                for key, dataset in group.items():
+                    memmap = get_memmap(dataset)
+                    assert memmap is not None
+                    np.testing.assert_array_equal(memmap, dataset[...])
+
     def test_passed(self):
         passed = True
 
@@ -210,3 +263,262 @@ class RestartTest:
 
 def test_restart(backend):
     assert RestartTest(backend=backend).run()
+
+
+def test_static_restart(backend):
+    assert RestartTest(backend=backend, static_restart=True).run()
+
+
+def test_async_restart(backend):
+    assert RestartTest(backend=backend, async_output=True).run()
+
+
+def test_memmap_restart(backend):
+    assert RestartTest(backend=backend, memmap=True).run()
+
+
+def test_interrupted_restart_write(tmpdir):
+    from veros.diagnostics.io_tools import hdf5 as h5tools
+
+    restart_file = str(tmpdir.join('test.restart.h5'))
+
+    def get_restart_data(data):
+        restart_data = h5tools.RestartData()
+        restart_data['group'] = dict(attributes={}, variables={
+            'var': dict(shape=(10,), dtype=np.dtype('float64'), chunks=None, kwargs={},
+                        dims=['x'], index=(slice(0, 10),), data=data)
+        })
+        return restart_data
+
+    h5tools.write_restart_file(restart_file, [get_restart_data(np.arange(10.))])
+
+    # data does not fit the dataset
+    with pytest.raises(Exception):
+        h5tools.write_restart_file(restart_file, [get_restart_data(np.arange(5.))])
+
+    import h5py
+    with h5py.File(restart_file, 'r') as f:
+        np.testing.assert_array_equal(f['group/var'][...], np.arange(10.))
+
+
+
+def test_restart_write_is_durable(tmpdir, monkeypatch):
+    from veros.diagnostics.io_tools import hdf5 as h5tools
+
+    restart_file = str(tmpdir.join('test.restart.h5'))
+    tmp_file = h5tools.get_temporary_file_name(restart_file)
+
+    synced = []
+    fsync = h5tools._fsync
+
+    def record_fsync(path):
+        synced.append((path, os.path.exists(restart_file)))
+        fsync(path)
+
+    monkeypatch.setattr(h5tools, '_fsync', record_fsync)
+
+    restart_data = h5tools.RestartData()
+    restart_data['group'] = dict(attributes={}, variables={
+        'var': dict(shape=(10,), dtype=np.dtype('float64'), chunks=None, kwargs={},
+                    dims=['x'], index=(slice(0, 10),), data=np.arange(10.))
+    })
+    h5tools.write_restart_file(restart_file, [restart_data])
+
+    # data is flushed before the file is moved into place, then the directory entry
+    expected = [(tmp_file, False)]
+    if os.name == 'posix':
+        expected.append((str(tmpdir), True))
+    assert synced == expected
+
+class ACC2NoLand(ACC2):
+    @veros_method
+    def set_topography(self, vs):
+        vs.kbot[...] = 1
+
+
+def test_restart_validation(tmpdir):
+    import h5py
+    from veros.diagnostics import restart_validation
+
+    rs.linear_solver = 'scipy'
+    restart_file = str(tmpdir.join('test.restart.h5'))
+
+    acc = ACC2()
+    acc.state.restart_output_filename = restart_file
+    acc.setup()
+    acc.state.runlen = acc.state.dt_tracer
+    acc.run()
+
+    acc_restart = ACC2()
+    acc_restart.setup()
+    assert restart_validation.validate_restart(acc_restart.state, restart_file) == []
+
+    # different topography and an unknown variable
+    acc_other = ACC2NoLand()
+    acc_other.setup()
+    with h5py.File(restart_file, 'r+') as f:
+        f['snapshot'].create_dataset('foo', data=np.zeros(3))
+        del f['snapshot/temp']
+        f['snapshot'].create_dataset('temp', data=np.zeros((4, 4, 4, 3)))
+
+    problems = restart_validation.validate_restart(acc_other.state, restart_file)
+    assert restart_validation.GRID_MISMATCH in problems
+    assert any(problem.startswith('snapshot: variable temp has shape') for problem in problems)
+    assert not any('foo' in problem for problem in problems)
+
+    # mismatching data is skipped before it is read
+    attributes, variables = acc_other.state.diagnostics['snapshot'].read_h5_restart(
+        acc_other.state, acc_other.state.variables, restart_file
+    )
+    assert 'temp' not in variables and 'foo' not in variables and 'salt' in variables
+
+    acc_strict = ACC2()
+    acc_strict.state.restart_input_filename = restart_file
+    acc_strict.state.enable_strict_restart_validation = True
+    with pytest.raises(RuntimeError, match='does not match the current setup'):
+        acc_strict.setup()
+
+
+def _get_active_setup(tmpdir, *diagnostics):
+    class ACC2Diagnostics(ACC2):
+        @veros_method
+        def set_diagnostics(self, vs):
+            output_dir = tempfile.mkdtemp(dir=str(tmpdir))
+            for name in diagnostics:
+                vs.diagnostics[name].sampling_frequency = vs.dt_tracer
+                vs.diagnostics[name].output_path = os.path.join(output_dir, '{}.nc'.format(name))
+
+    return ACC2Diagnostics
+
+
+def _write_restart_without_group(tmpdir, group, setup_class=ACC2):
+    import h5py
+
+    rs.linear_solver = 'scipy'
+    restart_file = str(tmpdir.join('test.restart.h5'))
+
+    acc = setup_class()
+    acc.state.restart_output_filename = restart_file
+    acc.setup()
+    acc.state.runlen = acc.state.dt_tracer
+    acc.run()
+
+    # restart files written before the diagnostic existed
+    with h5py.File(restart_file, 'r+') as f:
+        del f[group]
+
+    return acc, restart_file
+
+
+def test_restart_without_regional_means(tmpdir):
+    setup_class = _get_active_setup(tmpdir, 'regional_means')
+    acc, restart_file = _write_restart_without_group(tmpdir, 'regional_means', setup_class)
+
+    acc_restart = setup_class()
+    acc_restart.state.restart_input_filename = restart_file
+    acc_restart.setup()
+
+    diagnostic = acc_restart.state.diagnostics['regional_means']
+    assert diagnostic.nitts == 0
+    assert all(not np.any(arr) for arr in diagnostic.sums.values())
+    # other diagnostics are read as usual
+    assert acc_restart.state.itt == acc.state.itt
+
+
+def test_restart_without_meridional_transport(tmpdir):
+    setup_class = _get_active_setup(tmpdir, 'meridional_transport')
+    acc, restart_file = _write_restart_without_group(tmpdir, 'meridional_transport', setup_class)
+
+    acc_restart = setup_class()
+    acc_restart.state.restart_input_filename = restart_file
+    acc_restart.setup()
+
+    diagnostic = acc_restart.state.diagnostics['meridional_transport']
+    assert diagnostic.nitts == 0
+    for key in diagnostic._get_accumulators():
+        assert not np.any(getattr(diagnostic, key))
+    assert acc_restart.state.itt == acc.state.itt
+
+
+def test_restart_without_group_not_read(tmpdir):
+    # reading this group would fail, since its attributes are required
+    acc, restart_file = _write_restart_without_group(tmpdir, 'tracer_monitor')
+
+    acc_restart = ACC2()
+    acc_restart.state.restart_input_filename = restart_file
+    acc_restart.setup()
+    assert acc_restart.state.itt == acc.state.itt
+
+    acc_strict = ACC2()
+    acc_strict.state.restart_input_filename = restart_file
+    acc_strict.state.enable_strict_restart_validation = True
+    with pytest.raises(RuntimeError, match='tracer_monitor: no restart data'):
+        acc_strict.setup()
+
+
+def test_restart_inactive_diagnostics(tmpdir):
+    import h5py
+
+    rs.linear_solver = 'scipy'
+    restart_file = str(tmpdir.join('test.restart.h5'))
+
+    acc = ACC2()
+    acc.state.restart_output_filename = restart_file
+    acc.setup()
+    acc.state.runlen = acc.state.dt_tracer
+    acc.run()
+
+    # diagnostics without sampling or output frequency write no restart data
+    with h5py.File(restart_file, 'r') as f:
+        assert 'regional_means' not in f
+        assert 'meridional_transport' not in f
+
+    acc_strict = ACC2()
+    acc_strict.state.restart_input_filename = restart_file
+    acc_strict.state.enable_strict_restart_validation = True
+    acc_strict.setup()
+    assert acc_strict.state.itt == acc.state.itt
+
+
+def test_restart_accumulator_dtype(tmpdir):
+    from loguru import logger
+
+    def get_setup_class(accumulator_dtype):
+        class ACC2Averages(_get_active_setup(tmpdir, 'averages')):
+            @veros_method
+            def set_diagnostics(self, vs):
+                super(ACC2Averages, self).set_diagnostics(vs)
+                vs.diagnostics['averages'].output_variables = ['temp']
+                vs.diagnostics['averages'].output_statistics = ('mean', 'variance')
+                vs.diagnostics['averages'].accumulator_dtype = accumulator_dtype
+
+        return ACC2Averages
+
+    rs.linear_solver = 'scipy'
+    restart_file = str(tmpdir.join('test.restart.h5'))
+
+    acc = get_setup_class(None)()
+    acc.state.restart_output_filename = restart_file
+    acc.setup()
+    acc.state.runlen = acc.state.dt_tracer * 2
+    acc.run()
+
+    acc_restart = get_setup_class('float32')()
+    acc_restart.state.restart_input_filename = restart_file
+
+    messages = []
+    handler = logger.add(messages.append, level='WARNING')
+    try:
+        acc_restart.setup()
+    finally:
+        logger.remove(handler)
+
+    diagnostic = acc_restart.state.diagnostics['averages']
+    assert diagnostic.average_nitts == 2
+    accumulators = diagnostic.average_vars['temp'].accumulators
+    assert set(accumulators) == {'sum', 'm2', 'compensation', 'm2_compensation'}
+    assert accumulators['sum'].dtype == accumulators['m2'].dtype == np.dtype('float32')
+
+    # converted with a warning, missing compensation terms are no problem
+    assert sum('converting it to float32' in message for message in messages) == 2
+    assert not any('No restart data for accumulators' in message for message in messages)
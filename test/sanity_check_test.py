@@ -0,0 +1,46 @@
+import re
+
+import numpy as np
+import pytest
+
+from veros.setup.acc import ACCSetup
+
+
+class ACCDivergenceTest(ACCSetup):
+    # the model becomes slow once it diverged, so keep the latency short
+    diverge_at = 5
+
+    def set_diagnostics(self, vs):
+        for diagnostic in vs.diagnostics.values():
+            diagnostic.sampling_frequency = diagnostic.output_frequency = 0
+
+    def after_timestep(self, vs):
+        if vs.itt == self.diverge_at:
+            vs.u[5, 5, -1, vs.taup1] = np.nan
+
+
+@pytest.mark.parametrize('sanity_check_interval', [1, 2])
+def test_divergence_latency(sanity_check_interval):
+    sim = ACCDivergenceTest(override=dict(
+        restart_output_filename='', diskless_mode=True, sanity_check_interval=sanity_check_interval
+    ))
+    sim.setup()
+    sim.state.runlen = sim.state.dt_tracer * 20
+
+    with pytest.raises(RuntimeError) as excinfo:
+        sim.run()
+
+    detected_at = int(re.search(r'iteration (\d+)', str(excinfo.value)).group(1))
+    assert ACCDivergenceTest.diverge_at <= detected_at < ACCDivergenceTest.diverge_at + sanity_check_interval
+
+
+def test_check_before_output():
+    sim = ACCDivergenceTest(override=dict(
+        restart_output_filename='', diskless_mode=True, sanity_check_interval=0
+    ))
+    sim.setup()
+    sim.state.runlen = sim.state.dt_tracer * 20
+    sim.state.diagnostics['snapshot'].output_frequency = sim.state.dt_tracer * 6
+
+    with pytest.raises(RuntimeError, match='iteration 6'):
+        sim.run()
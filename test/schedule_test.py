@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from veros.state import VerosState
+from veros.time import parse_period
+from veros.diagnostics.schedule import Schedule, get_next_iteration
+
+
+def test_parse_period():
+    assert parse_period(3600.) == 3600.
+    assert parse_period(None) == 0.
+    assert parse_period('90') == 90.
+    assert parse_period('6 hours') == 6 * 3600.
+    assert parse_period('1 month') == 30 * 86400.
+    assert parse_period('12 months') == parse_period('1 year') == 360 * 86400.
+
+    with pytest.raises(ValueError):
+        parse_period('1 fortnight')
+
+    with pytest.raises(ValueError):
+        parse_period('every day')
+
+
+@pytest.mark.parametrize('dt, period', [
+    (1., 1.), (1., 3.), (2., 3.), (4., 3.), (3., 10.), (86400., 30 * 86400.)
+])
+def test_next_iteration(dt, period):
+    # times are exact, so checking the modulo is safe
+    due = [itt for itt in range(200) if (itt * dt) % period < dt]
+
+    scheduled = []
+    itt = get_next_iteration(0., 0, dt, period)
+    while itt < 200:
+        scheduled.append(itt)
+        itt = get_next_iteration((itt + 1) * dt, itt + 1, dt, period)
+
+    assert scheduled == due
+
+
+def test_accumulated_time():
+    vs = VerosState()
+    vs.dt_tracer = 0.1
+    schedule = Schedule()
+
+    due = []
+    for _ in range(3000):
+        vs.itt += 1
+        vs.time += vs.dt_tracer
+        if schedule.is_due(vs, 'test', 0.3):
+            due.append(vs.itt)
+
+    # rounding errors in the model time must not cause missed or duplicate events
+    assert due == list(range(3, 3001, 3))
+
+
+def test_event_calendar(tmpdir):
+    from veros.diagnostics import get_event_calendar
+    from output_test import ACCOutputTest, _read_file
+
+    class ACCScheduleTest(ACCOutputTest):
+        def set_diagnostics(self, vs):
+            super(ACCScheduleTest, self).set_diagnostics(vs)
+            vs.diagnostics['snapshot'].output_frequency = '1 day'
+            vs.restart_frequency = 3 * vs.dt_tracer
+
+    cwd = os.getcwd()
+    os.chdir(str(tmpdir))
+
+    try:
+        sim = ACCScheduleTest(override=dict(restart_output_filename='acc.restart.h5'))
+        sim.setup()
+        vs = sim.state
+        vs.runlen = 6 * vs.dt_tracer
+
+        calendar = get_event_calendar(vs)
+        sim.run()
+    finally:
+        os.chdir(cwd)
+
+    def get_iterations(name):
+        return [event.iteration for event in calendar if event.name == name]
+
+    steps_per_day = int(86400. / vs.dt_tracer)
+    assert get_iterations('snapshot:output') == list(range(steps_per_day, 7, steps_per_day))
+    assert get_iterations('averages:output') == [2, 4, 6]
+    assert get_iterations('averages:sampling') == [1, 2, 3, 4, 5, 6]
+    assert get_iterations('restart') == [0, 3, 6]
+    assert all(event.time == event.iteration * vs.dt_tracer for event in calendar)
+
+    for name in ('snapshot', 'averages'):
+        output = _read_file(str(tmpdir.join('acc.{}.nc'.format(name))))
+        assert len(output['Time']) == len(get_iterations('{}:output'.format(name)))
@@ -0,0 +1,138 @@
+import os
+import sys
+import subprocess
+import types
+import threading
+import textwrap
+
+import pytest
+import numpy as np
+
+from veros import runtime_settings as rs, veros_method
+from veros.threads import slab_parallel, get_thread_pool
+
+
+def _run_acc(num_threads, timesteps=4):
+    from veros.setup.acc import ACCSetup
+
+    rs.num_threads = num_threads
+
+    sim = ACCSetup(override=dict(
+        diskless_mode=True,
+        eq_of_state_type=5,
+        enable_superbee_advection=True,
+    ))
+    sim.setup()
+    sim.state.runlen = sim.state.dt_tracer * timesteps
+    sim.run()
+    return sim.state
+
+
+def test_slab_parallel_consistency():
+    old_num_threads = rs.num_threads
+
+    try:
+        reference = _run_acc(num_threads=1)
+        threaded = _run_acc(num_threads=4)
+    finally:
+        rs.num_threads = old_num_threads
+
+    for var in sorted(reference.variables.keys()):
+        arr_1, arr_2 = getattr(reference, var), getattr(threaded, var)
+        try:
+            arr_1, arr_2 = arr_1.copy2numpy(), arr_2.copy2numpy()
+        except AttributeError:
+            pass
+
+        np.testing.assert_array_equal(arr_1, arr_2, err_msg=var)
+
+
+def test_slab_bounds():
+    from veros.threads import get_slab_bounds
+    assert get_slab_bounds(10, 3) == [(0, 4), (4, 7), (7, 10)]
+
+
+@slab_parallel(y_args=['arr'])
+@veros_method
+def _scale_by_sum(vs, arr, weights):
+    return arr * weights.sum()
+
+
+def test_slab_parallel_declared_args():
+    from veros.setup.acc import ACCSetup
+
+    old_num_threads = rs.num_threads
+
+    try:
+        sim = ACCSetup(override=dict(diskless_mode=True))
+        sim.setup()
+        vs = sim.state
+
+        arr = np.random.rand(vs.nx + 4, vs.ny + 4, vs.nz)
+        # not declared, so must not be sliced although its second axis has length ny + 4
+        weights = np.random.rand(vs.nz, vs.ny + 4)
+
+        rs.num_threads = 1
+        reference = _scale_by_sum(vs, arr, weights)
+        reference_partial = _scale_by_sum(vs, arr[:, 2:-2], weights)
+
+        rs.num_threads = 4
+        np.testing.assert_array_equal(_scale_by_sum(vs, arr, weights), reference)
+        # arguments that do not cover all rows are processed without splitting
+        np.testing.assert_array_equal(_scale_by_sum(vs, arr[:, 2:-2], weights), reference_partial)
+    finally:
+        rs.num_threads = old_num_threads
+
+
+def test_slab_parallel_unknown_arg():
+    with pytest.raises(ValueError):
+        @slab_parallel(y_args=['foo'])
+        @veros_method
+        def kernel(vs, arr):
+            pass
+
+
+def test_backend_injection_threads(monkeypatch):
+    from veros.state import VerosState
+
+    # module without np
+    module = types.ModuleType('veros_backend_test')
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    namespace = vars(module)
+    namespace['veros_method'] = veros_method
+    exec(textwrap.dedent('''
+        @veros_method
+        def wait(vs, started, event):
+            started.set()
+            event.wait()
+            return np.zeros(1)
+
+        @veros_method
+        def noop(vs):
+            return np.zeros(1)
+    '''), namespace)
+
+    vs = VerosState()
+    started, event = threading.Event(), threading.Event()
+
+    future = get_thread_pool().submit(namespace['wait'], vs, started, event)
+    try:
+        assert started.wait(timeout=10)
+        # finishing in this thread must not remove np while the slab worker still runs
+        namespace['noop'](vs)
+        assert 'np' in namespace
+    finally:
+        event.set()
+
+    np.testing.assert_array_equal(future.result(), np.zeros(1))
+    assert 'np' not in namespace
+
+
+def test_num_threads_from_environment():
+    env = dict(os.environ, VEROS_NUM_THREADS='4')
+    out = subprocess.check_output([sys.executable, '-c', textwrap.dedent('''
+        from veros import runtime_settings as rs
+        from veros.threads import _get_num_slabs
+        print(repr(rs.num_threads), _get_num_slabs(40))
+    ''')], env=env)
+    assert out.decode().split() == ['4', '4']
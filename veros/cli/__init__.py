@@ -12,8 +12,12 @@ if not have_click:
 del click
 del have_click
 
-from . import veros, veros_copy_setup, veros_create_mask, veros_resubmit
+from . import (
+    veros, veros_copy_setup, veros_create_mask, veros_resubmit, veros_merge_output, veros_restart_info
+)
 
 veros.cli.add_command(veros_copy_setup.cli, 'copy-setup')
 veros.cli.add_command(veros_create_mask.cli, 'create-mask')
 veros.cli.add_command(veros_resubmit.cli, 'resubmit')
+veros.cli.add_command(veros_merge_output.cli, 'merge-output')
+veros.cli.add_command(veros_restart_info.cli, 'restart-info')
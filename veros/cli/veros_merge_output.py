@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+import os
+import functools
+
+import click
+
+
+def merge_output(files, delete=False):
+    """Reassembles output and restart files that were written by every process separately
+    (with enable_per_process_output).
+
+    FILES are the names of the merged files (as they would have been written without
+    enable_per_process_output), e.g. "veros merge-output acc.snapshot.nc acc_0010.restart.h5".
+
+    """
+    from veros.diagnostics.io_tools import merge
+
+    for filename in files:
+        process_files = merge.find_process_files(filename)
+        if not process_files:
+            raise click.UsageError('no per-process files found for {}'.format(filename))
+
+        merge.merge_files(process_files, filename)
+
+        if delete:
+            for process_file in process_files:
+                os.remove(process_file)
+
+
+@click.command('veros-merge-output')
+@click.argument('files', nargs=-1, required=True, type=click.Path(dir_okay=False))
+@click.option('--delete', is_flag=True, help='Delete per-process files after merging')
+@functools.wraps(merge_output)
+def cli(*args, **kwargs):
+    merge_output(*args, **kwargs)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import inspect
+import functools
+import importlib.util
+
+import click
+
+from veros.tools.cli import VerosSetting
+
+
+def load_setup(setup_file):
+    """Import a setup script and return the setup class defined in it."""
+    from veros import VerosSetup
+
+    module_name = os.path.splitext(os.path.basename(setup_file))[0]
+    spec = importlib.util.spec_from_file_location(module_name, setup_file)
+    module = importlib.util.module_from_spec(spec)
+    # needed to look up the module of setup methods
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+
+    setup_classes = [
+        obj for obj in vars(module).values()
+        if inspect.isclass(obj) and issubclass(obj, VerosSetup) and obj.__module__ == module.__name__
+    ]
+    if len(setup_classes) != 1:
+        raise click.UsageError('{} must define exactly one Veros setup (found {})'
+                               .format(setup_file, len(setup_classes)))
+
+    return setup_classes[0]
+
+
+def restart_info(restart_file, setup=None, override=()):
+    """Shows the contents of a Veros restart file without reading any data.
+
+    Lists all attributes and the shape and data type of all variables in RESTART_FILE
+    (which may also be the merged name of restart files that were written by every
+    process separately).
+
+    If a setup script is given, the setup is run (without reading the restart file or
+    writing any output) and the restart file is validated against it instead. Exits with
+    status 1 if the file does not match.
+
+    """
+    from veros.diagnostics import restart_validation
+    from veros.diagnostics.io_tools import hdf5 as h5tools
+
+    try:
+        metadata_file = restart_validation.find_restart_file(restart_file)
+    except IOError as e:
+        raise click.UsageError(str(e))
+
+    if setup is None:
+        file_attributes, groups = h5tools.read_restart_metadata(metadata_file)
+        for key, val in sorted(file_attributes.items()):
+            click.echo('{} = {}'.format(key, val))
+
+        for name, group in sorted(groups.items()):
+            click.echo('\n[{}]'.format(name))
+            for key, val in sorted(group.attributes.items()):
+                click.echo('  {} = {}'.format(key, val))
+            for key, var in sorted(group.variables.items()):
+                click.echo('  {:<30} {:<10} {} ({})'.format(
+                    key, str(var.dtype), var.shape, ', '.join(var.dims)
+                ))
+        return
+
+    override = dict(override)
+    override.update(restart_input_filename='', diskless_mode=True)
+
+    sim = load_setup(setup)(override=override)
+    sim.setup()
+
+    problems = restart_validation.validate_restart(sim.state, restart_file)
+    if not problems:
+        click.echo('{} matches setup {}'.format(restart_file, setup))
+        return
+
+    click.echo('{} does not match setup {}:'.format(restart_file, setup))
+    for problem in problems:
+        click.echo('  {}'.format(problem))
+
+    raise click.exceptions.Exit(1)
+
+
+@click.command('veros-restart-info')
+@click.argument('restart-file', type=click.Path(dir_okay=False))
+@click.option('--setup', type=click.Path(exists=True, dir_okay=False),
+              help='Setup script to validate the restart file against')
+@click.option('-s', '--override', nargs=2, multiple=True, metavar='SETTING VALUE',
+              type=VerosSetting(), default=tuple(),
+              help='Override setting of the setup, may be specified multiple times')
+@functools.wraps(restart_info)
+def cli(*args, **kwargs):
+    restart_info(*args, **kwargs)
+
+
+if __name__ == '__main__':
+    cli()
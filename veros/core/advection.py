@@ -1,4 +1,5 @@
 from .. import veros_method
+from ..threads import slab_parallel
 from ..variables import allocate
 from .utilities import pad_z_edges, where
 
@@ -55,6 +56,7 @@ def adv_flux_2nd(vs, adv_fe, adv_fn, adv_ft, var):
     adv_ft[:, :, -1] = 0.
 
 
+@slab_parallel(outputs=['adv_fe', 'adv_fn', 'adv_ft'], y_args=['var'])
 @veros_method
 def adv_flux_superbee(vs, adv_fe, adv_fn, adv_ft, var):
     r"""
@@ -1,4 +1,5 @@
 from ... import veros_method
+from ...threads import slab_parallel
 
 """
 ==========================================================================
@@ -59,6 +60,7 @@ v48 = 6.057902487546866e-17
 rho0 = 1024.0
 
 
+@slab_parallel(y_args=['sa', 'ct', 'p'])
 @veros_method
 def gsw_rho(vs, sa, ct, p):
     """
@@ -85,6 +87,7 @@ def gsw_rho(vs, sa, ct, p):
     return v_hat_denominator / v_hat_numerator - rho0
 
 
+@slab_parallel(y_args=['sa', 'ct', 'p'])
 @veros_method
 def gsw_drhodT(vs, sa, ct, p):
     """
@@ -151,6 +154,7 @@ def gsw_drhodT(vs, sa, ct, p):
     return (dvhatden_dct - dvhatnum_dct * rho) * rec_num
 
 
+@slab_parallel(y_args=['sa', 'ct', 'p'])
 @veros_method
 def gsw_drhodS(vs, sa, ct, p):
     """
@@ -209,6 +213,7 @@ def gsw_drhodS(vs, sa, ct, p):
     return (dvhatden_dsa - dvhatnum_dsa * rho) * rec_num
 
 
+@slab_parallel(y_args=['sa', 'ct', 'p'])
 @veros_method
 def gsw_drhodP(vs, sa, ct, p):
     """
@@ -264,6 +269,7 @@ def gsw_drhodP(vs, sa, ct, p):
     return pa2db * (dvhatden_dp - dvhatnum_dp * rho) * rec_num
 
 
+@slab_parallel(y_args=['sa', 'ct', 'p'])
 @veros_method
 def gsw_dyn_enthalpy(vs, sa, ct, p):
     """
@@ -334,6 +340,7 @@ def gsw_dHdS1(vs, sa, ct, p):
     return (gsw_dyn_enthalpy(sa + delta, ct, p) - gsw_dyn_enthalpy(sa, ct, p)) / delta
 
 
+@slab_parallel(y_args=['sa_in', 'ct_in', 'p'])
 @veros_method
 def gsw_dHdT(vs, sa_in, ct_in, p):
     """
@@ -454,6 +461,7 @@ def gsw_dHdT(vs, sa_in, ct_in, p):
     return t305
 
 
+@slab_parallel(y_args=['sa_in', 'ct_in', 'p'])
 @veros_method
 def gsw_dHdS(vs, sa_in, ct_in, p):
     """
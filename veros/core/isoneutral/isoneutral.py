@@ -2,9 +2,11 @@ from loguru import logger
 
 from .. import density, utilities
 from ... import veros_method
+from ...threads import slab_parallel
 from ...variables import allocate
 
 
+@slab_parallel(outputs=['K_11', 'K_22', 'K_33', 'Ai_ez', 'Ai_nz', 'Ai_bx', 'Ai_by'])
 @veros_method
 def isoneutral_diffusion_pre(vs):
     """
@@ -170,7 +172,7 @@ def isoneutral_diag_streamfunction(vs):
     vs.B1_gm[2:-2, 1:-2, :] = -0.25 * diffloc * np.sum(vs.Ai_nz[2:-2, 1:-2, ...], axis=(3, 4))
 
 
-@veros_method(dist_safe=False, local_variables=[
+@veros_method(dist_safe=False, read_only_variables=[
     'dxt', 'dyt', 'dzt', 'cost'
 ])
 def check_isoneutral_slope_crit(vs):
@@ -3,7 +3,7 @@ from loguru import logger
 
 from .base import LinearSolver
 from ... import utilities
-from .... import veros_method, runtime_settings as rs, runtime_state as rst
+from .... import veros_method, distributed, runtime_settings as rs, runtime_state as rst
 
 
 class PETScSolver(LinearSolver):
@@ -21,10 +21,7 @@ class PETScSolver(LinearSolver):
             comm=rs.mpi_comm,
             proc_sizes=rs.num_proc,
             boundary_type=boundary_type,
-            ownership_ranges=[
-                (vs.nx // rs.num_proc[0],) * rs.num_proc[0],
-                (vs.ny // rs.num_proc[1],) * rs.num_proc[1],
-            ]
+            ownership_ranges=distributed.get_chunk_sizes(vs)
         )
 
         self._matrix, self._boundary_fac = self._assemble_poisson_matrix(vs)
@@ -150,7 +147,7 @@ class PETScSolver(LinearSolver):
         (i0, i1), (j0, j1) = self._da.getRanges()
         for j in range(j0, j1):
             for i in range(i0, i1):
-                iloc, jloc = i % (vs.nx // rs.num_proc[0]), j % (vs.ny // rs.num_proc[1])
+                iloc, jloc = i - i0, j - j0
                 row.index = (i, j)
 
                 for diag, offset in zip(cf, ij_offsets):
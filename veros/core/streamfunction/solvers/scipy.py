@@ -9,7 +9,7 @@ from ....variables import allocate
 
 
 class SciPySolver(LinearSolver):
-    @veros_method(dist_safe=False, local_variables=[
+    @veros_method(dist_safe=False, read_only_variables=[
         'hvr', 'hur',
         'dxu', 'dxt', 'dyu', 'dyt',
         'cosu', 'cost',
@@ -26,7 +26,7 @@ class SciPySolver(LinearSolver):
         ilu_preconditioner = spalg.spilu(self._matrix.tocsc(), drop_tol=1e-6, fill_factor=100)
         self._extra_args['M'] = spalg.LinearOperator(self._matrix.shape, ilu_preconditioner.solve)
 
-    @veros_method(dist_safe=False, local_variables=['boundary_mask'])
+    @veros_method(dist_safe=False, read_only_variables=['boundary_mask'])
     def _scipy_solver(self, vs, rhs, sol, boundary_val):
         utilities.enforce_boundaries(vs, sol)
 
@@ -100,7 +100,7 @@ class SciPySolver(LinearSolver):
         return scipy.sparse.dia_matrix((Z.flatten(), 0), shape=(Z.size, Z.size)).tocsr()
 
     @staticmethod
-    @veros_method(dist_safe=False, local_variables=['boundary_mask'])
+    @veros_method(dist_safe=False, read_only_variables=['boundary_mask'])
     def _assemble_poisson_matrix(vs):
         """
         Construct a sparse matrix based on the stencil for the 2D Poisson equation.
@@ -18,7 +18,7 @@ def _get_solver_class():
     ls = rs.linear_solver
 
     def _get_best_solver():
-        if rst.proc_num > 1:
+        if rst.proc_num > 1 and not rs.land_tiles:
             try:
                 from .solvers.petsc import PETScSolver
             except ImportError:
@@ -32,6 +32,8 @@ def _get_solver_class():
     if ls == 'best':
         return _get_best_solver()
     elif ls == 'petsc':
+        if rs.land_tiles:
+            raise RuntimeError('PETSc linear solver does not support decompositions with land tiles')
         from .solvers.petsc import PETScSolver
         return PETScSolver
     elif ls == 'scipy':
@@ -15,6 +15,37 @@ CONTEXT = threading.local()
 CONTEXT.is_dist_safe = True
 CONTEXT.stack_level = 0
 
+# number of running functions and original value of np per module namespace
+_BACKEND_LOCK = threading.Lock()
+_BACKEND_USERS = {}
+_SENTINEL = object()
+
+
+def _inject_backend(g, backend):
+    """Sets np in the given module namespace, and remembers its original value."""
+    with _BACKEND_LOCK:
+        users = _BACKEND_USERS.get(id(g))
+        if users is None:
+            users = _BACKEND_USERS[id(g)] = [0, g.get('np', _SENTINEL)]
+        users[0] += 1
+        g['np'] = backend
+
+
+def _restore_backend(g):
+    """Restores the original value of np once no function of the module namespace is
+    running anymore (in any thread)."""
+    with _BACKEND_LOCK:
+        users = _BACKEND_USERS[id(g)]
+        users[0] -= 1
+        if users[0] > 0:
+            return
+
+        del _BACKEND_USERS[id(g)]
+        if users[1] is _SENTINEL:
+            g.pop('np', None)
+        else:
+            g['np'] = users[1]
+
 
 def veros_method(function=None, **kwargs):
     """Decorator that injects the current backend as variable ``np`` into the wrapped function.
@@ -41,17 +72,19 @@ def veros_method(function=None, **kwargs):
     inline = kwargs.pop('inline', False)
     dist_safe = kwargs.pop('dist_safe', True)
 
-    if not dist_safe and 'local_variables' not in kwargs:
+    if not dist_safe and 'local_variables' not in kwargs and 'read_only_variables' not in kwargs:
         raise ValueError('local_variables argument must be given if dist_safe=False')
 
     local_vars = kwargs.pop('local_variables', [])
+    read_only_vars = kwargs.pop('read_only_variables', [])
     dist_only = kwargs.pop('dist_only', False)
 
     def inner_decorator(function):
         narg = 1 if _is_method(function) else 0
         return _veros_method(
             function, inline=inline, narg=narg,
-            dist_safe=dist_safe, local_vars=local_vars, dist_only=dist_only
+            dist_safe=dist_safe, local_vars=local_vars, read_only_vars=read_only_vars,
+            dist_only=dist_only
         )
 
     return inner_decorator
@@ -63,7 +96,7 @@ def _is_method(function):
 
 
 def _veros_method(function, inline=False, dist_safe=True, local_vars=None,
-                  dist_only=False, narg=0):
+                  read_only_vars=None, dist_only=False, narg=0):
     @functools.wraps(function)
     def veros_method_wrapper(*args, **kwargs):
         from . import runtime_settings as rs, runtime_state as rst
@@ -94,7 +127,7 @@ def _veros_method(function, inline=False, dist_safe=True, local_vars=None,
 
         if reset_dist_safe:
             dist_state = DistributedVerosState(veros_state)
-            dist_state.gather_arrays(local_vars)
+            dist_state.gather_arrays(local_vars, read_only=read_only_vars or ())
             func_state = dist_state
             CONTEXT.is_dist_safe = False
         else:
@@ -105,10 +138,7 @@ def _veros_method(function, inline=False, dist_safe=True, local_vars=None,
             execute = rst.proc_rank == 0
 
         g = function.__globals__
-        sentinel = object()
-
-        oldvalue = g.get('np', sentinel)
-        g['np'] = get_backend(rs.backend)
+        _inject_backend(g, get_backend(rs.backend))
 
         newargs = list(args)
         newargs[narg] = func_state
@@ -127,10 +157,7 @@ def _veros_method(function, inline=False, dist_safe=True, local_vars=None,
                 res = broadcast(veros_state, res)
                 dist_state.scatter_arrays()
         finally:
-            if oldvalue is sentinel:
-                del g['np']
-            else:
-                g['np'] = oldvalue
+            _restore_backend(g)
 
             if not inline:
                 CONTEXT.stack_level -= 1
@@ -1,21 +1,49 @@
+import os
+
 from loguru import logger
 
-from . import averages, cfl_monitor, energy, overturning, snapshot, tracer_monitor, io_tools
-from .. import time, veros_method
-from .io_tools import hdf5 as h5tools
+from . import (
+    averages, cfl_monitor, energy, meridional_transport, overturning, regional_means,
+    restart_validation, snapshot, tracer_monitor, io_tools
+)
+from .schedule import get_schedule
+from .. import time, veros_method, runtime_state, distributed
+from ..decorators import do_not_disturb
+from .io_tools import hdf5 as h5tools, async_writer, io_server, file_handles, merge
 
 
 @veros_method
 def create_default_diagnostics(vs):
     return {Diag.name: Diag(vs) for Diag in (averages.Averages, cfl_monitor.CFLMonitor,
-                                             energy.Energy, overturning.Overturning,
+                                             energy.Energy, meridional_transport.MeridionalTransport,
+                                             overturning.Overturning, regional_means.RegionalMeans,
                                              snapshot.Snapshot, tracer_monitor.TracerMonitor)}
 
 
 @veros_method
 def sanity_check(vs):
-    from ..distributed import global_and
-    return global_and(vs, np.all(np.isfinite(vs.u)))
+    """Whether the velocities of the latest time step are finite everywhere.
+
+    The sum of an array is only finite if all of its elements are, so this needs a
+    single (cheap) global reduction instead of checking every element.
+    """
+    from ..distributed import global_sum
+    return bool(np.isfinite(global_sum(vs, np.sum(vs.u[..., vs.taup1]))))
+
+
+def is_sanity_check_due(vs):
+    """Whether the solution has to be checked for divergence in the current iteration."""
+    if vs.sanity_check_interval and vs.itt % vs.sanity_check_interval == 0:
+        return True
+
+    # restarts of this iteration are written at the beginning of the next one
+    return _is_restart_due(vs)
+
+
+def _is_restart_due(vs):
+    if vs.diskless_mode or not vs.restart_output_filename:
+        return False
+    return get_schedule(vs).is_due(vs, 'restart', vs.restart_frequency)
 
 
 @veros_method
@@ -24,9 +52,26 @@ def read_restart(vs):
         return
     if vs.force_overwrite:
         raise RuntimeError('To prevent data loss, force_overwrite cannot be used in restart runs')
+
+    restart_filename = vs.restart_input_filename.format(**vars(vs))
+
+    # only reads metadata, so mismatching files are detected before any data is loaded
+    missing_groups = restart_validation.check_restart(vs, restart_filename)
+
+    if not os.path.isfile(restart_filename):
+        # restart might have been written by every process separately
+        process_files = merge.find_process_files(restart_filename)
+        if process_files:
+            if runtime_state.proc_rank == 0:
+                merge.merge_files(process_files, restart_filename)
+            distributed.barrier()
+
     logger.info('Reading restarts')
-    for diagnostic in vs.diagnostics.values():
-        diagnostic.read_restart(vs, vs.restart_input_filename.format(**vars(vs)))
+    for name, diagnostic in vs.diagnostics.items():
+        if name in missing_groups:
+            logger.warning(' No restart data for diagnostic {}, starting from initial state', name)
+            continue
+        diagnostic.read_restart(vs, restart_filename)
 
 
 @veros_method
@@ -35,40 +80,163 @@ def write_restart(vs, force=False):
         return
     if not vs.restart_output_filename:
         return
-    if force or vs.restart_frequency and vs.time % vs.restart_frequency < vs.dt_tracer:
+    if force or _is_restart_due(vs):
         output_filename = vs.restart_output_filename.format(**vars(vs))
         logger.info('Writing restart file {}...', output_filename)
+
+        per_process = merge.is_enabled(vs)
+        grid_hash = restart_validation.get_grid_hash(vs)
+
+        static_filename = vs.restart_static_filename.format(**vars(vs))
+        if static_filename and per_process:
+            logger.warning('Static restart files are not supported with per-process output')
+            static_filename = ''
+
+        # restart data is copied and written in the background if possible
+        if io_server.is_enabled() or async_writer.is_enabled(vs) or per_process or static_filename:
+            restart_data = h5tools.RestartData()
+            restart_data.attributes[restart_validation.GRID_HASH_ATTRIBUTE] = grid_hash
+            if per_process:
+                restart_data.attributes.update(merge.get_process_attributes(vs, include_overlap=True))
+
+            for diagnostic in vs.diagnostics.values():
+                diagnostic.write_restart(vs, restart_data)
+
+            if static_filename:
+                restart_data = _link_static_data(vs, restart_data, static_filename, output_filename)
+
+            io_server.submit(
+                vs, h5tools.write_restart_file, output_filename, piece=restart_data,
+                per_process=per_process
+            )
+            return
+
         with h5tools.threaded_io(vs, output_filename, 'w') as outfile:
+            outfile.attrs[restart_validation.GRID_HASH_ATTRIBUTE] = grid_hash
             for diagnostic in vs.diagnostics.values():
                 diagnostic.write_restart(vs, outfile)
 
 
+# checksums of the data in static restart files, per simulation
+_static_checksums = {}
+
+
+@veros_method
+def _link_static_data(vs, restart_data, static_filename, restart_filename):
+    """Replace all variables that did not change since the static restart file was
+    written by links to it (and write the static file if it does not exist yet)."""
+    cache_key = (id(vs), os.path.abspath(static_filename))
+    static_checksums = _static_checksums.get(cache_key)
+
+    if static_checksums is None:
+        if os.path.isfile(static_filename):
+            static_checksums = h5tools.read_restart_checksums(static_filename, restart_data)
+        else:
+            logger.info('Writing static restart data to {}', static_filename)
+            io_server.submit(vs, h5tools.write_restart_file, static_filename, piece=restart_data)
+            static_checksums = h5tools.get_restart_checksums(restart_data)
+
+        _static_checksums[cache_key] = static_checksums
+
+    checksums = h5tools.get_restart_checksums(restart_data)
+    keys = sorted(checksums.keys())
+
+    # variables have to be unchanged on all processes
+    unchanged = np.array([checksums[key] == static_checksums.get(key) for key in keys])
+    unchanged = distributed.global_and(vs, unchanged)
+
+    # relative to the restart file, so files can be moved together
+    link_path = os.path.relpath(
+        os.path.abspath(static_filename), os.path.dirname(os.path.abspath(restart_filename))
+    )
+    return h5tools.link_variables(
+        restart_data, {key for key, is_unchanged in zip(keys, unchanged) if is_unchanged}, link_path
+    )
+
+
 @veros_method
 def initialize(vs):
+    async_writer.initialize(vs)
+
     for name, diagnostic in vs.diagnostics.items():
         diagnostic.initialize(vs)
         if diagnostic.sampling_frequency:
             logger.info(' Running diagnostic "{0}" every {1[0]:.1f} {1[1]}'
-                         .format(name, time.format_time(diagnostic.sampling_frequency)))
+                         .format(name, time.format_time(time.parse_period(diagnostic.sampling_frequency))))
         if diagnostic.output_frequency:
             logger.info(' Writing output for diagnostic "{0}" every {1[0]:.1f} {1[1]}'
-                         .format(name, time.format_time(diagnostic.output_frequency)))
+                         .format(name, time.format_time(time.parse_period(diagnostic.output_frequency))))
+
+
+def _get_event_periods(vs):
+    """Periods of all recurring diagnostic events, by event name."""
+    periods = {}
+    for name, diagnostic in vs.diagnostics.items():
+        periods['{}:sampling'.format(name)] = diagnostic.sampling_frequency
+        periods['{}:output'.format(name)] = diagnostic.output_frequency
+    return periods
+
+
+def is_due(vs):
+    """Whether any diagnostic has to be sampled or written in the current iteration."""
+    schedule = get_schedule(vs)
+    return any(
+        schedule.is_due(vs, event, period) for event, period in _get_event_periods(vs).items()
+    )
 
 
 @veros_method
 def diagnose(vs):
-    for diagnostic in vs.diagnostics.values():
-        if diagnostic.sampling_frequency and vs.time % diagnostic.sampling_frequency < vs.dt_tracer:
+    schedule = get_schedule(vs)
+    for name, diagnostic in vs.diagnostics.items():
+        if schedule.is_due(vs, '{}:sampling'.format(name), diagnostic.sampling_frequency):
             diagnostic.diagnose(vs)
 
 
 @veros_method
 def output(vs):
-    for diagnostic in vs.diagnostics.values():
-        if diagnostic.output_frequency and vs.time % diagnostic.output_frequency < vs.dt_tracer:
+    schedule = get_schedule(vs)
+    for name, diagnostic in vs.diagnostics.items():
+        if schedule.is_due(vs, '{}:output'.format(name), diagnostic.output_frequency):
             diagnostic.output(vs)
 
 
+def get_event_calendar(vs, duration=None):
+    """All diagnostic events (sampling and output of every diagnostic, and restarts)
+    that are due within the given duration, e.g. to plan disk space and I/O load.
+
+    Arguments:
+        duration: Length of the calendar, in seconds or as understood by
+            :func:`veros.time.parse_period` (e.g. ``'1 year'``). Defaults to the
+            remaining run length.
+
+    Returns:
+        List of :class:`~veros.diagnostics.schedule.ScheduledEvent` (with attributes
+        ``iteration``, ``time``, and ``name``, e.g. ``'snapshot:output'`` or
+        ``'restart'``), ordered by iteration.
+
+    """
+    if duration is None:
+        duration = vs.runlen
+
+    events = _get_event_periods(vs)
+    if vs.restart_output_filename and not vs.diskless_mode:
+        events['restart'] = vs.restart_frequency
+
+    calendar = get_schedule(vs).get_calendar(vs, events, duration)
+    # diagnostics are only run after a time step, restarts are also written before the first one
+    return [event for event in calendar if event.iteration > vs.itt or event.name == 'restart']
+
+
+@do_not_disturb
+def flush_output(vs):
+    """Wait until all output that is written in the background (or by I/O processes)
+    is on disk, and close all output files. Raises errors of all pending writes."""
+    async_writer.flush()
+    io_server.flush()
+    file_handles.close_all()
+
+
 def start_profiler():
     import pyinstrument
     profiler = pyinstrument.Profiler()
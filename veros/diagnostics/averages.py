@@ -1,25 +1,125 @@
 from collections import namedtuple
-import os
 import copy
 
+from loguru import logger
+
 from .diagnostic import VerosDiagnostic
 from .. import veros_method
 from ..variables import TIMESTEPS, allocate
 
-Running_sum = namedtuple('Running_sum', ('var', 'sum'))
+Running_stats = namedtuple('Running_stats', ('var', 'accumulators'))
+
+#: Statistics that can be written for every averaged quantity
+STATISTICS = ('mean', 'variance', 'std', 'min', 'max')
+
+# accumulators needed by each statistic
+_STATISTIC_ACCUMULATORS = {
+    'mean': ('sum',),
+    'variance': ('sum', 'm2'),
+    'std': ('sum', 'm2'),
+    'min': ('min',),
+    'max': ('max',),
+}
+
+# fill values of accumulators at the start of every averaging interval
+_ACCUMULATOR_FILL_VALUES = {
+    'min': float('inf'),
+    'max': -float('inf'),
+}
+
+# running sums that are compensated if accumulators have less precision than the model,
+# with the names of their compensation terms
+_COMPENSATED_ACCUMULATORS = {
+    'sum': 'compensation',
+    'm2': 'm2_compensation',
+}
+
+# type of Kahan compensation terms, stored relative to the spacing of the sum
+_COMPENSATION_DTYPE = 'float16'
+
+_STATISTIC_NAMES = {
+    'variance': 'Variance',
+    'std': 'Standard deviation',
+    'min': 'Minimum',
+    'max': 'Maximum',
+}
+
+
+def get_product_name(factors):
+    """Output name of the averaged product of the given variables."""
+    return '_'.join(factors)
+
+
+def get_output_name(key, statistic):
+    """Output name of a statistic of an averaged quantity."""
+    if statistic == 'mean':
+        return key
+    return '{}_{}'.format(key, statistic)
+
+
+@veros_method(inline=True)
+def _get_sum(vs, acc, accumulator='sum'):
+    """Running sum of accumulators, including the compensation term (if any)."""
+    compensation = _COMPENSATED_ACCUMULATORS[accumulator]
+    if compensation not in acc:
+        return acc[accumulator]
+
+    float_type = vs.default_float_type
+    return (acc[accumulator].astype(float_type)
+            - acc[compensation].astype(float_type) * np.spacing(acc[accumulator]))
+
+
+@veros_method(inline=True)
+def _add_to_sum(vs, acc, sample, accumulator='sum'):
+    """Add sample to a running sum of accumulators (``sum`` or ``m2``).
+
+    Sums with less precision than the model are compensated (Kahan summation):
+    the rounding error of every addition is computed exactly and subtracted from
+    the next sample. It is stored in units of the spacing of the sum, which
+    bounds it by 0.5, so a half-precision compensation term keeps 11 more bits
+    of the sum.
+    """
+    compensation = _COMPENSATED_ACCUMULATORS[accumulator]
+    if compensation not in acc:
+        acc[accumulator][...] += sample
+        return
+
+    float_type = vs.default_float_type
+    running_sum = acc[accumulator].astype(float_type)
+    corrected_sample = sample - acc[compensation].astype(float_type) * np.spacing(acc[accumulator])
+    acc[accumulator][...] = running_sum + corrected_sample
+    rounding_error = (acc[accumulator] - running_sum) - corrected_sample
+    acc[compensation][...] = rounding_error / np.spacing(acc[accumulator])
 
 
 class Averages(VerosDiagnostic):
     """Time average output diagnostic.
 
-    All registered variables are summed up when :meth:`diagnose` is called,
-    and averaged and output upon calling :meth:`output`.
+    All registered variables are sampled when :meth:`diagnose` is called,
+    and their statistics are output upon calling :meth:`output`. All statistics
+    of a variable are updated in a single pass over each sample, variances
+    are accumulated with Welford's algorithm.
+
+    If :attr:`accumulator_dtype` has less precision than the model (e.g.
+    ``float32`` in a ``float64`` model), running sums and sums of squared deviations
+    (for variances) keep a compensation term in half precision. They then take 6 instead
+    of 8 bytes per value (25% less than ``float64``), while minima and maxima take 4 bytes.
+    With unit roundoff :math:`u = 2^{-24}` of ``float32``, the error of a
+    sum over :math:`n` samples is bounded by
+    :math:`n \\, 2^{-12} u \\max_k |S_k|` (where :math:`S_k` are the partial sums), compared to
+    :math:`n u \\max_k |S_k|` without compensation. Means of up to a few thousand
+    samples are thus as accurate as a single ``float32`` rounding. Variances also inherit
+    the error of the running mean, which is noticeable where fluctuations are tiny
+    compared to the mean. Minima and maxima are rounded to ``float32`` once.
     """
     name = 'averages' #:
     output_path = '{identifier}.averages.nc'  #: File to write to. May contain format strings that are replaced with Veros attributes.
     output_variables = None #: Iterable containing all variables to be averaged. Changes have no effect after ``initialize`` has been called.
+    output_products = None #: Iterable of pairs of variables whose product is averaged, e.g. ``[('v', 'temp')]`` for eddy heat fluxes. Both variables must have the same shape (no interpolation between grids is done). Written as ``v_temp``.
+    output_statistics = ('mean',) #: Statistics that are written for all variables and products, any of ``mean``, ``variance``, ``std``, ``min``, ``max``. The mean is written under the name of the variable, all others as e.g. ``temp_variance``. Variances are population variances of the samples.
     output_frequency = None  #: Frequency (in seconds) in which output is written.
     sampling_frequency = None  #: Frequency (in seconds) in which variables are accumulated.
+    accumulator_dtype = None #: Floating point type of all accumulation buffers (defaults to ``default_float_type``). Use ``float32`` to reduce their memory (by 25% for means and variances, by half for minima and maxima). See below for error bounds.
 
     @veros_method
     def initialize(self, vs):
@@ -28,57 +128,228 @@ class Averages(VerosDiagnostic):
         self.average_nitts = 0
         self.average_vars = {}
 
-        if not self.output_variables:
+        unknown_statistics = set(self.output_statistics) - set(STATISTICS)
+        if unknown_statistics:
+            raise ValueError('unknown statistics {} (must be one of {})'
+                             .format(', '.join(sorted(unknown_statistics)), ', '.join(STATISTICS)))
+
+        accumulators = set()
+        for statistic in self.output_statistics:
+            accumulators.update(_STATISTIC_ACCUMULATORS[statistic])
+
+        if self._get_accumulator_dtype(vs).itemsize < np.dtype(vs.default_float_type).itemsize:
+            accumulators.update(_COMPENSATED_ACCUMULATORS[accumulator] for accumulator in list(accumulators)
+                                if accumulator in _COMPENSATED_ACCUMULATORS)
+
+        for var in self.output_variables or ():
+            var_data = self._get_sampled_variable(vs, var)
+            self.average_vars[var] = Running_stats(var_data, self._allocate_accumulators(vs, var_data, accumulators))
+
+        for factors in self.output_products or ():
+            factors = tuple(factors)
+            if len(factors) != 2:
+                raise ValueError('products must consist of two variables (got {})'.format(factors))
+
+            shapes = [getattr(vs, factor).shape[:len(self._get_sampled_variable(vs, factor).dims)]
+                      for factor in factors]
+            if shapes[0] != shapes[1]:
+                raise ValueError('variables {} and {} do not have the same shape'.format(*factors))
+
+            var_data = self._get_product_variable(vs, factors)
+            self.average_vars[factors] = Running_stats(var_data, self._allocate_accumulators(vs, var_data, accumulators))
+
+        if not self.average_vars:
             return
-        for var in self.output_variables:
-            var_data = copy.copy(vs.variables[var])
-            var_data.time_dependent = True
-            if self._has_timestep_dim(vs, var):
-                var_data.dims = var_data.dims[:-1]
-            var_sum = allocate(vs, var_data.dims)
-            self.average_vars[var] = Running_sum(var_data, var_sum)
-        self.initialize_output(vs, {key: runsum.var for key,
-                                    runsum in self.average_vars.items()})
+
+        self.initialize_output(vs, self._get_output_metadata())
+
+    @classmethod
+    def _get_sampled_variable(cls, vs, var):
+        var_data = copy.copy(vs.variables[var])
+        var_data.time_dependent = True
+        if cls._has_timestep_dim(vs, var):
+            var_data.dims = var_data.dims[:-1]
+        return var_data
+
+    @classmethod
+    def _get_product_variable(cls, vs, factors):
+        factor_vars = [cls._get_sampled_variable(vs, factor) for factor in factors]
+        var_data = copy.copy(factor_vars[0])
+        var_data.name = ' * '.join(factor_var.name for factor_var in factor_vars)
+        var_data.long_description = 'Product of {}'.format(
+            ' and '.join(factor_var.long_description for factor_var in factor_vars)
+        )
+        var_data.units = ' '.join(factor_var.units for factor_var in factor_vars)
+        var_data.scale = factor_vars[0].scale * factor_vars[1].scale
+        return var_data
+
+    @veros_method
+    def _get_accumulator_dtype(self, vs):
+        return np.dtype(self.accumulator_dtype or vs.default_float_type)
+
+    @veros_method
+    def _allocate_accumulators(self, vs, var_data, accumulators):
+        result = {}
+        for accumulator in accumulators:
+            if accumulator in _COMPENSATED_ACCUMULATORS.values():
+                dtype = _COMPENSATION_DTYPE
+            else:
+                dtype = self._get_accumulator_dtype(vs)
+            result[accumulator] = allocate(vs, var_data.dims, dtype=dtype,
+                                           fill=_ACCUMULATOR_FILL_VALUES.get(accumulator, 0))
+        return result
 
     @staticmethod
     def _has_timestep_dim(vs, var):
         return vs.variables[var].dims[-1] == TIMESTEPS[0]
 
+    @staticmethod
+    def _get_key(key):
+        if isinstance(key, tuple):
+            return get_product_name(key)
+        return key
+
+    def _get_output_metadata(self):
+        variable_metadata = {}
+        for key, runstats in self.average_vars.items():
+            for statistic in self.output_statistics:
+                output_name = get_output_name(self._get_key(key), statistic)
+                variable_metadata[output_name] = self._get_statistic_variable(runstats.var, statistic)
+        return variable_metadata
+
+    @staticmethod
+    def _get_statistic_variable(var, statistic):
+        if statistic == 'mean':
+            return var
+
+        stat_var = copy.copy(var)
+        stat_var.name = '{} of {}'.format(_STATISTIC_NAMES[statistic], var.name)
+        stat_var.long_description = '{} of {}'.format(_STATISTIC_NAMES[statistic], var.long_description)
+        if statistic == 'variance':
+            stat_var.units = '({})^2'.format(var.units)
+            stat_var.scale = var.scale ** 2
+        return stat_var
+
+    def _get_sample(self, vs, key):
+        if isinstance(key, tuple):
+            first, second = (self._get_sample(vs, factor) for factor in key)
+            return first * second
+
+        if self._has_timestep_dim(vs, key):
+            return getattr(vs, key)[..., vs.tau]
+
+        return getattr(vs, key)
+
+    @veros_method
     def diagnose(self, vs):
         self.average_nitts += 1
-        for key, var in self.average_vars.items():
-            if self._has_timestep_dim(vs, key):
-                var.sum[...] += getattr(vs, key)[..., vs.tau]
-            else:
-                var.sum[...] += getattr(vs, key)
+        nitts = self.average_nitts
+
+        for key, runstats in self.average_vars.items():
+            sample = self._get_sample(vs, key)
+            acc = runstats.accumulators
 
+            if 'm2' in acc and nitts > 1:
+                # Welford's algorithm, with means derived from the running sum
+                delta = sample - _get_sum(vs, acc) / (nitts - 1)
+                _add_to_sum(vs, acc, sample)
+                _add_to_sum(vs, acc, delta * (sample - _get_sum(vs, acc) / nitts), accumulator='m2')
+            elif 'sum' in acc:
+                _add_to_sum(vs, acc, sample)
+
+            if 'min' in acc:
+                np.minimum(acc['min'], sample, out=acc['min'])
+
+            if 'max' in acc:
+                np.maximum(acc['max'], sample, out=acc['max'])
+
+    @veros_method
+    def _get_statistic(self, vs, runstats, statistic):
+        acc = runstats.accumulators
+        if statistic == 'mean':
+            result = _get_sum(vs, acc) / self.average_nitts
+        elif statistic == 'variance':
+            result = _get_sum(vs, acc, accumulator='m2') / self.average_nitts
+        elif statistic == 'std':
+            result = np.sqrt(np.maximum(_get_sum(vs, acc, accumulator='m2'), 0) / self.average_nitts)
+        else:
+            result = acc[statistic]
+        # output is written with model precision (also copies min and max before they are reset)
+        return result.astype(vs.default_float_type)
+
+    @veros_method
     def output(self, vs):
-        """Write averages to netcdf file and zero array
+        """Write statistics to netcdf file and reset accumulators
         """
-        variable_metadata = {key: runsum.var for key, runsum in self.average_vars.items()}
-        if not os.path.isfile(self.get_output_file_name(vs)):
+        variable_metadata = self._get_output_metadata()
+        if not self.output_file_exists(vs):
             self.initialize_output(vs, variable_metadata)
-        variable_mean = {key: runsum.sum / self.average_nitts for key,
-                         runsum in self.average_vars.items()}
-        self.write_output(vs, variable_metadata, variable_mean)
-        for runsum in self.average_vars.values():
-            runsum.sum[...] = 0.
+
+        variable_data = {}
+        for key, runstats in self.average_vars.items():
+            for statistic in self.output_statistics:
+                output_name = get_output_name(self._get_key(key), statistic)
+                variable_data[output_name] = self._get_statistic(vs, runstats, statistic)
+
+        self.write_output(vs, variable_metadata, variable_data)
+
+        for runstats in self.average_vars.values():
+            for accumulator, arr in runstats.accumulators.items():
+                arr[...] = _ACCUMULATOR_FILL_VALUES.get(accumulator, 0)
         self.average_nitts = 0
 
+    def _get_restart_names(self):
+        """Names of all accumulators in restart files (running sums are stored
+        under the name of the variable)."""
+        names = {}
+        for key, runstats in self.average_vars.items():
+            for accumulator in runstats.accumulators:
+                if accumulator == 'sum':
+                    restart_name = self._get_key(key)
+                else:
+                    restart_name = '{}_{}'.format(self._get_key(key), accumulator)
+                names[restart_name] = (key, accumulator)
+        return names
+
     def read_restart(self, vs, infile):
-        attributes, variables = self.read_h5_restart(vs, vs.variables, infile)
+        restart_names = self._get_restart_names()
+        var_meta = dict(vs.variables)
+        var_meta.update({
+            restart_name: self.average_vars[key].var for restart_name, (key, _) in restart_names.items()
+        })
+
+        attributes, variables = self.read_h5_restart(vs, var_meta, infile)
         if attributes:
             self.average_nitts = attributes['average_nitts']
-        if variables:
-            self.average_vars = {key: Running_sum(copy.copy(vs.variables[key]), var)
-                                 for key, var in variables.items()}
-        for key, runsum in self.average_vars.items():
-            runsum.var.time_dependent = True
-            if self._has_timestep_dim(vs, key):
-                runsum.var.dims = runsum.var.dims[:-1]
+
+        for restart_name, var in variables.items():
+            if restart_name not in restart_names:
+                logger.warning(' Ignoring restart data for unknown accumulator {}', restart_name)
+                continue
+
+            key, accumulator = restart_names[restart_name]
+            accumulators = self.average_vars[key].accumulators
+            expected_dtype = accumulators[accumulator].dtype
+            if var.dtype != expected_dtype:
+                logger.warning(' Restart data for accumulator {} has type {}, converting it to {} '
+                               '(accumulator_dtype has changed)', restart_name, var.dtype, expected_dtype)
+                var = var.astype(expected_dtype)
+
+            accumulators[accumulator] = var
+
+        # compensation terms of running sums may start from zero at any time
+        missing_names = set(
+            restart_name for restart_name in set(restart_names) - set(variables)
+            if restart_names[restart_name][1] not in _COMPENSATED_ACCUMULATORS.values()
+        )
+        if missing_names and self.average_nitts:
+            logger.warning(' No restart data for accumulators {} (statistics of the current '
+                           'averaging interval will be incomplete)', ', '.join(sorted(missing_names)))
 
     def write_restart(self, vs, outfile):
         attributes = {'average_nitts': self.average_nitts}
-        variables = {key: runsum.sum for key, runsum in self.average_vars.items()}
-        variable_metadata = {key: runsum.var for key, runsum in self.average_vars.items()}
+        variables, variable_metadata = {}, {}
+        for restart_name, (key, accumulator) in self._get_restart_names().items():
+            variables[restart_name] = self.average_vars[key].accumulators[accumulator]
+            variable_metadata[restart_name] = self.average_vars[key].var
         self.write_h5_restart(vs, attributes, variable_metadata, variables, outfile)
@@ -2,9 +2,16 @@ import os
 
 from loguru import logger
 
-from .io_tools import netcdf as nctools, hdf5 as h5tools
+from .io_tools import (
+    netcdf as nctools, hdf5 as h5tools, backends, async_writer, io_server, file_handles, merge,
+    subset
+)
 from ..decorators import veros_method, do_not_disturb
 from .. import time, runtime_state, distributed, runtime_settings
+from ..variables import BASE_DIMENSIONS
+
+# output files created during this run (which might not be written to disk yet)
+_created_files = set()
 
 
 class VerosDiagnostic:
@@ -16,10 +23,30 @@ class VerosDiagnostic:
     sampling_frequency = 0.
     output_frequency = 0.
     output_path = None
+    #: Overrides of the output settings for this diagnostic, e.g.
+    #: ``{'compression': 'zstd', 'shuffle': True}``. Valid keys are ``compression``,
+    #: ``compression_level``, ``shuffle``, ``significant_digits`` (as the corresponding
+    #: ``output_*`` settings), and ``chunks`` (mapping of dimension name to chunk size).
+    output_options = None
+    #: Overrides of the output settings for single variables, mapping variable name to
+    #: a dict as in :attr:`output_options`.
+    variable_output_options = None
+    #: Only write output for part of the domain, as a mapping of axis (``'x'``, ``'y'``,
+    #: or ``'z'``) to either a slice of grid indices or a tuple of coordinate bounds, e.g.
+    #: ``{'x': (-80., 0.), 'z': slice(-5, None)}``.
+    output_region = None
+    #: Write output on a coarser grid, as a mapping of axis to the number of cells that are
+    #: averaged into one output cell, e.g. ``{'x': 4, 'y': 4}``. Averages are weighted with
+    #: cell widths, areas, or volumes, and exclude land cells.
+    output_coarsening = None
 
     def __init__(self, vs):
         pass
 
+    def is_active(self):
+        """Whether this diagnostic is sampled or written at all."""
+        return bool(self.sampling_frequency or self.output_frequency)
+
     def _not_implemented(self, vs):
         raise NotImplementedError('must be implemented by subclass')
 
@@ -40,16 +67,47 @@ class VerosDiagnostic:
 
     @veros_method
     def get_output_file_name(self, vs):
-        return self.output_path.format(**vars(vs))
+        output_path = self.output_path.format(**vars(vs))
+        return backends.get_output_path(backends.get(vs.output_backend), output_path)
+
+    def get_output_options(self, vs, key):
+        """Output options (compression, quantization, and chunking) for variable ``key``."""
+        options = nctools.get_default_output_options(vs)
+
+        for overrides in (self.output_options, (self.variable_output_options or {}).get(key)):
+            if not overrides:
+                continue
+
+            unknown_options = set(overrides) - set(options)
+            if unknown_options:
+                raise ValueError('unknown output options for diagnostic "{}": {}'
+                                 .format(self.name, ', '.join(sorted(unknown_options))))
+
+            options.update(overrides)
+
+        return options
+
+    def get_output_subset(self, vs):
+        """The part of the grid that output is written for (as given by
+        :attr:`output_region` and :attr:`output_coarsening`), or None for the whole grid."""
+        if not self.output_region and not self.output_coarsening:
+            return None
+
+        if getattr(self, '_output_subset', None) is None:
+            self._output_subset = subset.OutputSubset(
+                vs, region=self.output_region, coarsening=self.output_coarsening
+            )
+
+        return self._output_subset
 
     @do_not_disturb
     @veros_method
     def initialize_output(self, vs, variables, var_data=None, extra_dimensions=None):
-        if vs.diskless_mode or (not self.output_frequency and not self.sampling_frequency):
+        if vs.diskless_mode or not self.is_active():
             return
 
         output_path = self.get_output_file_name(vs)
-        if os.path.isfile(output_path) and not vs.force_overwrite:
+        if os.path.exists(self._get_written_file_name(vs, output_path)) and not vs.force_overwrite:
             raise IOError('output file {} for diagnostic "{}" exists '
                           '(change output path or enable force_overwrite setting)'
                           .format(output_path, self.name))
@@ -57,31 +115,101 @@ class VerosDiagnostic:
         # possible race condition!
         distributed.barrier()
 
-        with nctools.threaded_io(vs, output_path, 'w') as outfile:
-            nctools.initialize_file(vs, outfile)
-            if extra_dimensions:
-                for dim_id, size in extra_dimensions.items():
-                    nctools.add_dimension(vs, dim_id, size, outfile)
-            for key, var in variables.items():
-                if key not in outfile.variables:
-                    nctools.initialize_variable(vs, key, var, outfile)
-                if not var.time_dependent:
-                    if var_data is None or key not in var_data:
-                        raise ValueError('var_data argument must be given for constant variables')
-                    nctools.write_variable(vs, key, var, var_data[key], outfile)
+        output_options = {
+            key: self.get_output_options(vs, key)
+            for key in list(BASE_DIMENSIONS) + list(variables.keys())
+        }
+        output_subset = self.get_output_subset(vs)
+        if output_subset is not None:
+            file_spec = output_subset.get_file_spec(vs, variables, extra_dimensions, output_options=output_options)
+        else:
+            file_spec = nctools.get_file_spec(vs, variables, extra_dimensions, output_options=output_options)
+
+        per_process = self._writes_per_process(vs)
+        if per_process:
+            file_spec['attributes'] = merge.get_process_attributes(vs)
+
+        # never round grid coordinates
+        snapshots = self._get_snapshots(
+            vs, {key: vs.variables[key] for key in BASE_DIMENSIONS},
+            {key: getattr(vs, key) for key in BASE_DIMENSIONS}
+        )
+
+        constant_variables = {key: var for key, var in variables.items() if not var.time_dependent}
+        if any(var_data is None or key not in var_data for key in constant_variables):
+            raise ValueError('var_data argument must be given for constant variables')
+
+        snapshots.update(self._get_snapshots(vs, constant_variables, var_data, output_options))
+
+        backend = backends.get(vs.output_backend)
+        io_server.submit(
+            vs, backend.create_file, output_path, file_spec, file_handles.get_options(vs),
+            piece=snapshots, per_process=per_process, root_only=output_subset is not None
+        )
+        _created_files.add(output_path)
+
+    def output_file_exists(self, vs):
+        """Whether the output file has been created (might still be pending when writing
+        output asynchronously)."""
+        output_path = self.get_output_file_name(vs)
+        return (
+            output_path in _created_files
+            or os.path.exists(self._get_written_file_name(vs, output_path))
+        )
+
+    @veros_method
+    def _get_snapshots(self, vs, variables, variable_data, output_options=None):
+        output_subset = self.get_output_subset(vs)
+        # with asynchronous output, the data has to be copied before the simulation continues
+        copy = async_writer.is_enabled(vs)
+
+        snapshots = {}
+        for key, var in variables.items():
+            significant_digits = output_options[key]['significant_digits'] if output_options else 0
+
+            if output_subset is not None:
+                snapshot = output_subset.get_variable_snapshot(
+                    vs, var, variable_data[key], significant_digits=significant_digits
+                )
+                if snapshot is None:
+                    # only written by the first process
+                    continue
+            else:
+                snapshot = nctools.get_variable_snapshot(
+                    vs, var, variable_data[key], copy=copy, significant_digits=significant_digits
+                )
+
+            snapshots[key] = snapshot
+
+        return snapshots
+
+    def _writes_per_process(self, vs):
+        # Zarr output is compressed in parallel anyway, and subsets are written by one process
+        return (
+            merge.is_enabled(vs) and vs.output_backend == 'netcdf'
+            and self.get_output_subset(vs) is None
+        )
+
+    def _get_written_file_name(self, vs, output_path):
+        if self._writes_per_process(vs):
+            return merge.get_process_file_name(output_path, runtime_state.proc_rank)
+        return output_path
 
     @do_not_disturb
     @veros_method
     def write_output(self, vs, variables, variable_data):
         if vs.diskless_mode:
             return
-        with nctools.threaded_io(vs, self.get_output_file_name(vs), 'r+') as outfile:
-            time_step = nctools.get_current_timestep(vs, outfile)
-            current_days = time.convert_time(vs.time, 'seconds', 'days')
-            nctools.advance_time(vs, time_step, current_days, outfile)
-            for key, var in variables.items():
-                nctools.write_variable(vs, key, var, variable_data[key],
-                                       outfile, time_step=time_step)
+
+        output_options = {key: self.get_output_options(vs, key) for key in variables}
+        snapshots = self._get_snapshots(vs, variables, variable_data, output_options)
+        current_days = time.convert_time(vs.time, 'seconds', 'days')
+        backend = backends.get(vs.output_backend)
+        io_server.submit(
+            vs, backend.write_snapshots, self.get_output_file_name(vs), current_days,
+            file_handles.get_options(vs), piece=snapshots, per_process=self._writes_per_process(vs),
+            root_only=self.get_output_subset(vs) is not None
+        )
 
     @veros_method
     def read_h5_restart(self, vs, var_meta, restart_filename):
@@ -91,16 +219,46 @@ class VerosDiagnostic:
         logger.info(' Reading restart data for diagnostic {} from {}',
                     self.name, restart_filename)
 
+        # data that does not match the current setup is skipped before it is read
+        expected_variables = self.get_restart_metadata(vs).variables
+
         with h5tools.threaded_io(vs, restart_filename, 'r') as infile:
+            if self.name not in infile:
+                # e.g. restart files written before this diagnostic existed
+                logger.warning(' No restart data for diagnostic {} in {}, starting from initial state',
+                               self.name, restart_filename)
+                return {}, {}
+
             variables = {}
             for key, var in infile[self.name].items():
                 if np.isscalar(var):
                     variables[key] = var
                     continue
 
+                if key not in var_meta:
+                    logger.warning(' Ignoring restart data for unknown variable {} of diagnostic {}',
+                                   key, self.name)
+                    continue
+
+                expected_var = expected_variables.get(key)
+                if expected_var is not None and tuple(var.shape) != expected_var.shape:
+                    logger.warning(' Not reading restart data for variable {} of diagnostic {}: shape {} '
+                                   'does not match {}', key, self.name, var.shape, expected_var.shape)
+                    continue
+
                 local_shape = distributed.get_local_size(vs, var.shape, var_meta[key].dims, include_overlap=True)
                 gidx, lidx = distributed.get_chunk_slices(vs, var_meta[key].dims[:var.ndim], include_overlap=True)
 
+                if vs.enable_restart_memmap:
+                    memmap = h5tools.get_memmap(var)
+                    if memmap is not None:
+                        if runtime_settings.backend == 'numpy' and tuple(local_shape) == memmap.shape:
+                            # no need to copy, data is only read from disk when it is used
+                            variables[key] = memmap
+                            continue
+
+                        var = memmap
+
                 variables[key] = np.empty(local_shape, dtype=str(var.dtype))
 
                 if runtime_settings.backend == 'bohrium':
@@ -114,37 +272,32 @@ class VerosDiagnostic:
 
         return attributes, variables
 
+    def get_restart_metadata(self, vs):
+        """Attributes, and names, global shapes, and data types of all variables that
+        :meth:`write_restart` writes for the current setup, without collecting any data.
+
+        Returns:
+            :class:`~veros.diagnostics.io_tools.hdf5.RestartGroup`
+        """
+        restart_data = h5tools.RestartData()
+        restart_data.metadata_only = True
+        self.write_restart(vs, restart_data)
+
+        if self.name not in restart_data:
+            return h5tools.RestartGroup(attributes={}, variables={})
+
+        return h5tools.get_group_metadata(restart_data[self.name])
+
     @do_not_disturb
     @veros_method
     def write_h5_restart(self, vs, attributes, var_meta, var_data, outfile):
-        group = outfile.require_group(self.name)
-        for key, var in var_data.items():
-            try:
-                var = var.copy2numpy()
-            except AttributeError:
-                pass
-
-            global_shape = distributed.get_global_size(vs, var.shape, var_meta[key].dims, include_overlap=True)
-            gidx, lidx = distributed.get_chunk_slices(vs, var_meta[key].dims, include_overlap=True)
-
-            kwargs = dict(
-                exact=True,
-                chunks=tuple(
-                    distributed.get_local_size(vs, var.shape, var_meta[key].dims, include_overlap=False)
-                )
-            )
-            if vs.enable_hdf5_gzip_compression and runtime_state.proc_num == 1:
-                kwargs.update(
-                    compression='gzip',
-                    compression_opts=1
-                )
-            group.require_dataset(key, global_shape, var.dtype, **kwargs)
-            group[key][gidx] = var[lidx]
-
-        for key, val in attributes.items():
-            try:
-                val = val.copy2numpy()
-            except AttributeError:
-                pass
-
-            group.attrs[key] = val
+        metadata_only = isinstance(outfile, h5tools.RestartData) and outfile.metadata_only
+        # with asynchronous output, the data has to be copied before the simulation continues
+        copy = isinstance(outfile, h5tools.RestartData) and async_writer.is_enabled(vs) and not metadata_only
+        group_data = h5tools.get_group_data(vs, attributes, var_meta, var_data, copy=copy,
+                                            metadata_only=metadata_only)
+
+        if isinstance(outfile, h5tools.RestartData):
+            outfile[self.name] = group_data
+        else:
+            h5tools.write_group(outfile, self.name, group_data, parallel=runtime_state.proc_num > 1)
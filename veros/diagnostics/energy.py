@@ -1,5 +1,3 @@
-import os
-
 from .diagnostic import VerosDiagnostic
 from .. import veros_method
 from ..variables import Variable
@@ -111,159 +109,178 @@ class Energy(VerosDiagnostic):
         for var in self.variables.keys():
             setattr(self, var, 0.)
 
+        self._weights = self._get_weights(vs)
+
         output_variables = {key: val for key, val in self.variables.items() if val.output}
         self.initialize_output(vs, output_variables)
 
     @veros_method
-    def diagnose(self, vs):
-        # changes of dynamic enthalpy
-        vol_t = vs.area_t[2:-2, 2:-2, np.newaxis] \
-            * vs.dzt[np.newaxis, np.newaxis, :] \
+    def _get_weights(self, vs):
+        """Cell volumes and areas of the local domain (without ghost cells).
+
+        These only depend on the grid, so they are computed once instead of every sample.
+        """
+        area_t = vs.area_t[2:-2, 2:-2]
+
+        vol_t = area_t[:, :, np.newaxis] * vs.dzt[np.newaxis, np.newaxis, :] \
             * vs.maskT[2:-2, 2:-2, :]
-        dP_iso = global_sum(vs,
-            np.sum(vol_t * vs.grav / vs.rho_0
-                         * (-vs.int_drhodT[2:-2, 2:-2, :, vs.tau]
-                           * vs.dtemp_iso[2:-2, 2:-2, :]
-                           - vs.int_drhodS[2:-2, 2:-2, :, vs.tau]
-                           * vs.dsalt_iso[2:-2, 2:-2, :]))
-        )
-        dP_hmix = global_sum(vs,
-            np.sum(vol_t * vs.grav / vs.rho_0
-                         * (-vs.int_drhodT[2:-2, 2:-2, :, vs.tau]
-                            * vs.dtemp_hmix[2:-2, 2:-2, :]
-                            - vs.int_drhodS[2:-2, 2:-2, :, vs.tau]
-                            * vs.dsalt_hmix[2:-2, 2:-2, :]))
-        )
-        dP_vmix = global_sum(vs,
-            np.sum(vol_t * vs.grav / vs.rho_0
-                         * (-vs.int_drhodT[2:-2, 2:-2, :, vs.tau]
-                            * vs.dtemp_vmix[2:-2, 2:-2, :]
-                            - vs.int_drhodS[2:-2, 2:-2, :, vs.tau]
-                            * vs.dsalt_vmix[2:-2, 2:-2, :]))
-        )
-        dP_m = global_sum(vs,
-            np.sum(vol_t * vs.grav / vs.rho_0
-                      * (-vs.int_drhodT[2:-2, 2:-2, :, vs.tau]
-                          * vs.dtemp[2:-2, 2:-2, :, vs.tau]
-                          - vs.int_drhodS[2:-2, 2:-2, :, vs.tau]
-                          * vs.dsalt[2:-2, 2:-2, :, vs.tau]))
-        )
-        dP_m_all = dP_m + dP_vmix + dP_hmix + dP_iso
-
-        # changes of kinetic energy
-        vol_u = vs.area_u[2:-2, 2:-2, np.newaxis] \
-            * vs.dzt[np.newaxis, np.newaxis, :]
-        vol_v = vs.area_v[2:-2, 2:-2, np.newaxis] \
-            * vs.dzt[np.newaxis, np.newaxis, :]
-        k_m = global_sum(vs,
-            np.sum(vol_t * 0.5 * (0.5 * (vs.u[2:-2, 2:-2, :, vs.tau] ** 2
-                                           + vs.u[1:-3, 2:-2, :, vs.tau] ** 2)
-                                    + 0.5 * (vs.v[2:-2, 2:-2, :, vs.tau] ** 2)
-                                    + vs.v[2:-2, 1:-3, :, vs.tau] ** 2))
+        vol_u = vs.area_u[2:-2, 2:-2, np.newaxis] * vs.dzt[np.newaxis, np.newaxis, :]
+        vol_v = vs.area_v[2:-2, 2:-2, np.newaxis] * vs.dzt[np.newaxis, np.newaxis, :]
+        vol_w = area_t[:, :, np.newaxis] * vs.dzw[np.newaxis, np.newaxis, :] \
+            * vs.maskW[2:-2, 2:-2, :]
+        vol_w[:, :, -1] *= 0.5
+
+        # area of the lowermost W-cell of each water column
+        k = np.maximum(1, vs.kbot[2:-2, 2:-2]) - 1
+        mask = k[:, :, np.newaxis] == np.arange(vs.nz)[np.newaxis, np.newaxis, :]
+        area_bottom = area_t * np.sum(mask * vs.maskW[2:-2, 2:-2, :], axis=2)
+
+        return dict(
+            vol_t=vol_t,
+            vol_u=vol_u,
+            vol_v=vol_v,
+            vol_w=vol_w,
+            area_w=area_t[:, :, np.newaxis] * vs.maskW[2:-2, 2:-2, :-1],
+            area_surface=area_t * vs.maskW[2:-2, 2:-2, -1],
+            area_bottom=area_bottom,
+            area_u_surface=vs.area_u[2:-2, 2:-2] * vs.maskU[2:-2, 2:-2, -1],
+            area_v_surface=vs.area_v[2:-2, 2:-2] * vs.maskV[2:-2, 2:-2, -1],
         )
-        p_m = global_sum(vs, np.sum(vol_t * vs.Hd[2:-2, 2:-2, :, vs.tau]))
-        dk_m = global_sum(vs,
-            np.sum(vs.u[2:-2, 2:-2, :, vs.tau] * vs.du[2:-2, 2:-2, :, vs.tau] * vol_u
-                      + vs.v[2:-2, 2:-2, :, vs.tau]
-                      * vs.dv[2:-2, 2:-2, :, vs.tau] * vol_v
-                      + vs.u[2:-2, 2:-2, :, vs.tau] * vs.du_mix[2:-2, 2:-2, :] * vol_u
-                      + vs.v[2:-2, 2:-2, :, vs.tau] * vs.dv_mix[2:-2, 2:-2, :] * vol_v)
+
+    @veros_method
+    def _get_local_integrals(self, vs):
+        """Integrals over the local domain of all energy terms.
+
+        Constant factors are applied to the global integrals instead, see :meth:`diagnose`.
+        """
+        weights = self._weights
+        vol_t, vol_w = weights['vol_t'], weights['vol_w']
+        tau, taup1 = vs.tau, vs.taup1
+
+        integrals = {}
+
+        # changes of dynamic enthalpy by advection and all mixing processes
+        dtemp = vs.dtemp[2:-2, 2:-2, :, tau] + vs.dtemp_vmix[2:-2, 2:-2, :] \
+            + vs.dtemp_hmix[2:-2, 2:-2, :] + vs.dtemp_iso[2:-2, 2:-2, :]
+        dsalt = vs.dsalt[2:-2, 2:-2, :, tau] + vs.dsalt_vmix[2:-2, 2:-2, :] \
+            + vs.dsalt_hmix[2:-2, 2:-2, :] + vs.dsalt_iso[2:-2, 2:-2, :]
+        integrals['dP'] = -np.sum(vol_t * (vs.int_drhodT[2:-2, 2:-2, :, tau] * dtemp
+                                           + vs.int_drhodS[2:-2, 2:-2, :, tau] * dsalt))
+
+        # kinetic energy (including velocities of western and southern neighbors) and its changes
+        u = vs.u[1:-2, 2:-2, :, tau]
+        v = vs.v[2:-2, 1:-2, :, tau]
+        u_sqr = u * u
+        v_sqr = v * v
+        integrals['k'] = np.sum(vol_t * (0.25 * (u_sqr[1:] + u_sqr[:-1])
+                                         + 0.25 * v_sqr[:, 1:] + 0.5 * v_sqr[:, :-1]))
+        integrals['dk'] = np.sum(
+            u[1:] * (vs.du[2:-2, 2:-2, :, tau] + vs.du_mix[2:-2, 2:-2, :]) * weights['vol_u']
+            + v[:, 1:] * (vs.dv[2:-2, 2:-2, :, tau] + vs.dv_mix[2:-2, 2:-2, :]) * weights['vol_v']
         )
+        integrals['p'] = np.sum(vol_t * vs.Hd[2:-2, 2:-2, :, tau])
 
         # K*Nsqr and KE and dyn. enthalpy dissipation
-        vol_w = vs.area_t[2:-2, 2:-2, np.newaxis] * vs.dzw[np.newaxis, np.newaxis, :] \
-            * vs.maskW[2:-2, 2:-2, :]
-        vol_w[:, :, -1] *= 0.5
+        for var in ('P_diss_v', 'P_diss_nonlin', 'P_diss_adv', 'P_diss_hmix', 'P_diss_iso',
+                    'P_diss_skew', 'P_diss_sources', 'K_diss_h', 'K_diss_v', 'K_diss_gm',
+                    'K_diss_bot'):
+            integrals[var] = np.sum(vol_w * getattr(vs, var)[2:-2, 2:-2, :])
 
-        def mean_w(var):
-            return global_sum(vs, np.sum(var[2:-2, 2:-2, :] * vol_w))
-
-        mdiss_vmix = mean_w(vs.P_diss_v)
-        mdiss_nonlin = mean_w(vs.P_diss_nonlin)
-        mdiss_adv = mean_w(vs.P_diss_adv)
-        mdiss_hmix = mean_w(vs.P_diss_hmix)
-        mdiss_iso = mean_w(vs.P_diss_iso)
-        mdiss_skew = mean_w(vs.P_diss_skew)
-        mdiss_sources = mean_w(vs.P_diss_sources)
-
-        mdiss_h = mean_w(vs.K_diss_h)
-        mdiss_v = mean_w(vs.K_diss_v)
-        mdiss_gm = mean_w(vs.K_diss_gm)
-        mdiss_bot = mean_w(vs.K_diss_bot)
-
-        wrhom = global_sum(vs, 
-            np.sum(-vs.area_t[2:-2, 2:-2, np.newaxis] * vs.maskW[2:-2, 2:-2, :-1]
-                       * (vs.p_hydro[2:-2, 2:-2, 1:] - vs.p_hydro[2:-2, 2:-2, :-1])
-                       * vs.w[2:-2, 2:-2, :-1, vs.tau])
-        )
+        integrals['wrhom'] = -np.sum(weights['area_w']
+                                     * (vs.p_hydro[2:-2, 2:-2, 1:] - vs.p_hydro[2:-2, 2:-2, :-1])
+                                     * vs.w[2:-2, 2:-2, :-1, tau])
 
         # wind work
-        if vs.pyom_compatibility_mode:
-            wind = global_sum(
-                vs,
-                np.sum(vs.u[2:-2, 2:-2, -1, vs.tau] * vs.surface_taux[2:-2, 2:-2]
-                       * vs.maskU[2:-2, 2:-2, -1] * vs.area_u[2:-2, 2:-2]
-                       + vs.v[2:-2, 2:-2, -1, vs.tau] * vs.surface_tauy[2:-2, 2:-2]
-                       * vs.maskV[2:-2, 2:-2, -1] * vs.area_v[2:-2, 2:-2])
-            )
-        else:
-            wind = global_sum(
-                vs,
-                np.sum(vs.u[2:-2, 2:-2, -1, vs.tau] * vs.surface_taux[2:-2, 2:-2] / vs.rho_0
-                       * vs.maskU[2:-2, 2:-2, -1] * vs.area_u[2:-2, 2:-2]
-                       + vs.v[2:-2, 2:-2, -1, vs.tau] * vs.surface_tauy[2:-2, 2:-2] / vs.rho_0
-                       * vs.maskV[2:-2, 2:-2, -1] * vs.area_v[2:-2, 2:-2])
-            )
+        integrals['wind'] = np.sum(
+            u[1:, :, -1] * vs.surface_taux[2:-2, 2:-2] * weights['area_u_surface']
+            + v[:, 1:, -1] * vs.surface_tauy[2:-2, 2:-2] * weights['area_v_surface']
+        )
 
         # meso-scale energy
         if vs.enable_eke:
-            eke_m = mean_w(vs.eke[..., vs.tau])
-            deke_m = global_sum(vs,
-                np.sum(vol_w * (vs.eke[2:-2, 2:-2, :, vs.taup1]
-                                - vs.eke[2:-2, 2:-2, :, vs.tau])
-                       / vs.dt_tracer)
-            )
-            eke_diss = mean_w(vs.eke_diss_iw)
-            eke_diss_tke = mean_w(vs.eke_diss_tke)
+            eke = vs.eke[2:-2, 2:-2, :, tau]
+            integrals['eke'] = np.sum(vol_w * eke)
+            integrals['deke'] = np.sum(vol_w * (vs.eke[2:-2, 2:-2, :, taup1] - eke))
+            integrals['eke_diss_iw'] = np.sum(vol_w * vs.eke_diss_iw[2:-2, 2:-2, :])
+            integrals['eke_diss_tke'] = np.sum(vol_w * vs.eke_diss_tke[2:-2, 2:-2, :])
+
+        # small-scale energy
+        if vs.enable_tke:
+            tke = vs.tke[2:-2, 2:-2, :, tau]
+            integrals['tke'] = np.sum(vol_w * tke)
+            integrals['dtke'] = np.sum(vol_w * (vs.tke[2:-2, 2:-2, :, taup1] - tke))
+            integrals['tke_diss'] = np.sum(vol_w * vs.tke_diss[2:-2, 2:-2, :])
+            integrals['tke_forc'] = np.sum(weights['area_surface'] * (vs.forc_tke_surface[2:-2, 2:-2]
+                                                                      + vs.tke_surf_corr[2:-2, 2:-2]))
+
+        # internal wave energy
+        if vs.enable_idemix:
+            E_iw = vs.E_iw[2:-2, 2:-2, :, tau]
+            integrals['iw'] = np.sum(vol_w * E_iw)
+            integrals['diw'] = np.sum(vol_w * (vs.E_iw[2:-2, 2:-2, :, taup1] - E_iw))
+            integrals['iw_diss'] = np.sum(vol_w * vs.iw_diss[2:-2, 2:-2, :])
+            integrals['iw_forc'] = np.sum(weights['area_surface'] * vs.forc_iw_surface[2:-2, 2:-2]
+                                          + weights['area_bottom'] * vs.forc_iw_bottom[2:-2, 2:-2])
+
+        return integrals
+
+    @veros_method
+    def diagnose(self, vs):
+        local_integrals = self._get_local_integrals(vs)
+
+        # sum all integrals over all processes at once
+        keys = list(local_integrals.keys())
+        global_integrals = global_sum(vs, np.stack([local_integrals[key] for key in keys]))
+        integrals = dict(zip(keys, global_integrals))
+
+        dP_m_all = integrals['dP'] * vs.grav / vs.rho_0
+        k_m = integrals['k']
+        p_m = integrals['p']
+        dk_m = integrals['dk']
+
+        mdiss_vmix = integrals['P_diss_v']
+        mdiss_nonlin = integrals['P_diss_nonlin']
+        mdiss_adv = integrals['P_diss_adv']
+        mdiss_hmix = integrals['P_diss_hmix']
+        mdiss_iso = integrals['P_diss_iso']
+        mdiss_skew = integrals['P_diss_skew']
+        mdiss_sources = integrals['P_diss_sources']
+
+        mdiss_h = integrals['K_diss_h']
+        mdiss_v = integrals['K_diss_v']
+        mdiss_gm = integrals['K_diss_gm']
+        mdiss_bot = integrals['K_diss_bot']
+
+        wrhom = integrals['wrhom']
+
+        wind = integrals['wind']
+        if not vs.pyom_compatibility_mode:
+            wind = wind / vs.rho_0
+
+        if vs.enable_eke:
+            eke_m = integrals['eke']
+            deke_m = integrals['deke'] / vs.dt_tracer
+            eke_diss = integrals['eke_diss_iw']
+            eke_diss_tke = integrals['eke_diss_tke']
         else:
             eke_m = deke_m = eke_diss_tke = 0.
             eke_diss = mdiss_gm + mdiss_h + mdiss_skew
             if not vs.enable_store_cabbeling_heat:
                 eke_diss += -mdiss_hmix - mdiss_iso
 
-        # small-scale energy
         if vs.enable_tke:
-            dt_tke = vs.dt_mom
-            tke_m = mean_w(vs.tke[..., vs.tau])
-            dtke_m = mean_w((vs.tke[..., vs.taup1]
-                             - vs.tke[..., vs.tau])
-                            / dt_tke)
-            tke_diss = mean_w(vs.tke_diss)
-            tke_forc = global_sum(vs,
-                np.sum(vs.area_t[2:-2, 2:-2] * vs.maskW[2:-2, 2:-2, -1]
-                              * (vs.forc_tke_surface[2:-2, 2:-2] + vs.tke_surf_corr[2:-2, 2:-2]))
-            )
+            tke_m = integrals['tke']
+            dtke_m = integrals['dtke'] / vs.dt_mom
+            tke_diss = integrals['tke_diss']
+            tke_forc = integrals['tke_forc']
         else:
             tke_m = dtke_m = tke_diss = tke_forc = 0.
 
-        # internal wave energy
         if vs.enable_idemix:
-            iw_m = mean_w(vs.E_iw[..., vs.tau])
-            diw_m = global_sum(vs,
-                np.sum(vol_w * (vs.E_iw[2:-2, 2:-2, :, vs.taup1]
-                                    - vs.E_iw[2:-2, 2:-2, :, vs.tau])
-                           / vs.dt_tracer)
-            )
-            iw_diss = mean_w(vs.iw_diss)
-
-            k = np.maximum(1, vs.kbot[2:-2, 2:-2]) - 1
-            mask = k[:, :, np.newaxis] == np.arange(vs.nz)[np.newaxis, np.newaxis, :]
-            iwforc = global_sum(vs, 
-                np.sum(vs.area_t[2:-2, 2:-2]
-                            * (vs.forc_iw_surface[2:-2, 2:-2] * vs.maskW[2:-2, 2:-2, -1]
-                               + np.sum(mask * vs.forc_iw_bottom[2:-2, 2:-2, np.newaxis]
-                                        * vs.maskW[2:-2, 2:-2, :], axis=2)))
-            )
+            iw_m = integrals['iw']
+            diw_m = integrals['diw'] / vs.dt_tracer
+            iw_diss = integrals['iw_diss']
+            iwforc = integrals['iw_forc']
         else:
             iw_m = diw_m = iwforc = 0.
             iw_diss = eke_diss
@@ -321,7 +338,7 @@ class Energy(VerosDiagnostic):
         output_variables = {key: val for key, val in self.variables.items() if val.output}
         output_data = {key: getattr(self, key) * vs.rho_0 / self.nitts
                        for key in output_variables.keys()}
-        if not os.path.isfile(self.get_output_file_name(vs)):
+        if not self.output_file_exists(vs):
             self.initialize_output(vs, output_variables)
         self.write_output(vs, output_variables, output_data)
 
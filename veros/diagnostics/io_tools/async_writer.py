@@ -0,0 +1,190 @@
+import queue
+import atexit
+import threading
+import time as time_
+
+from loguru import logger
+
+from ... import runtime_state, runtime_settings as rs
+
+"""
+Background writer for diagnostic output.
+
+Output data is copied on the compute thread and handed to a bounded queue, from which
+a single writer thread takes care of masking, transposition, compression, and the actual
+writes. If the queue is full, the compute thread blocks until the writer catches up.
+
+In distributed runs, the writer thread performs collective I/O on a communicator of its
+own, so that it never interferes with collective calls of the simulation (which MPI does
+not allow on the same communicator, even if it supports concurrent calls from threads).
+"""
+
+_writer = None
+_writer_lock = threading.Lock()
+
+# duplicate of the communicator of all compute processes for the writer thread,
+# as (original communicator, duplicate)
+_comm = (None, None)
+
+
+class AsyncWriter:
+    """Executes submitted jobs in order on a background thread.
+
+    Arguments:
+        max_queue_size: Maximum number of pending jobs. :meth:`submit` blocks while
+            the queue is full.
+        comm: MPI communicator that is passed to all collective jobs (those submitted
+            with ``parallel=True``), must not be used by any other thread.
+
+    """
+    def __init__(self, max_queue_size, comm=None):
+        self.comm = comm
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._work, name='veros-io', daemon=True)
+        self._thread.start()
+
+    def submit(self, function, *args, **kwargs):
+        """Queue a call to ``function(*args, **kwargs)``.
+
+        Raises errors from previously submitted jobs.
+        """
+        self._raise_errors()
+
+        if kwargs.get('parallel') and self.comm is not None:
+            kwargs['comm'] = self.comm
+
+        if self._queue.full():
+            start = time_.time()
+            self._queue.put((function, args, kwargs))
+            logger.debug('Waited {:.2f}s for output queue', time_.time() - start)
+        else:
+            self._queue.put((function, args, kwargs))
+
+    def flush(self):
+        """Block until all submitted jobs are done."""
+        self._queue.join()
+        self._raise_errors()
+
+    def close(self):
+        """Finish all pending jobs and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_errors()
+
+    def _raise_errors(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Error while writing output in the background') from error
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+
+                if self._error is not None:
+                    # do not write anything after a failure
+                    continue
+
+                function, args, kwargs = job
+                function(*args, **kwargs)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+
+def initialize(vs):
+    """Create the communicator of the writer thread.
+
+    Must be called by all compute processes, since duplicating a communicator is a
+    collective operation (unlike the first submitted job, which might only be submitted
+    by some processes).
+    """
+    global _comm
+
+    if not vs.enable_async_output or vs.diskless_mode or runtime_state.proc_num == 1:
+        return
+
+    if _comm[0] is not rs.mpi_comm and _supports_threaded_mpi():
+        _comm = (rs.mpi_comm, rs.mpi_comm.Dup())
+
+
+def _get_comm():
+    base_comm, comm = _comm
+    if base_comm is None or base_comm is not rs.mpi_comm:
+        return None
+    return comm
+
+
+def is_enabled(vs):
+    """Whether output is written in the background."""
+    if not vs.enable_async_output or vs.diskless_mode:
+        return False
+
+    if runtime_state.proc_num > 1 and (not _supports_threaded_mpi() or _get_comm() is None):
+        return False
+
+    return True
+
+
+def get_writer(vs):
+    """Returns the global writer (created on first use)."""
+    global _writer
+
+    with _writer_lock:
+        if _writer is None:
+            _writer = AsyncWriter(max_queue_size=vs.io_queue_size, comm=_get_comm())
+
+    return _writer
+
+
+def submit(vs, function, *args, **kwargs):
+    """Run ``function(*args, **kwargs)`` in the background if asynchronous output
+    is enabled, otherwise right away."""
+    if not is_enabled(vs):
+        return function(*args, **kwargs)
+
+    get_writer(vs).submit(function, *args, **kwargs)
+
+
+def flush():
+    """Block until all pending output is written."""
+    if _writer is not None:
+        _writer.flush()
+
+
+def close():
+    """Write all pending output and stop the writer thread."""
+    global _writer
+
+    with _writer_lock:
+        writer, _writer = _writer, None
+
+    if writer is not None:
+        writer.close()
+
+
+atexit.register(close)
+
+
+_threaded_mpi_support = None
+
+
+def _supports_threaded_mpi():
+    global _threaded_mpi_support
+
+    if _threaded_mpi_support is None:
+        from mpi4py import MPI
+        _threaded_mpi_support = MPI.Query_thread() == MPI.THREAD_MULTIPLE
+
+        if not _threaded_mpi_support:
+            logger.warning(
+                'MPI library does not support concurrent calls from multiple threads - '
+                'writing output synchronously'
+            )
+
+    return _threaded_mpi_support
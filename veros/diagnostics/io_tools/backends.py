@@ -0,0 +1,66 @@
+import os
+import importlib
+
+"""
+Pluggable output backends.
+
+An output backend is a module (or any other object) that provides
+
+- an attribute ``file_extension`` (e.g. ``'.nc'``),
+- a function ``create_file(filepath, file_spec, file_options, snapshots, parallel=False, comm=None)``
+  that creates a new output file as described by
+  :func:`veros.diagnostics.io_tools.netcdf.get_file_spec` and writes the given
+  constant data to it, and
+- a function ``write_snapshots(filepath, time_value, file_options, snapshots, parallel=False, comm=None)``
+  that appends a new time step to an existing output file.
+
+If ``parallel`` is set, both functions are called collectively by all processes, and
+have to use ``comm`` (or ``runtime_settings.mpi_comm`` if it is None) for all
+collective calls.
+
+Both functions are used as output jobs (see :mod:`veros.diagnostics.io_tools.io_server`),
+so they must not access the Veros state and have to be picklable. The backend used by
+all diagnostics is chosen through the ``output_backend`` setting.
+"""
+
+_backends = {
+    'netcdf': 'veros.diagnostics.io_tools.netcdf',
+    'zarr': 'veros.diagnostics.io_tools.zarr',
+}
+
+#: File extension used in the default output paths of all diagnostics
+DEFAULT_EXTENSION = '.nc'
+
+
+def register(name, backend):
+    """Make a new output backend available.
+
+    Arguments:
+        name: Name of the backend, as used in the ``output_backend`` setting.
+        backend: Backend module, or its import path.
+
+    """
+    _backends[name] = backend
+
+
+def get(name):
+    """Returns the output backend with the given name."""
+    try:
+        backend = _backends[name]
+    except KeyError:
+        raise ValueError('unknown output backend "{}" (available: {})'
+                         .format(name, ', '.join(sorted(_backends))))
+
+    if isinstance(backend, str):
+        backend = _backends[name] = importlib.import_module(backend)
+
+    return backend
+
+
+def get_output_path(backend, output_path):
+    """Replace the default file extension in ``output_path`` by the one
+    used by ``backend``."""
+    root, ext = os.path.splitext(output_path)
+    if ext == DEFAULT_EXTENSION:
+        return root + backend.file_extension
+    return output_path
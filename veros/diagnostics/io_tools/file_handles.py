@@ -0,0 +1,109 @@
+import atexit
+import contextlib
+
+from loguru import logger
+
+from ...timer import Timer
+
+"""
+Keeps output files open between writes.
+
+Re-opening a file for every output step (and closing it afterwards) is expensive,
+especially for high-frequency output on parallel file systems. Instead, handles are
+kept open for the whole run and flushed every ``output_flush_frequency`` writes.
+All handles are closed at the end of the run, or at exit at the latest.
+"""
+
+_handles = {}
+
+#: Time spent opening and closing files
+open_close_timer = Timer()
+
+#: Time spent flushing open files
+flush_timer = Timer()
+
+#: Number of times a file was opened / an open handle was re-used
+stats = dict(opened=0, reused=0)
+
+
+def get_options(vs):
+    """File handling options as passed to output jobs."""
+    return dict(
+        keep_open=vs.keep_output_files_open,
+        flush_frequency=vs.output_flush_frequency
+    )
+
+
+@contextlib.contextmanager
+def open_file(filepath, mode, options, opener):
+    """Context manager yielding a handle to ``filepath``.
+
+    An existing handle is re-used if possible (unless ``mode`` is ``'w'``), and the file
+    is only closed on exit if ``keep_open`` is not set in ``options``.
+
+    Arguments:
+        opener: Function that opens the file, called as ``opener(filepath, mode)``.
+
+    """
+    if mode == 'w':
+        close(filepath)
+
+    if filepath in _handles:
+        handle, writes_since_flush = _handles.pop(filepath)
+        stats['reused'] += 1
+    else:
+        with open_close_timer:
+            handle = opener(filepath, mode)
+        writes_since_flush = 0
+        stats['opened'] += 1
+
+    try:
+        yield handle
+    except:  # noqa: E722
+        try:
+            _close_handle(handle)
+        except Exception:
+            logger.exception('Error while closing output file {}', filepath)
+        raise
+
+    if not options['keep_open']:
+        _close_handle(handle)
+        return
+
+    writes_since_flush += 1
+    if writes_since_flush >= options['flush_frequency']:
+        with flush_timer:
+            handle.flush()
+        writes_since_flush = 0
+
+    _handles[filepath] = (handle, writes_since_flush)
+
+
+def close(filepath):
+    """Close the handle to ``filepath`` if it is open."""
+    handle, _ = _handles.pop(filepath, (None, None))
+    if handle is not None:
+        _close_handle(handle)
+
+
+def close_all():
+    """Close all open handles."""
+    for filepath in list(_handles.keys()):
+        close(filepath)
+
+
+def get_time_saved():
+    """Estimated time saved by re-using open handles (net of the time spent flushing)."""
+    if not stats['opened']:
+        return 0.
+
+    time_per_open = open_close_timer.get_time() / stats['opened']
+    return stats['reused'] * time_per_open - flush_timer.get_time()
+
+
+def _close_handle(handle):
+    with open_close_timer:
+        handle.close()
+
+
+atexit.register(close_all)
@@ -1,15 +1,377 @@
+import os
+import hashlib
 import threading
 import contextlib
+from collections import namedtuple
 
+import numpy
 from loguru import logger
 
 from ... import runtime_settings, runtime_state
 
 
+class RestartData(dict):
+    """Collects restart data of all diagnostics (as returned by :func:`get_group_data`)
+    if it is not written to an open file right away.
+
+    Attributes:
+        attributes: Attributes of the restart file.
+        metadata_only: If True, only names, shapes, and data types of the variables are
+            collected, without any data.
+
+    """
+    def __init__(self, *args, **kwargs):
+        super(RestartData, self).__init__(*args, **kwargs)
+        self.attributes = {}
+        self.metadata_only = False
+
+
+#: First HDF5 version that can apply filters (e.g. compression) in parallel writes
+PARALLEL_FILTERS_MIN_VERSION = (1, 10, 2)
+
+_warned_parallel_filters = False
+
+
+def get_parallel_filter_kwargs(kwargs):
+    """Filter arguments (compression, shuffling) of a dataset that is written collectively
+    by all processes.
+
+    HDF5 only supports filters in parallel writes since version 1.10.2, so with older
+    versions all filters are dropped.
+    """
+    global _warned_parallel_filters
+
+    import h5py
+
+    if not kwargs or h5py.version.hdf5_version_tuple >= PARALLEL_FILTERS_MIN_VERSION:
+        return kwargs
+
+    if not _warned_parallel_filters:
+        logger.warning(
+            'HDF5 {} cannot compress data in parallel writes (requires {} or later) - '
+            'writing uncompressed files (set enable_per_process_output to compress them)',
+            h5py.version.hdf5_version, '.'.join(map(str, PARALLEL_FILTERS_MIN_VERSION))
+        )
+        _warned_parallel_filters = True
+
+    return {}
+
+
+@contextlib.contextmanager
+def collective_write(dataset):
+    """Makes writes to a dataset inside this context collective if the dataset has filters
+    and its file is opened through MPI-IO, as required by HDF5.
+
+    All processes then have to write to the dataset in the same order.
+    """
+    if dataset.file.driver == 'mpio' and dataset.id.get_create_plist().get_nfilters():
+        with dataset.collective:
+            yield
+    else:
+        yield
+
+
+#: Global shape, data type, and dimension names of a variable in a restart file
+RestartVariable = namedtuple('RestartVariable', ('shape', 'dtype', 'dims'))
+
+#: Attributes and variables (as :class:`RestartVariable`) of a restart group
+RestartGroup = namedtuple('RestartGroup', ('attributes', 'variables'))
+
+
+def get_group_data(vs, attributes, var_meta, var_data, copy=False, metadata_only=False):
+    """Describe the datasets and attributes of a restart group, including the local data
+    of the current process and its position in the global arrays.
+
+    If copy is True, the data is copied, so it can be written while the simulation continues.
+    If metadata_only is True, no data is included at all.
+    """
+    from ... import distributed
+    from . import merge
+
+    # contiguous datasets can be memory-mapped when reading (see get_memmap);
+    # per-process files rely on chunks to only store local data
+    contiguous = vs.enable_restart_memmap and not merge.is_enabled(vs)
+
+    variables = {}
+    for key, var in var_data.items():
+        if not metadata_only:
+            try:
+                var = var.copy2numpy()
+            except AttributeError:
+                pass
+
+        global_shape = distributed.get_global_size(vs, var.shape, var_meta[key].dims, include_overlap=True)
+        gidx, lidx = distributed.get_chunk_slices(vs, var_meta[key].dims, include_overlap=True)
+
+        kwargs = {}
+        if vs.enable_hdf5_gzip_compression and not contiguous:
+            kwargs.update(
+                compression='gzip',
+                compression_opts=1
+            )
+
+        variables[key] = dict(
+            shape=tuple(global_shape),
+            dtype=var.dtype,
+            chunks=None if contiguous else tuple(
+                distributed.get_storage_chunk_size(vs, var.shape, var_meta[key].dims)
+            ),
+            kwargs=kwargs,
+            dims=[str(dim) for dim in var_meta[key].dims],
+            index=gidx,
+            data=None if metadata_only else (numpy.array(var[lidx]) if copy else var[lidx])
+        )
+
+    group_attributes = {}
+    for key, val in attributes.items():
+        try:
+            val = val.copy2numpy()
+        except AttributeError:
+            pass
+
+        if copy and isinstance(val, numpy.ndarray):
+            val = val.copy()
+
+        group_attributes[key] = val
+
+    return dict(variables=variables, attributes=group_attributes)
+
+
+def write_group(h5file, name, group_data, parallel=False):
+    """Write restart data as returned by :func:`get_group_data` to an open file."""
+    import h5py
+
+    group = h5file.require_group(name)
+    for key, var in group_data['variables'].items():
+        if var.get('link') is not None:
+            # data is stored in another file
+            if group.get(key, getlink=True) is None:
+                group[key] = h5py.ExternalLink(*var['link'])
+            continue
+
+        kwargs = var['kwargs']
+        if parallel:
+            kwargs = get_parallel_filter_kwargs(kwargs)
+
+        dataset = group.require_dataset(key, var['shape'], var['dtype'], exact=True,
+                                        chunks=var['chunks'], **kwargs)
+        with collective_write(dataset):
+            dataset[var['index']] = var['data']
+        dataset.attrs['dims'] = var['dims']
+
+    for key, val in group_data['attributes'].items():
+        group.attrs[key] = val
+
+
+def write_restart_file(filepath, restart_data, parallel=False, comm=None):
+    """Write a new restart file.
+
+    The data is written to a temporary file first, which is only moved to ``filepath``
+    when it is complete. This way, an interrupted write never replaces an existing
+    restart file by an incomplete one.
+
+    Arguments:
+        restart_data: List containing one :class:`RestartData` object per contributing process.
+        parallel: Whether this is called collectively by all processes.
+        comm: Communicator of all processes if parallel (defaults to the global one).
+
+    """
+    import h5py
+
+    if comm is None:
+        comm = runtime_settings.mpi_comm
+
+    kwargs = {}
+    if parallel:
+        kwargs.update(
+            driver='mpio',
+            comm=comm
+        )
+
+    tmp_filepath = get_temporary_file_name(filepath)
+    with h5py.File(tmp_filepath, 'w', **kwargs) as h5file:
+        for proc_data in restart_data:
+            h5file.attrs.update(proc_data.attributes)
+            for name, group_data in proc_data.items():
+                write_group(h5file, name, group_data, parallel=parallel)
+
+    _move_into_place(tmp_filepath, filepath, parallel=parallel, comm=comm)
+
+
+def get_group_metadata(group_data):
+    """Metadata of restart data as returned by :func:`get_group_data`, as :class:`RestartGroup`."""
+    return RestartGroup(
+        attributes=dict(group_data['attributes']),
+        variables={
+            key: RestartVariable(tuple(var['shape']), numpy.dtype(var['dtype']), tuple(var['dims']))
+            for key, var in group_data['variables'].items()
+        }
+    )
+
+
+def read_restart_metadata(filepath):
+    """Read the metadata of a restart file, without reading any data.
+
+    Returns:
+        Tuple of the file attributes and a dict of :class:`RestartGroup` per group
+        (i.e., per diagnostic).
+
+    """
+    import h5py
+
+    def to_python(val):
+        if isinstance(val, bytes):
+            return val.decode('utf-8')
+        if isinstance(val, numpy.ndarray) and val.ndim == 0 or isinstance(val, numpy.generic):
+            return val.item()
+        return val
+
+    with h5py.File(filepath, 'r') as h5file:
+        file_attributes = {key: to_python(val) for key, val in h5file.attrs.items()}
+
+        groups = {}
+        for name, group in h5file.items():
+            variables = {}
+            for key, dataset in group.items():
+                dims = tuple(to_python(dim) for dim in dataset.attrs.get('dims', ()))
+                variables[key] = RestartVariable(dataset.shape, dataset.dtype, dims)
+
+            groups[name] = RestartGroup(
+                attributes={key: to_python(val) for key, val in group.attrs.items()},
+                variables=variables
+            )
+
+    return file_attributes, groups
+
+
+def get_temporary_file_name(filepath):
+    """Name of the file that restart data is written to before it is complete."""
+    return filepath + '.incomplete'
+
+
+def _fsync(path):
+    """Flush a file or directory to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _replace(tmp_filepath, filepath):
+    # without flushing, a crash could leave an empty or truncated file under the final name
+    _fsync(tmp_filepath)
+    os.replace(tmp_filepath, filepath)
+
+    # make the renaming itself durable (directories cannot be opened on Windows)
+    if os.name == 'posix':
+        _fsync(os.path.dirname(os.path.abspath(filepath)))
+
+
+def _move_into_place(tmp_filepath, filepath, parallel=False, comm=None):
+    if parallel:
+        if comm is None:
+            comm = runtime_settings.mpi_comm
+        # make sure all processes closed the file
+        comm.Barrier()
+        if comm.Get_rank() == 0:
+            _replace(tmp_filepath, filepath)
+        comm.Barrier()
+    else:
+        _replace(tmp_filepath, filepath)
+
+
+def get_memmap(dataset):
+    """Memory map of the data of an HDF5 dataset, or None if the dataset is not stored
+    contiguously and uncompressed in its file.
+
+    The map is copy-on-write, so modifying it never changes the file.
+    """
+    if dataset.chunks is not None or dataset.external or dataset.is_virtual:
+        return None
+
+    dtype = dataset.dtype
+    if dtype.kind not in 'biuf' or not dtype.isnative:
+        return None
+
+    offset = dataset.id.get_offset()
+    if offset is None:
+        # no storage allocated
+        return None
+
+    return numpy.memmap(dataset.file.filename, mode='c', dtype=dtype,
+                        shape=dataset.shape, offset=offset)
+
+
+def get_checksum(data):
+    """Checksum identifying the contents of a NumPy array."""
+    data = numpy.ascontiguousarray(data)
+    checksum = hashlib.blake2b(digest_size=16)
+    checksum.update('{} {}'.format(data.dtype.str, data.shape).encode('utf-8'))
+    checksum.update(data.reshape(-1).view(numpy.uint8))
+    return checksum.hexdigest()
+
+
+def get_restart_checksums(restart_data):
+    """Checksums of all variables in a :class:`RestartData` object, indexed by
+    ``(group name, variable name)``."""
+    return {
+        (name, key): get_checksum(var['data'])
+        for name, group_data in restart_data.items()
+        for key, var in group_data['variables'].items()
+        if var.get('link') is None
+    }
+
+
+def read_restart_checksums(filepath, restart_data):
+    """Checksums of the data stored in an existing restart file, at the same positions as
+    the variables in a :class:`RestartData` object."""
+    import h5py
+
+    checksums = {}
+    with h5py.File(filepath, 'r') as h5file:
+        for name, group_data in restart_data.items():
+            if name not in h5file:
+                continue
+
+            for key, var in group_data['variables'].items():
+                dataset = h5file[name].get(key)
+                if dataset is None or dataset.shape != var['shape'] or dataset.dtype != var['dtype']:
+                    continue
+
+                checksums[(name, key)] = get_checksum(dataset[var['index']])
+
+    return checksums
+
+
+def link_variables(restart_data, keys, filepath):
+    """Replace the data of the given variables in a :class:`RestartData` object by links
+    to the same variables in ``filepath``.
+
+    Returns a new object, ``restart_data`` is not modified.
+    """
+    linked_data = RestartData()
+    linked_data.attributes.update(restart_data.attributes)
+
+    for name, group_data in restart_data.items():
+        variables = {}
+        for key, var in group_data['variables'].items():
+            if (name, key) in keys:
+                var = dict(var, data=None, link=(filepath, '/{}/{}'.format(name, key)))
+            variables[key] = var
+
+        linked_data[name] = dict(group_data, variables=variables)
+
+    return linked_data
+
+
 @contextlib.contextmanager
 def threaded_io(vs, filepath, mode):
     """
     If using IO threads, start a new thread to write the HDF5 data to disk.
+
+    New files (mode ``'w'``) are written to a temporary file, which is moved to
+    ``filepath`` once it is complete.
     """
     import h5py
     if vs.use_io_threads:
@@ -21,14 +383,18 @@ def threaded_io(vs, filepath, mode):
             driver='mpio',
             comm=runtime_settings.mpi_comm
         )
-    h5file = h5py.File(filepath, mode, **kwargs)
+    tmp_filepath = get_temporary_file_name(filepath) if mode == 'w' else None
+    h5file = h5py.File(tmp_filepath or filepath, mode, **kwargs)
     try:
         yield h5file
     finally:
-        if vs.use_io_threads:
-            threading.Thread(target=_write_to_disk, args=(vs, h5file, filepath)).start()
+        args = (vs, h5file, filepath, tmp_filepath)
+        # closing a file opened through MPI-IO is collective, which must not overlap
+        # with collective calls of the simulation
+        if vs.use_io_threads and runtime_state.proc_num == 1:
+            threading.Thread(target=_write_to_disk, args=args).start()
         else:
-            _write_to_disk(vs, h5file, filepath)
+            _write_to_disk(*args)
 
 
 _io_locks = {}
@@ -54,13 +420,15 @@ def _wait_for_disk(vs, file_id):
         raise RuntimeError('Timeout while waiting for disk IO to finish')
 
 
-def _write_to_disk(vs, h5file, file_id):
+def _write_to_disk(vs, h5file, file_id, tmp_filepath=None):
     """
-    Sync HDF5 data to disk, close file handle, and release lock.
+    Sync HDF5 data to disk, close file handle, move it into place, and release lock.
     May run in a separate thread.
     """
     try:
         h5file.close()
+        if tmp_filepath is not None:
+            _move_into_place(tmp_filepath, file_id, parallel=runtime_state.proc_num > 1)
     finally:
         if vs.use_io_threads and file_id is not None:
             _io_locks[file_id].set()
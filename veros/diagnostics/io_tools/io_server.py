@@ -0,0 +1,210 @@
+import zlib
+import atexit
+import collections
+
+from loguru import logger
+
+from ... import runtime_settings as rs, runtime_state as rst
+from . import async_writer, file_handles, merge
+
+"""
+Dedicated I/O processes for distributed runs.
+
+If the runtime setting ``num_io_procs`` is set, the last ``num_io_procs`` MPI processes
+do not take part in the computation. Instead, they receive output data from all compute
+processes through non-blocking sends and write it to disk, so compute processes can
+continue stepping while output is written.
+
+All output files are written through jobs of the form
+``function(filepath, *args, pieces, parallel=False)``, where ``pieces`` contains the
+data of every contributing process. Jobs for the same file are always handled by the same
+I/O process, in the order in which they were submitted.
+
+If a job fails, the I/O process skips all further jobs, and the error is raised on all
+compute processes by the next :func:`flush`.
+"""
+
+_IO_TAG = 1337
+_STATUS_TAG = 1338
+
+# sent by all compute processes to request the status of all I/O processes
+_FLUSH = 'flush'
+
+_world_comm = None
+_num_compute_procs = None
+_pending_requests = collections.deque()
+_is_shut_down = False
+
+
+def init():
+    """Split off I/O processes from the computation. Must be called before any
+    communication takes place; does nothing if ``num_io_procs`` is 0."""
+    global _world_comm, _num_compute_procs
+
+    if _world_comm is not None or rs.num_io_procs <= 0:
+        return
+
+    world_comm = rs.mpi_comm
+    if world_comm is None or world_comm.Get_size() <= rs.num_io_procs:
+        raise RuntimeError(
+            'Running with {} I/O processes requires more than {} MPI processes in total'
+            .format(rs.num_io_procs, rs.num_io_procs)
+        )
+
+    num_compute_procs = world_comm.Get_size() - rs.num_io_procs
+    is_io_proc = world_comm.Get_rank() >= num_compute_procs
+
+    _world_comm, _num_compute_procs = world_comm, num_compute_procs
+    rs.mpi_comm = world_comm.Split(int(is_io_proc), world_comm.Get_rank())
+
+    if not is_io_proc:
+        atexit.register(shutdown)
+
+
+def is_enabled():
+    """Whether output is handled by dedicated I/O processes."""
+    return _world_comm is not None
+
+
+def is_io_proc():
+    """Whether the current process is a dedicated I/O process."""
+    return is_enabled() and _world_comm.Get_rank() >= _num_compute_procs
+
+
+def _get_server(filepath):
+    # must be the same on every process, so do not use hash()
+    return _num_compute_procs + zlib.crc32(filepath.encode('utf-8')) % rs.num_io_procs
+
+
+def submit(vs, function, filepath, *args, piece, per_process=False, root_only=False):
+    """Write data of the current process to ``filepath`` by calling
+    ``function(filepath, *args, pieces, parallel)``.
+
+    Sends the job to an I/O process if available. Otherwise, it is executed by all processes
+    collectively (in the background if asynchronous output is enabled), by every process
+    on a file of its own if ``per_process`` is set, or only by the first process if
+    ``root_only`` is set (for data that is only present there).
+
+    Must be called by all compute processes in the same order.
+    """
+    if root_only and not is_enabled():
+        if rst.proc_rank != 0:
+            return None
+
+        return async_writer.submit(vs, function, filepath, *args, [piece], parallel=False)
+
+    if per_process and not is_enabled():
+        return async_writer.submit(
+            vs, function, merge.get_process_file_name(filepath, rst.proc_rank), *args, [piece],
+            parallel=False
+        )
+
+    if not is_enabled():
+        return async_writer.submit(
+            vs, function, filepath, *args, [piece], parallel=rst.proc_num > 1
+        )
+
+    request = _world_comm.isend(
+        (function, filepath, args, piece), dest=_get_server(filepath), tag=_IO_TAG
+    )
+    _pending_requests.append(request)
+
+    # back-pressure: do not buffer arbitrary amounts of data
+    while len(_pending_requests) > vs.io_queue_size:
+        _pending_requests.popleft().wait()
+
+
+def _get_servers():
+    return range(_num_compute_procs, _world_comm.Get_size())
+
+
+def flush():
+    """Wait until the I/O processes have written all submitted data.
+
+    Must be called by all compute processes. Raises a :exc:`RuntimeError` on all of them
+    if any job failed since the last call.
+    """
+    while _pending_requests:
+        _pending_requests.popleft().wait()
+
+    if not is_enabled() or is_io_proc() or _is_shut_down:
+        return
+
+    for server in _get_servers():
+        _world_comm.send(_FLUSH, dest=server, tag=_IO_TAG)
+
+    errors = [_world_comm.recv(source=server, tag=_STATUS_TAG) for server in _get_servers()]
+    errors = [error for error in errors if error is not None]
+    if errors:
+        raise RuntimeError('Error while writing output on I/O processes:\n{}'.format('\n'.join(errors)))
+
+
+def shutdown():
+    """Tell all I/O processes that this compute process is done."""
+    global _is_shut_down
+
+    if not is_enabled() or is_io_proc() or _is_shut_down:
+        return
+
+    try:
+        flush()
+    finally:
+        # I/O processes wait for this in any case
+        _is_shut_down = True
+        for server in _get_servers():
+            _world_comm.send(None, dest=server, tag=_IO_TAG)
+
+
+def serve():
+    """Main loop of an I/O process. Returns when all compute processes are done."""
+    if not is_io_proc():
+        raise RuntimeError('only I/O processes can serve')
+
+    logger.debug('I/O process {} waiting for data', _world_comm.Get_rank())
+
+    # first error since the last flush
+    error = None
+
+    while True:
+        messages = [
+            _world_comm.recv(source=source, tag=_IO_TAG)
+            for source in range(_num_compute_procs)
+        ]
+
+        if all(msg is None for msg in messages):
+            break
+
+        is_flush = [isinstance(msg, str) and msg == _FLUSH for msg in messages]
+        if any(msg is None for msg in messages) or any(is_flush) and not all(is_flush):
+            raise RuntimeError('Compute processes submitted inconsistent output jobs')
+
+        if all(is_flush):
+            try:
+                file_handles.close_all()
+            except Exception as e:
+                logger.exception('Error while closing output files')
+                error = error or 'I/O process {}: error while closing output files: {!r}'.format(
+                    _world_comm.Get_rank(), e
+                )
+
+            for source in range(_num_compute_procs):
+                _world_comm.send(error, dest=source, tag=_STATUS_TAG)
+            error = None
+            continue
+
+        if error is not None:
+            # do not write anything after a failure
+            continue
+
+        function, filepath, args, _ = messages[0]
+        pieces = [msg[3] for msg in messages]
+
+        try:
+            function(filepath, *args, pieces, parallel=False)
+        except Exception as e:
+            logger.exception('Error while writing to {}', filepath)
+            error = 'I/O process {}: error while writing to {}: {!r}'.format(
+                _world_comm.Get_rank(), filepath, e
+            )
+
+    file_handles.close_all()
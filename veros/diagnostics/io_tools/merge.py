@@ -0,0 +1,160 @@
+import os
+import re
+import glob
+import shutil
+
+from loguru import logger
+
+"""
+Per-process output files.
+
+HDF5 versions before 1.10.2 cannot apply filters in parallel writes, so with those, shared
+output and restart files written by several processes are uncompressed. If
+``enable_per_process_output`` is set, every process writes (compressed) files of its own
+instead, which contain the full global variables, but only the data of the writing
+process. Since HDF5 does not allocate chunks that are never written, these files only
+take up the space of the local data.
+
+:func:`merge_files` (or ``veros merge-output`` on the command line) reassembles them into
+a single file.
+"""
+
+#: File attributes that describe the part of the global domain written by a process
+PROCESS_ATTRIBUTES = ('veros_process_rank', 'veros_x_range', 'veros_y_range')
+
+
+def is_enabled(vs):
+    """Whether every process writes its own output and restart files."""
+    from ... import runtime_state
+    from . import io_server
+
+    return (
+        vs.enable_per_process_output
+        and runtime_state.proc_num > 1
+        and not io_server.is_enabled()
+    )
+
+
+def get_process_file_name(filepath, rank):
+    """Name of the file written by process ``rank`` instead of ``filepath``."""
+    root, ext = os.path.splitext(filepath)
+    return '{}.{:0>4d}{}'.format(root, rank, ext)
+
+
+def find_process_files(filepath):
+    """All existing files written by single processes instead of ``filepath``,
+    ordered by process rank."""
+    root, ext = os.path.splitext(filepath)
+    pattern = re.compile(r'{}\.(\d{{4,}}){}$'.format(re.escape(root), re.escape(ext)))
+
+    process_files = {}
+    for candidate in glob.glob('{}.*{}'.format(glob.escape(root), glob.escape(ext))):
+        match = pattern.match(candidate)
+        if match:
+            process_files[int(match.group(1))] = candidate
+
+    return [process_files[rank] for rank in sorted(process_files)]
+
+
+def get_process_attributes(vs, include_overlap=False):
+    """File attributes describing the part of the global domain covered by the current
+    process (in global indices, including overlap if ``include_overlap`` is set)."""
+    from ... import distributed, runtime_state
+
+    x_slice, y_slice = distributed.get_chunk_slices(vs, ('xt', 'yt'), include_overlap=include_overlap)[0]
+    return {
+        'veros_process_rank': runtime_state.proc_rank,
+        'veros_x_range': [x_slice.start, x_slice.stop],
+        'veros_y_range': [y_slice.start, y_slice.stop],
+    }
+
+
+def merge_files(infiles, outfile):
+    """Reassemble files written by single processes into one file.
+
+    Works for both output and restart files.
+
+    Arguments:
+        infiles: Files written by all processes.
+        outfile: Path of the merged file.
+
+    """
+    import h5py
+
+    if not infiles:
+        raise ValueError('no input files given')
+
+    logger.info('Merging {} files into {}', len(infiles), outfile)
+
+    # takes care of all metadata and the data of the first process
+    shutil.copyfile(infiles[0], outfile)
+
+    with h5py.File(outfile, 'r+') as out:
+        for infile in infiles[1:]:
+            with h5py.File(infile, 'r') as src:
+                regions = _get_regions(src)
+                _merge_group(src, out, regions)
+
+        for attr in PROCESS_ATTRIBUTES:
+            if attr in out.attrs:
+                del out.attrs[attr]
+
+
+def _get_regions(h5file):
+    from ...distributed import SCATTERED_DIMENSIONS
+
+    missing_attributes = set(PROCESS_ATTRIBUTES) - set(h5file.attrs.keys())
+    if missing_attributes:
+        raise ValueError('{} was not written by a single process (missing attributes: {})'
+                         .format(h5file.filename, ', '.join(sorted(missing_attributes))))
+
+    regions = {}
+    for dims, attr in zip(SCATTERED_DIMENSIONS, ('veros_x_range', 'veros_y_range')):
+        start, stop = h5file.attrs[attr]
+        for dim in dims:
+            regions[dim] = slice(int(start), int(stop))
+
+    return regions
+
+
+def _merge_group(src, out, regions):
+    import h5py
+
+    for key, obj in src.items():
+        if isinstance(obj, h5py.Group):
+            _merge_group(obj, out[key], regions)
+            continue
+
+        dims = _get_dimension_names(obj)
+        if not any(dim in regions for dim in dims):
+            # not distributed, so identical on all processes
+            continue
+
+        idx = tuple(regions.get(dim, slice(None)) for dim in dims)
+        out[key][idx] = obj[idx]
+
+
+def _get_dimension_names(dataset):
+    # restart data
+    if 'dims' in dataset.attrs:
+        return [_to_str(dim) for dim in dataset.attrs['dims']][:dataset.ndim]
+
+    # netCDF coordinate variable
+    if _to_str(dataset.attrs.get('CLASS', '')) == 'DIMENSION_SCALE':
+        return [dataset.name.split('/')[-1]]
+
+    # netCDF variable
+    dims = []
+    for dim in dataset.dims:
+        if len(dim):
+            dims.append(dim[0].name.split('/')[-1])
+        else:
+            dims.append(None)
+
+    return dims
+
+
+def _to_str(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
@@ -1,15 +1,30 @@
 import threading
 import contextlib
+from collections import namedtuple, OrderedDict
 
+import numpy
 from loguru import logger
 
 from ... import veros_method, variables, runtime_state, runtime_settings as rs, distributed
+from . import file_handles, hdf5
 
 """
 netCDF output is designed to follow the COARDS guidelines from
 http://ferret.pmel.noaa.gov/Ferret/documentation/coards-netcdf-conventions
 """
 
+#: Extension of files written by this backend
+file_extension = '.nc'
+
+#: Supported compression codecs
+COMPRESSION_CODECS = ('none', 'gzip', 'lzf', 'blosc', 'zstd')
+
+#: Data of a single variable as collected by get_variable_snapshot. ``dims`` are used to
+#: remove ghost cells, so they are empty for data without ghost cells.
+VariableSnapshot = namedtuple(
+    'VariableSnapshot', ('data', 'mask', 'scale', 'dims', 'chunk', 'significant_digits')
+)
+
 
 @veros_method
 def initialize_file(vs, ncfile, create_time_dimension=True):
@@ -21,19 +36,11 @@ def initialize_file(vs, ncfile, create_time_dimension=True):
     if not isinstance(ncfile, h5netcdf.File):
         raise TypeError('Argument needs to be a netCDF4 Dataset')
 
-    for dim in variables.BASE_DIMENSIONS:
-        var = vs.variables[dim]
-        dimsize = variables.get_dimensions(vs, var.dims[::-1], include_ghosts=False, local=False)[0]
-        add_dimension(vs, dim, dimsize, ncfile)
-        initialize_variable(vs, dim, var, ncfile)
-        write_variable(vs, dim, var, getattr(vs, dim), ncfile)
+    file_spec = get_file_spec(vs, {}, create_time_dimension=create_time_dimension)
+    create_file_structure(ncfile, file_spec, parallel=runtime_state.proc_num > 1)
 
-    if create_time_dimension:
-        ncfile.dimensions['Time'] = None
-        nc_dim_var_time = ncfile.create_variable('Time', ('Time',), float)
-        nc_dim_var_time.long_name = 'Time'
-        nc_dim_var_time.units = 'days'
-        nc_dim_var_time.time_origin = '01-JAN-1900 00:00:00'
+    for dim in variables.BASE_DIMENSIONS:
+        write_variable(vs, dim, vs.variables[dim], getattr(vs, dim), ncfile)
 
 
 @veros_method
@@ -43,71 +50,310 @@ def add_dimension(vs, identifier, size, ncfile):
 
 @veros_method
 def initialize_variable(vs, key, var, ncfile):
-    dims = tuple(d for d in var.dims if d in ncfile.dimensions)
-    if var.time_dependent and 'Time' in ncfile.dimensions:
-        dims += ('Time',)
-
     if key in ncfile.variables:
         logger.warning('Variable {} already initialized'.format(key))
         return
 
-    kwargs = {}
-    if vs.enable_hdf5_gzip_compression and runtime_state.proc_num == 1:
-        kwargs.update(
-            compression='gzip',
-            compression_opts=1
+    dimensions = {dim: _get_dimension_size(ncfile, dim) for dim in ncfile.dimensions}
+    var_spec = get_variable_spec(vs, var, dimensions)
+    create_variable(ncfile, key, var_spec, parallel=runtime_state.proc_num > 1)
+
+
+def get_default_output_options(vs):
+    """
+    Output options (compression, quantization, and chunking) as given by the settings.
+    """
+    return dict(
+        compression=vs.output_compression if vs.enable_hdf5_gzip_compression else 'none',
+        compression_level=vs.output_compression_level,
+        shuffle=vs.output_shuffle,
+        significant_digits=vs.output_significant_digits,
+        chunks={}
+    )
+
+
+@veros_method
+def get_variable_spec(vs, var, dimensions, output_options=None):
+    """
+    Describe how variable var is stored in a file with the given dimensions
+    (mapping of dimension name to size, None for unlimited dimensions).
+
+    Arguments:
+        output_options: Output options as returned by get_default_output_options
+            (defaults to the settings).
+
+    """
+    if output_options is None:
+        output_options = get_default_output_options(vs)
+
+    dims = tuple(d for d in var.dims if d in dimensions)
+    if var.time_dependent and 'Time' in dimensions:
+        dims += ('Time',)
+
+    codec = output_options['compression'] or 'none'
+    if codec not in COMPRESSION_CODECS:
+        raise ValueError('unknown compression codec "{}" (must be one of {})'
+                         .format(codec, ', '.join(COMPRESSION_CODECS)))
+
+    compression = None
+    if codec != 'none':
+        compression = dict(
+            codec=codec,
+            level=output_options['compression_level'],
+            shuffle=output_options['shuffle']
         )
 
-    global_shape = [ncfile.dimensions[dim] or 1 for dim in dims]
-    chunksize = distributed.get_local_size(vs, global_shape, dims, include_overlap=False)
+    global_shape = [dimensions[dim] or 1 for dim in dims]
+    chunksize = distributed.get_storage_chunk_size(vs, global_shape, dims)
+
+    for i, dim in enumerate(dims):
+        if dim in output_options['chunks']:
+            chunksize[i] = min(output_options['chunks'][dim], dimensions[dim] or float('inf'))
+
+    attrs = dict(
+        long_name=var.name,
+        units=var.units,
+        **var.extra_attributes
+    )
+    if output_options['significant_digits']:
+        attrs.update(significant_digits=output_options['significant_digits'])
 
     # transpose all dimensions in netCDF output (convention in most ocean models)
+    return dict(
+        dims=dims[::-1],
+        dtype=var.dtype or vs.default_float_type,
+        chunks=tuple(chunksize[::-1]),
+        compression=compression,
+        attrs=attrs
+    )
+
+
+@veros_method
+def get_file_spec(vs, variables_meta, extra_dimensions=None, create_time_dimension=True,
+                  output_options=None):
+    """
+    Describe dimensions and variables of an output file, including the standard grid.
+
+    Arguments:
+        output_options: Mapping of variable name to output options as returned by
+            get_default_output_options (defaults to the settings for every variable).
+
+    """
+    if output_options is None:
+        output_options = {}
+
+    dimensions = OrderedDict()
+    for dim in variables.BASE_DIMENSIONS:
+        var = vs.variables[dim]
+        dimensions[dim] = variables.get_dimensions(vs, var.dims[::-1], include_ghosts=False, local=False)[0]
+
+    # grid variables never depend on time
+    var_specs = OrderedDict()
+    for key in variables.BASE_DIMENSIONS:
+        var_specs[key] = get_variable_spec(vs, vs.variables[key], dimensions, output_options.get(key))
+
+    if extra_dimensions:
+        dimensions.update(extra_dimensions)
+
+    if create_time_dimension:
+        dimensions['Time'] = None
+
+    for key, var in variables_meta.items():
+        if key not in var_specs:
+            var_specs[key] = get_variable_spec(vs, var, dimensions, output_options.get(key))
+
+    return dict(dimensions=dimensions, variables=var_specs)
+
+
+_missing_codecs = set()
+
+
+def get_compression_kwargs(compression):
+    """
+    Keyword arguments to h5py's create_dataset for the given compression spec.
+    """
+    if compression is None:
+        return {}
+
+    codec, level, shuffle = compression['codec'], compression['level'], compression['shuffle']
+
+    if codec in ('blosc', 'zstd'):
+        try:
+            import hdf5plugin
+        except ImportError:
+            if codec not in _missing_codecs:
+                logger.warning(
+                    'Compression codec "{}" requires the hdf5plugin package - using gzip instead', codec
+                )
+                _missing_codecs.add(codec)
+            codec = 'gzip'
+        else:
+            if codec == 'blosc':
+                blosc_shuffle = hdf5plugin.Blosc.SHUFFLE if shuffle else hdf5plugin.Blosc.NOSHUFFLE
+                return dict(hdf5plugin.Blosc(cname='zstd', clevel=level, shuffle=blosc_shuffle))
+
+            return dict(hdf5plugin.Zstd(clevel=level), shuffle=shuffle)
+
+    if codec == 'gzip':
+        return dict(compression='gzip', compression_opts=level, shuffle=shuffle)
+
+    if codec == 'lzf':
+        return dict(compression='lzf', shuffle=shuffle)
+
+    raise ValueError('unknown compression codec "{}"'.format(codec))
+
+
+def create_variable(ncfile, key, var_spec, parallel=False):
+    kwargs = get_compression_kwargs(var_spec['compression'])
+    if parallel:
+        kwargs = hdf5.get_parallel_filter_kwargs(kwargs)
+
     v = ncfile.create_variable(
-        key, dims[::-1], var.dtype or vs.default_float_type,
+        key, var_spec['dims'], var_spec['dtype'],
         fillvalue=variables.FILL_VALUE,
-        chunks=tuple(chunksize[::-1]),
+        chunks=var_spec['chunks'],
         **kwargs
     )
     v.missing_value = variables.FILL_VALUE
-    v.attrs.update(
-        long_name=var.name,
-        units=var.units,
-        **var.extra_attributes
-    )
+    v.attrs.update(var_spec['attrs'])
+
+
+def create_file_structure(ncfile, file_spec, parallel=False):
+    """
+    Create all dimensions and variables given by get_file_spec.
+    """
+    ncfile.attrs.update(file_spec.get('attributes', {}))
+
+    for dim, size in file_spec['dimensions'].items():
+        ncfile.dimensions[dim] = size
+
+    if 'Time' in file_spec['dimensions']:
+        nc_dim_var_time = ncfile.create_variable('Time', ('Time',), float)
+        nc_dim_var_time.long_name = 'Time'
+        nc_dim_var_time.units = 'days'
+        nc_dim_var_time.time_origin = '01-JAN-1900 00:00:00'
+
+    for key, var_spec in file_spec['variables'].items():
+        create_variable(ncfile, key, var_spec, parallel=parallel)
+
+
+def _get_dimension_size(ncfile, dim):
+    size = ncfile.dimensions[dim]
+    # newer versions of h5netcdf return Dimension objects
+    return getattr(size, 'size', size)
 
 
-@veros_method
 def get_current_timestep(vs, ncfile):
     return len(ncfile.variables['Time'])
 
 
-@veros_method
 def advance_time(vs, time_step, time_value, ncfile):
     ncfile.resize_dimension('Time', time_step + 1)
     ncfile.variables['Time'][time_step] = time_value
 
 
 @veros_method
-def write_variable(vs, key, var, var_data, ncfile, time_step=None):
-    var_data = var_data * var.scale
+def get_variable_snapshot(vs, var, var_data, copy=False, significant_digits=0):
+    """
+    Collect everything that is needed to write var_data to disk as NumPy arrays,
+    so the actual write does not need access to the Veros state.
 
-    gridmask = var.get_mask(vs)
-    if gridmask is not None:
-        newaxes = (slice(None),) * gridmask.ndim + (np.newaxis,) * (var_data.ndim - gridmask.ndim)
-        var_data = np.where(gridmask.astype(np.bool)[newaxes], var_data, variables.FILL_VALUE)
+    If copy is True, the data is copied, so it can be written while the simulation continues.
+    If significant_digits is given, the data is rounded to this many significant digits
+    before it is written.
+    """
+    dims = var.dims
 
     if not np.isscalar(var_data):
-        tmask = tuple(vs.tau if dim in variables.TIMESTEPS else slice(None) for dim in var.dims)
-        var_data = variables.remove_ghosts(var_data, var.dims)[tmask].T
+        tmask = tuple(vs.tau if dim in variables.TIMESTEPS else slice(None) for dim in dims)
+        var_data = var_data[tmask]
+        dims = tuple(dim for dim in dims if dim not in variables.TIMESTEPS)
+
+    gridmask = var.get_mask(vs)
 
     try:
         var_data = var_data.copy2numpy()
+    except AttributeError:
+        if copy:
+            var_data = numpy.array(var_data)
+
+    try:
+        gridmask = gridmask.copy2numpy()
     except AttributeError:
         pass
 
-    var_obj = ncfile.variables[key]
+    # position of local data in (transposed) output
+    chunk, _ = distributed.get_chunk_slices(vs, dims)
 
-    chunk, _ = distributed.get_chunk_slices(vs, var_obj.dimensions)
+    return VariableSnapshot(var_data, gridmask, var.scale, dims, chunk[::-1], significant_digits)
+
+
+def get_output_data(snapshot):
+    """
+    Scale, mask, and transpose data collected by get_variable_snapshot
+    as it is stored in output files.
+
+    Only uses NumPy, so this is safe to call from a background thread.
+    """
+    var_data = snapshot.data * snapshot.scale
+
+    if snapshot.significant_digits and not numpy.isscalar(var_data):
+        # before masking, so fill values are not affected
+        var_data = round_significant_digits(var_data, snapshot.significant_digits)
+
+    gridmask = snapshot.mask
+    if gridmask is not None:
+        newaxes = (slice(None),) * gridmask.ndim + (numpy.newaxis,) * (var_data.ndim - gridmask.ndim)
+        var_data = numpy.where(gridmask.astype(bool)[newaxes], var_data, variables.FILL_VALUE)
+
+    if not numpy.isscalar(var_data):
+        var_data = variables.remove_ghosts(var_data, snapshot.dims).T
+
+    return var_data
+
+
+def round_significant_digits(data, significant_digits):
+    """
+    Round floating point data to (at least) the given number of significant decimal
+    digits by zeroing all mantissa bits that are not needed for that precision.
+
+    This is lossy, but makes the data compress much better.
+    """
+    if not numpy.issubdtype(data.dtype, numpy.floating):
+        return data
+
+    mantissa_bits = numpy.finfo(data.dtype).nmant
+    keep_bits = int(numpy.ceil(significant_digits * numpy.log2(10)))
+    drop_bits = mantissa_bits - keep_bits
+    if drop_bits <= 0:
+        return data
+
+    uint_type = numpy.dtype('uint{}'.format(8 * data.dtype.itemsize)).type
+    bits = numpy.ascontiguousarray(data).view(uint_type)
+
+    # round to nearest, ties to even
+    half = uint_type((1 << (drop_bits - 1)) - 1)
+    last_kept_bit = (bits >> uint_type(drop_bits)) & uint_type(1)
+    mask = ~uint_type((1 << drop_bits) - 1)
+    bits = (bits + half + last_kept_bit) & mask
+
+    return bits.view(data.dtype)
+
+
+def write_variable_snapshot(key, snapshot, ncfile, time_step=None, parallel=False):
+    """
+    Write data collected by get_variable_snapshot to file.
+
+    Only uses NumPy, so this is safe to call from a background thread.
+
+    Arguments:
+        parallel: Whether this is called collectively by all processes.
+
+    """
+    var_data = get_output_data(snapshot)
+
+    var_obj = ncfile.variables[key]
+    chunk = snapshot.chunk
 
     if 'Time' in var_obj.dimensions:
         assert var_obj.dimensions[0] == 'Time'
@@ -115,9 +361,106 @@ def write_variable(vs, key, var, var_data, ncfile, time_step=None):
         if time_step is None:
             raise ValueError('time step must be given for non-constant data')
 
-        chunk = (time_step,) + chunk[1:]
+        chunk = (time_step,) + chunk
 
-    var_obj[chunk] = var_data
+    if parallel:
+        # HDF5 only applies filters in collective writes
+        with hdf5.collective_write(_get_h5_dataset(var_obj)):
+            var_obj[chunk] = var_data
+    else:
+        var_obj[chunk] = var_data
+
+
+def _get_h5_dataset(var_obj):
+    """The h5py dataset of a netCDF variable, which h5netcdf does not expose publicly."""
+    import h5netcdf
+
+    try:
+        return var_obj._h5ds
+    except AttributeError:
+        raise RuntimeError(
+            'Cannot write variable {} in parallel, since h5netcdf {} does not give access to its '
+            'HDF5 dataset (use dedicated I/O processes or enable_per_process_output instead)'
+            .format(var_obj.name, h5netcdf.__version__)
+        )
+
+
+@veros_method
+def write_variable(vs, key, var, var_data, ncfile, time_step=None):
+    snapshot = get_variable_snapshot(vs, var, var_data)
+    write_variable_snapshot(key, snapshot, ncfile, time_step=time_step, parallel=runtime_state.proc_num > 1)
+
+
+def create_file(filepath, file_spec, file_options, snapshots, parallel=False, comm=None):
+    """
+    Create a new output file as described by get_file_spec, and write the
+    given constant data to it.
+
+    Arguments:
+        file_options: File handling options as returned by file_handles.get_options.
+        snapshots: List containing one dict of variable snapshots per contributing process.
+        parallel: Whether this is called collectively by all processes.
+        comm: Communicator of all processes if parallel (defaults to the global one).
+
+    """
+    # non-standard filters are not part of the netCDF4 format
+    invalid_netcdf = any(
+        var_spec['compression'] is not None and var_spec['compression']['codec'] != 'gzip'
+        for var_spec in file_spec['variables'].values()
+    )
+
+    with _open_file(filepath, 'w', file_options, parallel, invalid_netcdf=invalid_netcdf, comm=comm) as ncfile:
+        create_file_structure(ncfile, file_spec, parallel=parallel)
+        for proc_snapshots in snapshots:
+            for key, snapshot in proc_snapshots.items():
+                write_variable_snapshot(key, snapshot, ncfile, parallel=parallel)
+
+
+def write_snapshots(filepath, time_value, file_options, snapshots, parallel=False, comm=None):
+    """
+    Append a new time step to an existing output file and write all given variable
+    snapshots to it.
+
+    Only uses NumPy, so this is safe to call from a background thread.
+
+    Arguments:
+        file_options: File handling options as returned by file_handles.get_options.
+        snapshots: List containing one dict of variable snapshots per contributing process.
+        parallel: Whether this is called collectively by all processes.
+        comm: Communicator of all processes if parallel (defaults to the global one).
+
+    """
+    with _open_file(filepath, 'r+', file_options, parallel, comm=comm) as ncfile:
+        time_step = get_current_timestep(None, ncfile)
+        advance_time(None, time_step, time_value, ncfile)
+        for proc_snapshots in snapshots:
+            for key, snapshot in proc_snapshots.items():
+                write_variable_snapshot(key, snapshot, ncfile, time_step=time_step, parallel=parallel)
+
+
+def _open_file(filepath, mode, file_options, parallel, invalid_netcdf=False, comm=None):
+    import h5netcdf
+
+    def opener(filepath, mode):
+        kwargs = _get_file_kwargs(parallel, comm=comm)
+        if invalid_netcdf:
+            kwargs.update(invalid_netcdf=True)
+        return h5netcdf.File(filepath, mode, **kwargs)
+
+    return file_handles.open_file(filepath, mode, file_options, opener)
+
+
+def _get_file_kwargs(parallel=None, comm=None):
+    if parallel is None:
+        parallel = runtime_state.proc_num > 1
+
+    kwargs = {}
+    if parallel:
+        kwargs.update(
+            driver='mpio',
+            comm=rs.mpi_comm if comm is None else comm
+        )
+    return kwargs
 
 
 @contextlib.contextmanager
@@ -132,18 +475,13 @@ def threaded_io(vs, filepath, mode):
         _wait_for_disk(vs, filepath)
         _io_locks[filepath].clear()
 
-    kwargs = {}
-    if runtime_state.proc_num > 1:
-        kwargs.update(
-            driver='mpio',
-            comm=rs.mpi_comm
-        )
-
-    nc_dataset = h5netcdf.File(filepath, mode, **kwargs)
+    nc_dataset = h5netcdf.File(filepath, mode, **_get_file_kwargs())
     try:
         yield nc_dataset
     finally:
-        if vs.use_io_threads:
+        # closing a file opened through MPI-IO is collective, which must not overlap
+        # with collective calls of the simulation
+        if vs.use_io_threads and runtime_state.proc_num == 1:
             threading.Thread(target=_write_to_disk, args=(vs, nc_dataset, filepath)).start()
         else:
             _write_to_disk(vs, nc_dataset, filepath)
@@ -0,0 +1,261 @@
+import numpy
+
+from ... import veros_method, variables, runtime_state, distributed
+from .netcdf import VariableSnapshot, get_file_spec, get_variable_spec
+
+"""
+Output on part of the model domain and / or on a coarser grid.
+
+Variables are cut to a region and averaged over blocks of neighboring cells before
+they are handed to the output backend, so only the reduced data is copied and written.
+Since the reduced fields are small, every process contributes its partial block sums
+to a global sum, and the result is written by the first process alone (so no parallel
+I/O is needed).
+"""
+
+#: Dimensions of the model grid along each spatial axis
+AXES = {
+    'x': ('xt', 'xu'),
+    'y': ('yt', 'yu'),
+    'z': ('zt', 'zw'),
+}
+
+# coordinate used to select regions given by coordinate bounds
+_REGION_COORDINATES = {'x': 'xt', 'y': 'yt', 'z': 'zt'}
+
+
+@veros_method
+def _get_cell_widths(vs, dim):
+    """Cell widths along a dimension (in meters), used as averaging weights."""
+    if dim == 'xt':
+        return vs.dxt
+    if dim == 'xu':
+        return vs.dxu
+    if dim == 'yt':
+        return vs.dyt * vs.cost
+    if dim == 'yu':
+        return vs.dyu * vs.cosu
+    if dim == 'zt':
+        return vs.dzt
+    if dim == 'zw':
+        return vs.dzw
+    raise ValueError('unknown dimension {}'.format(dim))
+
+
+def _to_numpy(arr):
+    try:
+        return arr.copy2numpy()
+    except AttributeError:
+        return numpy.asarray(arr)
+
+
+class OutputSubset:
+    """Part of the model grid, optionally coarsened by block averaging.
+
+    Arguments:
+        region: Mapping of axis (``'x'``, ``'y'``, ``'z'``) to either a slice of grid
+            indices (without ghost cells), or a tuple ``(lower, upper)`` of coordinate
+            bounds (in units of ``xt``, ``yt``, and ``zt``). Axes that are not given are
+            not restricted.
+        coarsening: Mapping of axis to the number of cells that are averaged into one
+            output cell. Averages are weighted with cell widths, areas, or volumes,
+            and exclude land cells.
+
+    """
+    def __init__(self, vs, region=None, coarsening=None):
+        region = region or {}
+        coarsening = coarsening or {}
+
+        unknown_axes = (set(region) | set(coarsening)) - set(AXES)
+        if unknown_axes:
+            raise ValueError('unknown axes {} (must be one of {})'
+                             .format(', '.join(sorted(unknown_axes)), ', '.join(sorted(AXES))))
+
+        sizes = {'x': vs.nx, 'y': vs.ny, 'z': vs.nz}
+
+        #: Range of global grid indices and block size along each axis
+        self.index_ranges = {}
+        self.block_sizes = {}
+
+        for axis, size in sizes.items():
+            start, stop = self._get_index_range(vs, axis, region.get(axis), size)
+
+            block_size = int(coarsening.get(axis, 1))
+            if block_size < 1:
+                raise ValueError('coarsening along axis {} must be a positive integer'.format(axis))
+
+            self.index_ranges[axis] = (start, stop)
+            self.block_sizes[axis] = block_size
+
+        #: Sizes of all dimensions of the reduced grid
+        self.dimensions = {}
+        for axis, dims in AXES.items():
+            for dim in dims:
+                self.dimensions[dim] = self._get_num_blocks(axis)
+
+    @staticmethod
+    @veros_method
+    def _get_index_range(vs, axis, selection, size):
+        if selection is None:
+            return 0, size
+
+        if isinstance(selection, slice):
+            start, stop, step = selection.indices(size)
+            if step != 1:
+                raise ValueError('region along axis {} must be a contiguous slice'.format(axis))
+        else:
+            lower, upper = sorted(selection)
+            coords = distributed.gather(vs, getattr(vs, _REGION_COORDINATES[axis]),
+                                        (_REGION_COORDINATES[axis],))
+            # only gathered on the first process
+            coords = distributed.broadcast(vs, _to_numpy(coords))
+            coords = variables.remove_ghosts(coords, (_REGION_COORDINATES[axis],))
+            indices = numpy.flatnonzero((coords >= lower) & (coords <= upper))
+            if not indices.size:
+                raise ValueError('region along axis {} does not contain any grid cells'.format(axis))
+            start, stop = indices[0], indices[-1] + 1
+
+        if stop <= start:
+            raise ValueError('region along axis {} does not contain any grid cells'.format(axis))
+
+        return int(start), int(stop)
+
+    def _get_num_blocks(self, axis):
+        start, stop = self.index_ranges[axis]
+        return -(-(stop - start) // self.block_sizes[axis])
+
+    def _get_axis(self, dim):
+        for axis, dims in AXES.items():
+            if dim in dims:
+                return axis
+        return None
+
+    @veros_method
+    def get_file_spec(self, vs, variables_meta, extra_dimensions=None, output_options=None):
+        """Like :func:`veros.diagnostics.io_tools.netcdf.get_file_spec`, but for the reduced grid."""
+        dimensions = dict(extra_dimensions or {}, **self.dimensions)
+        file_spec = get_file_spec(vs, variables_meta, dimensions, output_options=output_options)
+
+        # grid variables are described before extra dimensions are applied,
+        # and never depend on time
+        grid_dimensions = {dim: size for dim, size in file_spec['dimensions'].items() if dim != 'Time'}
+        for key in variables.BASE_DIMENSIONS:
+            file_spec['variables'][key] = get_variable_spec(
+                vs, vs.variables[key], grid_dimensions, (output_options or {}).get(key)
+            )
+
+        # chunks are based on the domain decomposition, but must not exceed the reduced grid
+        for var_spec in file_spec['variables'].values():
+            var_spec['chunks'] = tuple(
+                min(chunk, file_spec['dimensions'][dim] or chunk)
+                for chunk, dim in zip(var_spec['chunks'], var_spec['dims'])
+            )
+
+        return file_spec
+
+    @veros_method
+    def get_variable_snapshot(self, vs, var, var_data, significant_digits=0):
+        """Reduce variable data to the subset grid.
+
+        Must be called by all processes. Returns a
+        :class:`~veros.diagnostics.io_tools.netcdf.VariableSnapshot` on the first process
+        and None on all others. The reduced data is always a new array, so it can be
+        written while the simulation continues.
+        """
+        dims = var.dims
+
+        if numpy.isscalar(var_data):
+            data, mask = var_data, None
+        else:
+            tmask = tuple(vs.tau if dim in variables.TIMESTEPS else slice(None) for dim in dims)
+            data = _to_numpy(var_data[tmask])
+            dims = tuple(dim for dim in dims if dim not in variables.TIMESTEPS)
+
+            mask = var.get_mask(vs)
+            if mask is not None:
+                mask = _to_numpy(mask)
+
+            data, mask = self._reduce(vs, data, mask, dims)
+
+        if runtime_state.proc_rank != 0:
+            return None
+
+        # reduced data does not contain ghost cells
+        chunk = (slice(None),) * numpy.ndim(data)
+        return VariableSnapshot(data, mask, var.scale, (), chunk, significant_digits)
+
+    @veros_method
+    def _reduce(self, vs, data, mask, dims):
+        """Weighted block averages of the local data, combined over all processes."""
+        global_idx, _ = distributed.get_chunk_slices(vs, dims)
+
+        weights = numpy.ones(data.shape)
+        if mask is not None:
+            newaxes = (slice(None),) * mask.ndim + (numpy.newaxis,) * (data.ndim - mask.ndim)
+            weights = weights * mask.astype(bool)[newaxes]
+
+        local_idx, block_idx, block_offsets = [], [], {}
+        reduced_shape = list(data.shape)
+        has_local_cells = True
+
+        for i, dim in enumerate(dims):
+            axis = self._get_axis(dim)
+            if axis is None:
+                local_idx.append(slice(None))
+                block_idx.append(slice(None))
+                continue
+
+            # position of local cells in the global grid (without ghost cells)
+            if dim in variables.GHOST_DIMENSIONS:
+                global_offset = global_idx[i].start or 0
+                local_offset = 2
+                local_size = data.shape[i] - 4
+            else:
+                global_offset, local_offset, local_size = 0, 0, data.shape[i]
+
+            start, stop = self.index_ranges[axis]
+            first, last = max(start, global_offset), min(stop, global_offset + local_size)
+            reduced_shape[i] = self._get_num_blocks(axis)
+
+            if first >= last:
+                has_local_cells = False
+                continue
+
+            blocks = (numpy.arange(first, last) - start) // self.block_sizes[axis]
+            block_offsets[i] = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(blocks)) + 1))
+
+            local_idx.append(slice(first - global_offset + local_offset, last - global_offset + local_offset))
+            block_idx.append(slice(blocks[0], blocks[-1] + 1))
+
+            if self.block_sizes[axis] > 1:
+                # weights are constant within blocks of size 1, so skip them for exact results
+                widths = _to_numpy(_get_cell_widths(vs, dim))
+                widths_idx = (numpy.newaxis,) * i + (slice(None),) + (numpy.newaxis,) * (data.ndim - i - 1)
+                weights = weights * widths[widths_idx]
+
+        # weighted sums and total weights of all blocks
+        reduced = numpy.zeros([2] + reduced_shape)
+
+        if has_local_cells:
+            local_idx = tuple(local_idx)
+            weights = weights[local_idx]
+            sums = numpy.stack((weights * data[local_idx], weights))
+
+            for i, offsets in block_offsets.items():
+                sums = numpy.add.reduceat(sums, offsets, axis=i + 1)
+
+            reduced[(slice(None),) + tuple(block_idx)] = sums
+
+        if any(dim in scattered for dim in dims for scattered in distributed.SCATTERED_DIMENSIONS):
+            # blocks can be spread over several processes
+            reduced = distributed.global_sum(vs, reduced)
+
+        weight_sum = reduced[1]
+        has_weight = weight_sum > 0
+        reduced_data = numpy.where(has_weight, reduced[0] / numpy.where(has_weight, weight_sum, 1), 0)
+
+        reduced_mask = None
+        if mask is not None:
+            reduced_mask = has_weight
+
+        return reduced_data.astype(data.dtype), reduced_mask
@@ -0,0 +1,228 @@
+import numpy
+
+from ... import variables, runtime_settings as rs
+from .netcdf import get_output_data
+
+"""
+Zarr output backend.
+
+Every variable is stored as a separate array in a directory store, split into chunks
+that follow the domain decomposition. This means that every process compresses and
+writes its own data without any collective I/O, and that appending a time step only
+updates the (tiny) array metadata.
+
+Arrays carry the dimension names in an ``_ARRAY_DIMENSIONS`` attribute, so the output
+can be read with ``xarray.open_zarr``.
+"""
+
+#: Extension of files written by this backend
+file_extension = '.zarr'
+
+#: Number of time steps per chunk of the Time variable
+TIME_CHUNK_SIZE = 512
+
+
+def create_file_structure(group, file_spec):
+    """
+    Create all variables given by get_file_spec.
+    """
+    dimensions = file_spec['dimensions']
+    group.attrs.update(file_spec.get('attributes', {}))
+
+    if 'Time' in dimensions:
+        time_var = group.create_dataset(
+            'Time', shape=(0,), chunks=(TIME_CHUNK_SIZE,), dtype='float64'
+        )
+        time_var.attrs.update(
+            _ARRAY_DIMENSIONS=['Time'],
+            long_name='Time',
+            units='days',
+            time_origin='01-JAN-1900 00:00:00'
+        )
+
+    for key, var_spec in file_spec['variables'].items():
+        create_variable(group, key, var_spec, dimensions)
+
+
+def get_codecs(compression, dtype):
+    """
+    Compressor and filters for zarr arrays for the given compression spec.
+    """
+    if compression is None:
+        return None, None
+
+    import numcodecs
+
+    codec, level, shuffle = compression['codec'], compression['level'], compression['shuffle']
+
+    if codec == 'blosc':
+        blosc_shuffle = numcodecs.Blosc.SHUFFLE if shuffle else numcodecs.Blosc.NOSHUFFLE
+        return numcodecs.Blosc(cname='zstd', clevel=level, shuffle=blosc_shuffle), None
+
+    filters = None
+    if shuffle:
+        filters = [numcodecs.Shuffle(elementsize=numpy.dtype(dtype).itemsize)]
+
+    if codec == 'gzip':
+        return numcodecs.GZip(level=level), filters
+
+    if codec == 'zstd':
+        return numcodecs.Zstd(level=level), filters
+
+    if codec == 'lzf':
+        # not available in numcodecs
+        raise ValueError('compression codec "lzf" is not supported by Zarr output '
+                         '(use "gzip", "zstd", or "blosc" instead)')
+
+    raise ValueError('unknown compression codec "{}"'.format(codec))
+
+
+def create_variable(group, key, var_spec, dimensions):
+    compressor, filters = get_codecs(var_spec['compression'], var_spec['dtype'])
+
+    shape = tuple(dimensions[dim] or 0 for dim in var_spec['dims'])
+    var = group.create_dataset(
+        key, shape=shape, chunks=var_spec['chunks'], dtype=var_spec['dtype'],
+        fill_value=variables.FILL_VALUE, compressor=compressor, filters=filters
+    )
+    var.attrs.update(var_spec['attrs'])
+    var.attrs.update(
+        _ARRAY_DIMENSIONS=list(var_spec['dims']),
+        missing_value=variables.FILL_VALUE
+    )
+
+
+def write_variable_snapshot(group, key, snapshot, time_step=None, synchronizer=None):
+    """
+    Write data collected by get_variable_snapshot to its chunk of the array.
+
+    Only uses NumPy, so this is safe to call from a background thread.
+    """
+    import zarr
+
+    var_data = get_output_data(snapshot)
+    chunk = snapshot.chunk
+
+    var_obj = group[key]
+    if var_obj.ndim > len(chunk):
+        if time_step is None:
+            raise ValueError('time step must be given for non-constant data')
+
+        chunk = (time_step,) + chunk
+
+    if synchronizer is not None and not _is_aligned(var_obj, chunk):
+        # chunk is shared with other processes, so writes need a lock
+        var_obj = zarr.open_array(
+            var_obj.store, mode='r+', path=var_obj.path, synchronizer=synchronizer
+        )
+
+    var_obj[chunk] = var_data
+
+
+def create_file(filepath, file_spec, file_options, snapshots, parallel=False, comm=None):
+    """
+    Create a new output store as described by get_file_spec, and write the
+    given constant data to it.
+
+    Arguments:
+        file_options: Ignored, since there are no file handles to keep open.
+        snapshots: List containing one dict of variable snapshots per contributing process.
+        parallel: Whether this is called collectively by all processes.
+        comm: Communicator of all processes if parallel (defaults to the global one).
+
+    """
+    import zarr
+
+    if comm is None:
+        comm = rs.mpi_comm
+
+    if not parallel or comm.Get_rank() == 0:
+        group = zarr.open_group(filepath, mode='w')
+        create_file_structure(group, file_spec)
+
+    if parallel:
+        comm.Barrier()
+
+    group = zarr.open_group(filepath, mode='r+')
+    synchronizer = _get_synchronizer(filepath, parallel)
+
+    for proc_snapshots in snapshots:
+        for key, snapshot in proc_snapshots.items():
+            write_variable_snapshot(group, key, snapshot, synchronizer=synchronizer)
+
+
+def write_snapshots(filepath, time_value, file_options, snapshots, parallel=False, comm=None):
+    """
+    Append a new time step to an existing output store and write all given variable
+    snapshots to it.
+
+    Only uses NumPy, so this is safe to call from a background thread.
+
+    Arguments:
+        file_options: Ignored, since there are no file handles to keep open.
+        snapshots: List containing one dict of variable snapshots per contributing process.
+        parallel: Whether this is called collectively by all processes.
+        comm: Communicator of all processes if parallel (defaults to the global one).
+
+    """
+    import zarr
+
+    if comm is None:
+        comm = rs.mpi_comm
+
+    group = zarr.open_group(filepath, mode='r+')
+
+    is_root = not parallel or comm.Get_rank() == 0
+    time_step = None
+
+    if is_root:
+        time_step = append_time_step(group, time_value)
+
+    if parallel:
+        # also makes sure that no process writes before all arrays are resized
+        time_step = comm.bcast(time_step, root=0)
+
+    synchronizer = _get_synchronizer(filepath, parallel)
+
+    for proc_snapshots in snapshots:
+        for key, snapshot in proc_snapshots.items():
+            write_variable_snapshot(
+                group, key, snapshot, time_step=time_step, synchronizer=synchronizer
+            )
+
+
+def append_time_step(group, time_value):
+    """
+    Grow all time-dependent arrays by one time step. Only touches array metadata.
+    """
+    time_step = group['Time'].shape[0]
+
+    for _, var in group.arrays():
+        dims = var.attrs.get('_ARRAY_DIMENSIONS', [])
+        if dims and dims[0] == 'Time':
+            var.resize((time_step + 1,) + var.shape[1:])
+
+    group['Time'][time_step] = time_value
+    return time_step
+
+
+def _get_synchronizer(filepath, parallel):
+    if not parallel:
+        return None
+
+    import zarr
+    return zarr.ProcessSynchronizer(filepath + '.sync')
+
+
+def _is_aligned(var_obj, chunk):
+    """Whether chunk does not share any chunks of var_obj with neighboring processes."""
+    for idx, size, chunksize in zip(chunk, var_obj.shape, var_obj.chunks):
+        if not isinstance(idx, slice):
+            # time index, same on all processes
+            continue
+
+        start, stop, _ = idx.indices(size)
+        if start % chunksize or (stop % chunksize and stop != size):
+            return False
+
+    return True
@@ -0,0 +1,269 @@
+from collections import OrderedDict
+
+from loguru import logger
+
+from .diagnostic import VerosDiagnostic
+from .regional_means import get_region_mask
+from .. import veros_method
+from ..variables import Variable, TIMESTEPS, T_GRID, T_HOR, allocate
+from ..distributed import global_sum
+
+"""
+Zonally integrated meridional transports of heat and salt, and zonal means, per basin.
+
+All zonal sums of a sample (for every field and basin) are computed on each process
+first, and then summed over all processes in the same row of the domain decomposition
+in a single reduction.
+"""
+
+TRANSPORT_VARIABLES = OrderedDict([
+    ('temp_transport', Variable(
+        'Temperature transport', ('yu', 'zt', 'basin'), 'K m^3/s',
+        'Zonally integrated meridional transport of temperature per level',
+        output=True, write_to_restart=True
+    )),
+    ('salt_transport', Variable(
+        'Salinity transport', ('yu', 'zt', 'basin'), 'g/kg m^3/s',
+        'Zonally integrated meridional transport of salinity per level',
+        output=True, write_to_restart=True
+    )),
+])
+
+COLUMN_TRANSPORT_VARIABLES = OrderedDict([
+    ('heat_transport', Variable(
+        'Meridional heat transport', ('yu', 'basin'), 'W',
+        'Zonally and vertically integrated meridional heat transport',
+        output=True
+    )),
+    ('total_salt_transport', Variable(
+        'Meridional salt transport', ('yu', 'basin'), 'kg/s',
+        'Zonally and vertically integrated meridional salt transport',
+        output=True
+    )),
+])
+
+
+class MeridionalTransport(VerosDiagnostic):
+    """Meridional transports of heat and salt and zonal means of variables,
+    globally and per basin.
+
+    Transports are computed from the resolved (Eulerian mean) velocity ``v`` and the
+    temperature and salinity interpolated to V cells, and integrated zonally. Contributions
+    of eddy-driven velocities and diffusion are not included. ``temp_transport`` and
+    ``salt_transport`` are written per level, ``heat_transport`` (scaled with ``rho_0``
+    and :attr:`cp_0`) and ``total_salt_transport`` (scaled with ``rho_0``) integrated
+    over the water column. Zonal means are weighted with cell areas and exclude land cells.
+    All quantities are averaged over all samples of an output interval.
+
+    The last dimension of all output is ``basin``, where the first entry holds global
+    values and all others those of :attr:`basins`. A V cell belongs to a basin if one of
+    the adjacent T cells does.
+    """
+    name = 'meridional_transport'  #:
+    output_path = '{identifier}.meridional_transport.nc'  #: File to write to. May contain format strings that are replaced with Veros attributes.
+    zonal_mean_variables = ('temp', 'salt')  #: Variables (on the T grid or the horizontal T grid) whose zonal means are written, e.g. as ``temp_zonal_mean``.
+    #: Mapping of basin name to a region as in
+    #: :attr:`veros.diagnostics.regional_means.RegionalMeans.regions`, e.g. a boolean mask
+    #: of the horizontal T grid. Basin names (starting with ``global``) are written to
+    #: the attribute ``basin_names`` of the ``basin`` variable.
+    basins = None
+    cp_0 = 3991.86795711963  #: Heat capacity of sea water (in J/kg/K) used for heat transports.
+    output_frequency = None  #: Frequency (in seconds) in which output is written.
+    sampling_frequency = None  #: Frequency (in seconds) in which variables are accumulated.
+
+    @veros_method
+    def initialize(self, vs):
+        self.nitts = 0
+
+        if not self.is_active():
+            # skip all global reductions
+            return
+
+        basins = OrderedDict([('global', {})])
+        basins.update(self.basins or {})
+        self.basin_names = list(basins.keys())
+
+        basin_masks_t = [get_region_mask(vs, name, basin) for name, basin in basins.items()]
+        # V cells adjacent to a T cell in the basin
+        self._basin_masks_v = [
+            mask[2:-2, 2:-2] | mask[2:-2, 3:-1] for mask in basin_masks_t
+        ]
+        self._basin_masks_t = [mask[2:-2, 2:-2] for mask in basin_masks_t]
+
+        self._area_v = vs.dxt[2:-2, np.newaxis, np.newaxis] * vs.cosu[np.newaxis, 2:-2, np.newaxis] \
+            * vs.dzt[np.newaxis, np.newaxis, :] * vs.maskV[2:-2, 2:-2, :]
+
+        self._zonal_mean_weights = OrderedDict()
+        self.mean_variables = OrderedDict()
+        for key in self.zonal_mean_variables or ():
+            var = vs.variables[key]
+            grid = var.dims[:-1] if var.dims[-1:] == TIMESTEPS else var.dims
+            if grid == T_GRID:
+                weights = vs.area_t[2:-2, 2:-2, np.newaxis] * vs.maskT[2:-2, 2:-2, :]
+            elif grid == T_HOR:
+                weights = vs.area_t[2:-2, 2:-2] * vs.maskT[2:-2, 2:-2, -1]
+            else:
+                raise ValueError('cannot compute zonal means of variable {} in diagnostic "{}" '
+                                 '(must be on grid {} or {})'.format(key, self.name, T_GRID, T_HOR))
+
+            self._zonal_mean_weights[key] = weights
+            self.mean_variables['{}_zonal_mean'.format(key)] = Variable(
+                var.name, ('yt',) + grid[2:] + ('basin',), var.units,
+                'Zonal mean of {}'.format(var.long_description),
+                output=True, write_to_restart=True, mask=self._get_output_mask(key)
+            )
+
+        # weights of zonal means never change
+        self._weight_sums = OrderedDict(zip(
+            self._zonal_mean_weights,
+            self._get_zonal_sums(vs, [(weights, self._basin_masks_t)
+                                      for weights in self._zonal_mean_weights.values()])
+        ))
+
+        self._allocate(vs)
+
+        self.variables = OrderedDict([
+            ('basin', Variable(
+                'Basin', ('basin',), '', 'Basin index', dtype='int32', output=True,
+                time_dependent=False, extra_attributes={'basin_names': ', '.join(self.basin_names)}
+            )),
+        ])
+        self.variables.update(TRANSPORT_VARIABLES)
+        self.variables.update(COLUMN_TRANSPORT_VARIABLES)
+        self.variables.update(self.mean_variables)
+
+        self.initialize_output(vs, self.variables, var_data={'basin': np.arange(len(self.basin_names))},
+                               extra_dimensions={'basin': len(self.basin_names)})
+
+    @veros_method
+    def _allocate(self, vs):
+        num_basins = len(self.basin_names)
+        self.temp_transport = allocate(vs, ('yu', 'zt', num_basins))
+        self.salt_transport = allocate(vs, ('yu', 'zt', num_basins))
+        for key, var in self.mean_variables.items():
+            setattr(self, key, allocate(vs, var.dims[:-1] + (num_basins,)))
+
+    def _get_output_mask(self, key):
+        # latitudes (and levels) without water cells are written as missing values
+        def get_mask(vs):
+            mask = allocate(vs, self.mean_variables['{}_zonal_mean'.format(key)].dims[:-1]
+                            + (len(self.basin_names),), dtype='bool')
+            mask[2:-2] = self._weight_sums[key] > 0
+            return mask
+        return get_mask
+
+    @veros_method
+    def _get_zonal_sums(self, vs, fields):
+        """Zonal sums of all fields over all basins, with a single reduction.
+
+        Arguments:
+            fields: Iterable of pairs of an array on the local grid (without ghost cells)
+                and the horizontal boolean masks of all basins on the same grid.
+
+        Returns:
+            List of arrays with zonal sums of each field, with basins along the last axis.
+        """
+        local_sums = []
+        for field, basin_masks in fields:
+            field_sums = np.empty(field.shape[1:] + (len(basin_masks),), dtype=field.dtype)
+            for i, mask in enumerate(basin_masks):
+                newaxes = (slice(None), slice(None)) + (np.newaxis,) * (field.ndim - 2)
+                field_sums[..., i] = np.sum(field * mask[newaxes], axis=0)
+            local_sums.append(field_sums)
+
+        if not local_sums:
+            return []
+
+        # sum over all processes in the same row at once (zonal sums of
+        # all fields are independent of each other, so they can be concatenated)
+        sizes = [arr.size for arr in local_sums]
+        global_sums = global_sum(vs, np.concatenate([arr.ravel() for arr in local_sums]), axis=0)
+        return [arr.reshape(local_arr.shape) for arr, local_arr in
+                zip(np.split(global_sums, np.cumsum(sizes)[:-1]), local_sums)]
+
+    @veros_method
+    def diagnose(self, vs):
+        if not self.is_active():
+            return
+
+        tau = vs.tau
+
+        flux = vs.v[2:-2, 2:-2, :, tau] * self._area_v
+        temp_v = 0.5 * (vs.temp[2:-2, 2:-2, :, tau] + vs.temp[2:-2, 3:-1, :, tau])
+        salt_v = 0.5 * (vs.salt[2:-2, 2:-2, :, tau] + vs.salt[2:-2, 3:-1, :, tau])
+        fields = [
+            (flux * temp_v, self._basin_masks_v),
+            (flux * salt_v, self._basin_masks_v),
+        ]
+
+        for key, weights in self._zonal_mean_weights.items():
+            arr = getattr(vs, key)
+            if vs.variables[key].dims[-1:] == TIMESTEPS:
+                arr = arr[..., tau]
+            fields.append((weights * arr[2:-2, 2:-2], self._basin_masks_t))
+
+        zonal_sums = self._get_zonal_sums(vs, fields)
+        for key, zonal_sum in zip(self._get_accumulators(), zonal_sums):
+            getattr(self, key)[2:-2] += zonal_sum
+
+        self.nitts += 1
+
+    @veros_method
+    def output(self, vs):
+        if not self.output_file_exists(vs):
+            self.initialize_output(vs, self.variables, var_data={'basin': np.arange(len(self.basin_names))},
+                                   extra_dimensions={'basin': len(self.basin_names)})
+
+        nitts = float(self.nitts or 1)
+
+        var_data = {
+            'temp_transport': self.temp_transport / nitts,
+            'salt_transport': self.salt_transport / nitts,
+        }
+        var_data['heat_transport'] = vs.rho_0 * self.cp_0 * np.sum(var_data['temp_transport'], axis=1)
+        var_data['total_salt_transport'] = vs.rho_0 * 1e-3 * np.sum(var_data['salt_transport'], axis=1)
+
+        for key, weight_sums in self._weight_sums.items():
+            mean_key = '{}_zonal_mean'.format(key)
+            has_water = weight_sums > 0
+            mean = allocate(vs, self.mean_variables[mean_key].dims[:-1] + (len(self.basin_names),))
+            mean[2:-2] = np.where(has_water, getattr(self, mean_key)[2:-2] / nitts
+                                  / np.where(has_water, weight_sums, 1.), 0.)
+            var_data[mean_key] = mean
+
+        var_meta = {key: var for key, var in self.variables.items() if var.time_dependent}
+        self.write_output(vs, var_meta, var_data)
+
+        self.nitts = 0
+        for key in self._get_accumulators():
+            getattr(self, key)[...] = 0.
+
+    def _get_accumulators(self):
+        return list(TRANSPORT_VARIABLES.keys()) + list(self.mean_variables.keys())
+
+    @veros_method
+    def read_restart(self, vs, infile):
+        if not self.is_active():
+            return
+
+        var_meta = dict(TRANSPORT_VARIABLES, **self.mean_variables)
+        attributes, variables = self.read_h5_restart(vs, var_meta, infile)
+        if attributes:
+            self.nitts = attributes['nitts']
+        for key, arr in variables.items():
+            accumulator = getattr(self, key)
+            if arr.shape != accumulator.shape:
+                logger.warning(' Not reading restart data for {}: shape {} does not match {} '
+                               '(number of basins changed?)', key, arr.shape, accumulator.shape)
+                continue
+            accumulator[...] = arr
+
+    @veros_method
+    def write_restart(self, vs, outfile):
+        # inactive diagnostics have no restart data (and are not validated when reading)
+        if not self.is_active():
+            return
+
+        var_meta = OrderedDict((key, self.variables[key]) for key in self._get_accumulators())
+        var_data = {key: getattr(self, key) for key in var_meta}
+        self.write_h5_restart(vs, {'nitts': self.nitts}, var_meta, var_data, outfile)
@@ -1,9 +1,9 @@
 from collections import OrderedDict
-import os
 
+import numpy
 from loguru import logger
 
-from .. import veros_method
+from .. import veros_method, runtime_settings as rs
 from .diagnostic import VerosDiagnostic
 from ..core import density
 from ..variables import Variable, allocate
@@ -46,6 +46,27 @@ def zonal_sum(vs, arr):
     return global_sum(vs, np.sum(arr, axis=0), axis=0)
 
 
+def _searchsorted_along_last_axis(sorted_arr, values):
+    """Like ``numpy.searchsorted(..., side='right')`` for every row of ``sorted_arr``
+    (NumPy arrays only).
+
+    Sorts coordinates and values of every row together, so this only needs
+    O(sorted_arr.size + values.size) memory.
+    """
+    num_sorted = sorted_arr.shape[-1]
+    merged = numpy.concatenate((sorted_arr, values), axis=-1)
+    # stable sort puts sorted elements before values that are equal to them
+    order = numpy.argsort(merged, axis=-1, kind='stable')
+    is_value = order >= num_sorted
+    num_sorted_before = numpy.cumsum(~is_value, axis=-1)
+
+    # every row contains the same number of values
+    result = numpy.empty(values.shape, dtype='int')
+    numpy.put_along_axis(result, order[is_value].reshape(values.shape) - num_sorted,
+                         num_sorted_before[is_value].reshape(values.shape), axis=-1)
+    return result
+
+
 class Overturning(VerosDiagnostic):
     """Isopycnal overturning diagnostic. Computes and writes vertical streamfunctions
     (zonally averaged).
@@ -125,37 +146,29 @@ class Overturning(VerosDiagnostic):
                 * vs.dzt[np.newaxis, np.newaxis, :]
                 * vs.maskV[2:-2, 2:-2, :])
 
-        for m in range(self.nlevel):
-            # NOTE: vectorized version would be O(N^4) in memory
-            # consider cythonizing if performance-critical
-            mask = sig_loc_face > self.sigma[m]
-            trans[2:-2, m] = zonal_sum(vs, np.sum(vs.v[2:-2, 2:-2, :, vs.tau] * fac * mask, axis=2))
-            z_sig[2:-2, m] = zonal_sum(vs, np.sum(fac * mask, axis=2))
-
-        self.trans += trans
+        weights = [vs.v[2:-2, 2:-2, :, vs.tau] * fac, fac]
 
         if vs.enable_neutral_diffusion and vs.enable_skew_diffusion:
             bolus_trans = allocate(vs, ('yu', self.nlevel))
             # eddy-driven transports below isopycnals
-            for m in range(self.nlevel):
-                # NOTE: see above
-                mask = sig_loc_face > self.sigma[m]
-                bolus_trans[2:-2, m] = zonal_sum(vs,
-                    np.sum(
-                        (vs.B1_gm[2:-2, 2:-2, 1:] - vs.B1_gm[2:-2, 2:-2, :-1])
-                        * vs.dxt[2:-2, np.newaxis, np.newaxis]
-                        * vs.cosu[np.newaxis, 2:-2, np.newaxis]
-                        * vs.maskV[2:-2, 2:-2, 1:]
-                        * mask[:, :, 1:],
-                        axis=2
-                    )
-                    +
-                    vs.B1_gm[2:-2, 2:-2, 0]
-                    * vs.dxt[2:-2, np.newaxis]
-                    * vs.cosu[np.newaxis, 2:-2]
-                    * vs.maskV[2:-2, 2:-2, 0]
-                    * mask[:, :, 0]
-                )
+            bolus_fac = vs.dxt[2:-2, np.newaxis, np.newaxis] * vs.cosu[np.newaxis, 2:-2, np.newaxis]
+            bolus_weights = np.empty_like(fac)
+            bolus_weights[:, :, 0] = vs.B1_gm[2:-2, 2:-2, 0] * bolus_fac[..., 0] * vs.maskV[2:-2, 2:-2, 0]
+            bolus_weights[:, :, 1:] = (
+                (vs.B1_gm[2:-2, 2:-2, 1:] - vs.B1_gm[2:-2, 2:-2, :-1])
+                * bolus_fac * vs.maskV[2:-2, 2:-2, 1:]
+            )
+            weights.append(bolus_weights)
+
+        # transports and area below isopycnals, summed over all processes at once
+        below_isopycnals = global_sum(vs, self._integrate_below_isopycnals(vs, sig_loc_face, weights), axis=0)
+
+        trans[2:-2, :] = below_isopycnals[0]
+        z_sig[2:-2, :] = below_isopycnals[1]
+        self.trans += trans
+
+        if vs.enable_neutral_diffusion and vs.enable_skew_diffusion:
+            bolus_trans[2:-2, :] = below_isopycnals[2]
 
         # streamfunction on geopotentials
         self.vsf_depth[2:-2, :] += np.cumsum(zonal_sum(vs,
@@ -172,60 +185,87 @@ class Overturning(VerosDiagnostic):
                 * vs.B1_gm[2:-2, 2:-2, :])
 
         # interpolate from isopycnals to depth
+        # (area below isopycnals decreases with density, so reverse the sigma axis)
         self.vsf_iso[2:-2, :] += self._interpolate_along_axis(vs,
-                                                              z_sig[2:-2, :], trans[2:-2, :],
+                                                              z_sig[2:-2, ::-1], trans[2:-2, ::-1],
                                                               self.zarea[2:-2, :], 1)
         if vs.enable_neutral_diffusion and vs.enable_skew_diffusion:
             self.bolus_iso[2:-2, :] += self._interpolate_along_axis(vs,
-                                                                    z_sig[2:-2, :], bolus_trans[2:-2, :],
+                                                                    z_sig[2:-2, ::-1], bolus_trans[2:-2, ::-1],
                                                                     self.zarea[2:-2, :], 1)
 
         self.nitts += 1
 
+    @veros_method
+    def _integrate_below_isopycnals(self, vs, sig, weights):
+        """Sum of weights over all cells (of the current process) that are denser
+        than each sigma level, per latitude.
+
+        Instead of comparing every cell with every sigma level, cells are sorted into
+        density classes between sigma levels, so this is a single pass over the data.
+        """
+        ny = sig.shape[1]
+        num_classes = self.nlevel + 1
+
+        # number of sigma levels that are lighter than each cell
+        density_class = np.searchsorted(self.sigma, sig, side='left')
+        bins = (np.arange(ny)[np.newaxis, :, np.newaxis] * num_classes + density_class).ravel()
+
+        result = np.empty((len(weights), ny, self.nlevel), dtype=sig.dtype)
+        for i, weight in enumerate(weights):
+            class_sums = np.bincount(bins, weights=weight.ravel(), minlength=ny * num_classes)
+            class_sums = class_sums.reshape(ny, num_classes)
+            # cells in class k are denser than sigma levels 0, ..., k - 1
+            result[i] = np.cumsum(class_sums[:, ::-1], axis=1)[:, -2::-1]
+
+        return result
+
     @veros_method
     def _interpolate_along_axis(self, vs, coords, arr, interp_coords, axis=0):
-        # TODO: clean up this mess
+        """Linear interpolation of ``arr`` from ``coords`` to ``interp_coords`` along ``axis``.
+
+        ``coords`` must be non-decreasing along ``axis``. Points outside the range of
+        ``coords`` are assigned the value at the nearest end.
+        """
+        if rs.backend == 'bohrium':
+            # Bohrium supports neither sorting nor take_along_axis, and these arrays are small
+            coords, arr, interp_coords = (a.copy2numpy() for a in (coords, arr, interp_coords))
 
         if coords.ndim == 1:
             if len(coords) != arr.shape[axis]:
                 raise ValueError('Coordinate shape must match array shape along axis')
+            coords_shape = [1] * arr.ndim
+            coords_shape[axis] = -1
+            coords = numpy.broadcast_to(coords.reshape(coords_shape), arr.shape)
         elif coords.ndim == arr.ndim:
             if coords.shape != arr.shape:
                 raise ValueError('Coordinate shape must match array shape')
         else:
             raise ValueError('Coordinate shape must match array dimensions')
 
-        if axis != 0:
-            arr = np.moveaxis(arr, axis, 0)
-            coords = np.moveaxis(coords, axis, 0)
-            interp_coords = np.moveaxis(interp_coords, axis, 0)
-
-        diff = coords[np.newaxis, :, ...] - interp_coords[:, np.newaxis, ...]
-        diff_m = np.where(diff <= 0., np.abs(diff), np.inf)
-        diff_p = np.where(diff > 0., np.abs(diff), np.inf)
-        i_m = np.asarray(np.argmin(diff_m, axis=1))
-        i_p = np.asarray(np.argmin(diff_p, axis=1))
-        mask = np.all(np.isinf(diff_m), axis=1)
-        i_m[mask] = i_p[mask]
-        mask = np.all(np.isinf(diff_p), axis=1)
-        i_p[mask] = i_m[mask]
-        full_shape = (slice(None),) + (np.newaxis,) * (arr.ndim - 1)
-        if coords.ndim == 1:
-            i_p_full = i_p[full_shape] * np.ones(arr.shape)
-            i_m_full = i_m[full_shape] * np.ones(arr.shape)
-        else:
-            i_p_full = i_p
-            i_m_full = i_m
-        ii = np.indices(i_p_full.shape)
-        i_p_slice = (i_p_full,) + tuple(ii[1:])
-        i_m_slice = (i_m_full,) + tuple(ii[1:])
-        dx = (coords[i_p_slice] - coords[i_m_slice])
-        pos = np.where(dx == 0., 0., (coords[i_p_slice] - interp_coords) / (dx + 1e-12))
-        return np.moveaxis(arr[i_p_slice] * (1. - pos) + arr[i_m_slice] * pos, 0, axis)
+        coords = numpy.moveaxis(coords, axis, -1)
+        arr = numpy.moveaxis(arr, axis, -1)
+        interp_coords = numpy.moveaxis(interp_coords, axis, -1)
+
+        # indices of the coordinates enclosing every interpolation point
+        num_coords = coords.shape[-1]
+        upper = _searchsorted_along_last_axis(coords, interp_coords)
+        lower = numpy.clip(upper - 1, 0, num_coords - 1)
+        upper = numpy.minimum(upper, num_coords - 1)
+
+        coords_lower = numpy.take_along_axis(coords, lower, axis=-1)
+        coords_upper = numpy.take_along_axis(coords, upper, axis=-1)
+        dx = coords_upper - coords_lower
+        # same weights as before, including the guard against layers of zero thickness
+        pos = numpy.where(dx == 0., 0., (coords_upper - interp_coords) / (dx + 1e-12))
+
+        result = (numpy.take_along_axis(arr, upper, axis=-1) * (1. - pos)
+                  + numpy.take_along_axis(arr, lower, axis=-1) * pos)
+        return np.asarray(numpy.moveaxis(result, -1, axis))
 
     @veros_method
     def output(self, vs):
-        if not os.path.isfile(self.get_output_file_name(vs)):
+        if not self.output_file_exists(vs):
             self.initialize_output(vs, self.variables,
                                    var_data={'sigma': self.sigma},
                                    extra_dimensions={'sigma': self.nlevel})
@@ -0,0 +1,362 @@
+from collections import OrderedDict, namedtuple
+
+from loguru import logger
+
+from .diagnostic import VerosDiagnostic
+from .. import veros_method
+from ..variables import Variable, TIMESTEPS, T_GRID, T_HOR
+from ..distributed import global_sum
+
+"""
+Time series of volume- (or area-) weighted means of model variables over regions.
+
+Every water cell of the local domain is listed once for every region and depth band it
+belongs to in a sparse index, which is computed when the diagnostic is initialized.
+A sample then gathers each variable at these cells and sums them into all regions and
+depth bands at once (with ``np.bincount``), and the sums of all variables are combined
+over all processes in a single reduction. The output only contains one value per
+variable, region, and depth band, so it is cheap to write at high frequency.
+"""
+
+REGION_VARIABLES = OrderedDict([
+    ('depth_band_lower', Variable(
+        'Lower bound of depth band', ('depth_band',), 'm', 'Lower bound of depth band',
+        output=True, time_dependent=False, extra_attributes={'positive': 'up'}
+    )),
+    ('depth_band_upper', Variable(
+        'Upper bound of depth band', ('depth_band',), 'm', 'Upper bound of depth band',
+        output=True, time_dependent=False, extra_attributes={'positive': 'up'}
+    )),
+    ('region_volume', Variable(
+        'Region volume', ('region', 'depth_band'), 'm^3',
+        'Volume of all water cells in region and depth band',
+        output=True, time_dependent=False
+    )),
+    ('region_area', Variable(
+        'Region area', ('region',), 'm^2', 'Surface area of all water cells in region',
+        output=True, time_dependent=False
+    )),
+])
+
+#: Water cells of the local domain in every output bin (region and depth band).
+#: ``cells`` are flat indices into the local grid (including ghost cells), ``bins`` the
+#: bin of every cell, and ``weights`` its volume or area.
+SparseIndex = namedtuple('SparseIndex', ('cells', 'bins', 'weights', 'num_bins'))
+
+
+@veros_method(inline=True)
+def get_region_mask(vs, name, region):
+    """Boolean mask of a region on the local horizontal T grid (including ghost cells).
+
+    Arguments:
+        name: Name of the region (used in error messages).
+        region: Either a mapping of ``'x'`` and / or ``'y'`` to bounds ``(lower, upper)``
+            (in units of ``xt`` and ``yt``), a boolean array that can be broadcast to the
+            horizontal T grid, or a callable that takes the Veros state and returns such
+            an array.
+
+    """
+    if callable(region):
+        region = region(vs)
+
+    grid_shape = vs.maskT.shape[:2]
+
+    if isinstance(region, dict):
+        unknown_axes = set(region) - {'x', 'y'}
+        if unknown_axes:
+            raise ValueError('unknown axes {} in region {} (must be x or y)'
+                             .format(', '.join(sorted(unknown_axes)), name))
+
+        mask = np.ones(grid_shape, dtype='bool')
+        if 'x' in region:
+            lower, upper = sorted(region['x'])
+            mask &= ((vs.xt >= lower) & (vs.xt <= upper))[:, np.newaxis]
+        if 'y' in region:
+            lower, upper = sorted(region['y'])
+            mask &= ((vs.yt >= lower) & (vs.yt <= upper))[np.newaxis, :]
+        return mask
+
+    try:
+        return np.broadcast_to(np.asarray(region, dtype='bool'), grid_shape)
+    except ValueError:
+        raise ValueError('mask of region {} must have the shape {} of the horizontal T grid'
+                         .format(name, grid_shape))
+
+
+@veros_method(inline=True)
+def get_sparse_index(vs, weights, masks):
+    """Sparse index of all cells with positive weight in each of the given masks.
+
+    Arguments:
+        weights: Cell volumes or areas of the local domain (without ghost cells).
+        masks: One boolean array per bin that can be broadcast to ``weights``.
+
+    """
+    grid_shape = tuple(n + 4 for n in weights.shape[:2]) + weights.shape[2:]
+    cell_index = np.arange(int(np.prod(grid_shape))).reshape(grid_shape)[2:-2, 2:-2]
+    is_water = weights > 0
+
+    cells, bins, cell_weights = [], [], []
+    for i, mask in enumerate(masks):
+        in_bin = is_water & mask
+        cells.append(cell_index[in_bin])
+        bins.append(np.full(cells[-1].shape, i, dtype='int'))
+        cell_weights.append(weights[in_bin])
+
+    return SparseIndex(np.concatenate(cells), np.concatenate(bins),
+                       np.concatenate(cell_weights), len(masks))
+
+
+@veros_method(inline=True)
+def get_bin_sums(vs, index, arr, tau=None):
+    """Weighted sums of a local array over all bins of a sparse index.
+
+    If ``tau`` is given, the array is read at this index of its last (time) axis.
+    """
+    cells = index.cells
+    if tau is not None:
+        # index the flattened array, so the time level is not copied first
+        cells = cells * arr.shape[-1] + tau
+    return np.bincount(index.bins, weights=index.weights * np.take(arr, cells),
+                       minlength=index.num_bins)
+
+
+class RegionalMeans(VerosDiagnostic):
+    """Time series of mean values of variables over regions and depth bands.
+
+    Means are weighted with cell volumes (for variables on the T grid, ``xt, yt, zt``)
+    or cell areas (for variables on the horizontal T grid, ``xt, yt``) and exclude land
+    cells. All samples of an output interval are averaged. Means over three-dimensional
+    variables have dimensions ``depth_band`` and ``region``, means over two-dimensional
+    ones only ``region``. Regions (or depth bands) without water cells are written as
+    missing values.
+
+    Example:
+
+        >>> def set_diagnostics(self, vs):
+        >>>     means = vs.diagnostics['regional_means']
+        >>>     means.output_variables = ['temp', 'salt', 'forc_temp_surface']
+        >>>     means.regions = OrderedDict([
+        >>>         ('global', {}),
+        >>>         ('north_atlantic', {'x': (280., 360.), 'y': (30., 70.)}),
+        >>>         ('southern_ocean', lambda vs: vs.yt[np.newaxis, :] < -40.),
+        >>>     ])
+        >>>     means.depth_bands = [(-500., 0.), (-2000., -500.), (-6000., -2000.)]
+        >>>     means.sampling_frequency = vs.dt_tracer
+        >>>     means.output_frequency = 86400.
+
+    """
+    name = 'regional_means'  #:
+    output_path = '{identifier}.regional_means.nc'  #: File to write to. May contain format strings that are replaced with Veros attributes.
+    output_variables = None  #: Iterable of variables (on the T grid or the horizontal T grid) whose regional means are written.
+    #: Mapping of region name to either a mapping of ``'x'`` and / or ``'y'`` to bounds
+    #: ``(lower, upper)`` (in units of ``xt`` and ``yt``), a boolean array of the shape of
+    #: the horizontal T grid (e.g. ``vs.maskT[..., -1]``), or a callable that takes the
+    #: Veros state and returns such an array. Regions may overlap. Defaults to a single
+    #: region ``global``. Region names are written to the attribute ``region_names``
+    #: of the ``region_area`` variable, in the order of the ``region`` dimension.
+    regions = None
+    #: Iterable of bounds ``(lower, upper)`` of depth bands (in units of ``zt``, i.e.,
+    #: negative below the surface). A cell belongs to every band with
+    #: ``lower <= zt < upper``. Defaults to a single band containing the whole water column.
+    depth_bands = None
+    output_integrals = False  #: Whether to also write integrals over regions (instead of means), e.g. as ``temp_integral``.
+    output_frequency = None  #: Frequency (in seconds) in which output is written.
+    sampling_frequency = None  #: Frequency (in seconds) in which variables are accumulated.
+
+    @veros_method
+    def initialize(self, vs):
+        self.nitts = 0
+        self.mean_variables = OrderedDict()
+        self.sums = OrderedDict()
+
+        if not self.is_active():
+            # skip all global reductions
+            return
+
+        regions = self.regions
+        if regions is None:
+            regions = OrderedDict([('global', {})])
+        if not regions:
+            raise ValueError('diagnostic "{}" needs at least one region'.format(self.name))
+
+        depth_bands = self.depth_bands
+        if depth_bands is None:
+            depth_bands = [(-float(np.sum(vs.dzt)), 0.)]
+        if not depth_bands:
+            raise ValueError('diagnostic "{}" needs at least one depth band'.format(self.name))
+
+        self.region_names = list(regions.keys())
+        self.depth_band_bounds = [tuple(sorted(bounds)) for bounds in depth_bands]
+
+        region_masks = [get_region_mask(vs, name, region)[2:-2, 2:-2] for name, region in regions.items()]
+        band_masks = [(vs.zt >= lower) & (vs.zt < upper) for lower, upper in self.depth_band_bounds]
+
+        volumes = vs.area_t[2:-2, 2:-2, np.newaxis] * vs.dzt[np.newaxis, np.newaxis, :] \
+            * vs.maskT[2:-2, 2:-2, :]
+        areas = vs.area_t[2:-2, 2:-2] * vs.maskT[2:-2, 2:-2, -1]
+
+        self._indices = {
+            T_GRID: get_sparse_index(vs, volumes, [
+                region_mask[:, :, np.newaxis] & band_mask[np.newaxis, np.newaxis, :]
+                for region_mask in region_masks for band_mask in band_masks
+            ]),
+            T_HOR: get_sparse_index(vs, areas, region_masks),
+        }
+
+        self._grids = OrderedDict()
+        for key in self.output_variables or ():
+            var = vs.variables[key]
+            grid = var.dims[:-1] if var.dims[-1:] == TIMESTEPS else var.dims
+            if grid not in self._indices:
+                raise ValueError('cannot compute regional means of variable {} in diagnostic "{}" '
+                                 '(must be on grid {} or {})'.format(key, self.name, T_GRID, T_HOR))
+
+            self._grids[key] = grid
+            self.mean_variables[key] = Variable(
+                var.name, self._get_dimensions(grid), var.units,
+                'Regional mean of {}'.format(var.long_description),
+                output=True, write_to_restart=True, mask=self._get_output_mask(grid)
+            )
+
+        # sizes of all regions never change
+        index_t, index_hor = self._indices[T_GRID], self._indices[T_HOR]
+        region_volume, self.region_area = self._sum_over_processes(vs, [
+            np.bincount(index_t.bins, weights=index_t.weights, minlength=index_t.num_bins),
+            np.bincount(index_hor.bins, weights=index_hor.weights, minlength=index_hor.num_bins),
+        ])
+        self.region_volume = region_volume.reshape(self._get_shape(T_GRID))
+
+        for name, area in zip(self.region_names, self.region_area):
+            if not area > 0:
+                logger.warning(' Region {} of diagnostic "{}" does not contain any water cells',
+                               name, self.name)
+
+        self.sums = OrderedDict(
+            (key, np.zeros(self._get_shape(grid), dtype=vs.default_float_type)) for key, grid in self._grids.items()
+        )
+
+        self.variables = self._get_output_variables()
+        self.initialize_output(vs, self.variables, var_data=self._get_constant_data(vs),
+                               extra_dimensions=self._get_extra_dimensions())
+
+    def _get_shape(self, grid):
+        if grid == T_GRID:
+            return (len(self.region_names), len(self.depth_band_bounds))
+        return (len(self.region_names),)
+
+    def _get_dimensions(self, grid):
+        if grid == T_GRID:
+            return ('region', 'depth_band')
+        return ('region',)
+
+    def _get_extra_dimensions(self):
+        return OrderedDict([('region', len(self.region_names)),
+                            ('depth_band', len(self.depth_band_bounds))])
+
+    def _get_output_mask(self, grid):
+        # regions and depth bands without water cells are written as missing values
+        if grid == T_GRID:
+            return lambda vs: self.region_volume > 0
+        return lambda vs: self.region_area > 0
+
+    def _get_output_variables(self):
+        variables = OrderedDict(REGION_VARIABLES)
+        region_area = variables['region_area']
+        variables['region_area'] = Variable(
+            region_area.name, region_area.dims, region_area.units, region_area.long_description,
+            output=True, time_dependent=False,
+            extra_attributes={'region_names': ', '.join(self.region_names)}
+        )
+
+        variables.update(self.mean_variables)
+
+        if self.output_integrals:
+            for key, grid in self._grids.items():
+                var = self.mean_variables[key]
+                variables[key + '_integral'] = Variable(
+                    var.name, var.dims, '{} {}'.format(var.units, 'm^3' if grid == T_GRID else 'm^2'),
+                    var.long_description.replace('Regional mean', 'Regional integral', 1),
+                    output=True, mask=var.get_mask
+                )
+
+        return variables
+
+    @veros_method
+    def _get_constant_data(self, vs):
+        bounds = np.array(self.depth_band_bounds, dtype=vs.default_float_type)
+        return {
+            'depth_band_lower': bounds[:, 0],
+            'depth_band_upper': bounds[:, 1],
+            'region_volume': self.region_volume,
+            'region_area': self.region_area,
+        }
+
+    @veros_method
+    def _sum_over_processes(self, vs, local_sums):
+        """Sums of several flat arrays over all processes, in a single reduction."""
+        sizes = [len(arr) for arr in local_sums]
+        global_sums = global_sum(vs, np.concatenate(local_sums))
+        return np.split(global_sums, np.cumsum(sizes)[:-1])
+
+    @veros_method
+    def diagnose(self, vs):
+        if not self.sums:
+            return
+
+        local_sums = []
+        for key, grid in self._grids.items():
+            tau = vs.tau if vs.variables[key].dims[-1:] == TIMESTEPS else None
+            local_sums.append(get_bin_sums(vs, self._indices[grid], getattr(vs, key), tau))
+
+        for (key, sums), global_sums in zip(self.sums.items(), self._sum_over_processes(vs, local_sums)):
+            sums[...] += global_sums.reshape(sums.shape)
+
+        self.nitts += 1
+
+    @veros_method
+    def output(self, vs):
+        if not self.output_file_exists(vs):
+            self.initialize_output(vs, self.variables, var_data=self._get_constant_data(vs),
+                                   extra_dimensions=self._get_extra_dimensions())
+
+        nitts = float(self.nitts or 1)
+
+        var_data = {}
+        for key, grid in self._grids.items():
+            integral = self.sums[key] / nitts
+            size = self.region_volume if grid == T_GRID else self.region_area
+            var_data[key] = np.where(size > 0, integral / np.where(size > 0, size, 1.), 0.)
+            if self.output_integrals:
+                var_data[key + '_integral'] = integral
+
+        var_meta = {key: var for key, var in self.variables.items() if var.time_dependent}
+        self.write_output(vs, var_meta, var_data)
+
+        for sums in self.sums.values():
+            sums[...] = 0.
+        self.nitts = 0
+
+    @veros_method
+    def read_restart(self, vs, infile):
+        if not self.is_active():
+            return
+
+        attributes, variables = self.read_h5_restart(vs, self.mean_variables, infile)
+        if attributes:
+            self.nitts = attributes['nitts']
+
+        for key, arr in variables.items():
+            if arr.shape != self.sums[key].shape:
+                logger.warning(' Not reading restart data for regional means of {}: shape {} does '
+                               'not match regions and depth bands {}', key, arr.shape, self.sums[key].shape)
+                continue
+            self.sums[key][...] = arr
+
+    @veros_method
+    def write_restart(self, vs, outfile):
+        # inactive diagnostics have no restart data (and are not validated when reading)
+        if not self.is_active():
+            return
+
+        self.write_h5_restart(vs, {'nitts': self.nitts}, self.mean_variables, self.sums, outfile)
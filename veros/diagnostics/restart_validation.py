@@ -0,0 +1,146 @@
+import os
+import hashlib
+
+import numpy
+from loguru import logger
+
+from .. import veros_method, distributed, runtime_state
+from .io_tools import hdf5 as h5tools, merge
+
+"""
+Validation of restart files against the current setup.
+
+Only the metadata of restart files (attributes, and names, shapes, and data types of all
+variables) is read, so a restart file that does not fit the current setup is detected
+before any data is loaded. Restart files also store a hash of the model grid and
+topography, which is compared to that of the current setup.
+"""
+
+#: File attribute containing the hash of the grid the restart file was written for
+GRID_HASH_ATTRIBUTE = 'veros_grid_hash'
+
+GRID_MISMATCH = 'grid or topography differ from current setup'
+
+
+def find_restart_file(filename):
+    """File that contains the metadata of the given restart file.
+
+    This is the file itself, or the file of the first process if the restart file was
+    written by every process separately (and not merged yet).
+    """
+    if not os.path.isfile(filename):
+        process_files = merge.find_process_files(filename)
+        if process_files:
+            return process_files[0]
+        raise IOError('restart file {} not found'.format(filename))
+
+    return filename
+
+
+@veros_method
+def get_grid_hash(vs):
+    """Checksum identifying the model grid and topography of the current setup.
+
+    Identical on all processes, and independent of the domain decomposition. Coordinates
+    are compared in single precision, so that rounding errors do not change the hash.
+    """
+    xt = distributed.gather(vs, vs.xt, ('xt',))
+    yt = distributed.gather(vs, vs.yt, ('yt',))
+    kbot = distributed.gather(vs, vs.kbot, ('xt', 'yt'))
+
+    grid_hash = None
+    if runtime_state.proc_rank == 0:
+        checksum = hashlib.blake2b(digest_size=16)
+        checksum.update('{} {} {}'.format(vs.nx, vs.ny, vs.nz).encode('utf-8'))
+        for arr, dtype in ((xt[2:-2], 'float32'), (yt[2:-2], 'float32'),
+                           (vs.zt, 'float32'), (kbot[2:-2, 2:-2], 'int32')):
+            try:
+                arr = arr.copy2numpy()
+            except AttributeError:
+                pass
+            checksum.update(numpy.ascontiguousarray(arr, dtype=dtype).tobytes())
+        grid_hash = checksum.hexdigest()
+
+    return distributed.broadcast(vs, grid_hash)
+
+
+def validate_restart(vs, filename):
+    """Check whether a restart file matches the current setup, without reading any data.
+
+    The grid hash of the file (if present) and, for every diagnostic, the names of all
+    attributes and the names, global shapes, and data types of all variables that it
+    would write in a restart of the current setup are compared to the file. Variables in
+    the file that are not used by the current setup are not considered a mismatch.
+
+    Arguments:
+        filename: Restart file (or the merged name of per-process restart files).
+
+    Returns:
+        List of messages describing all mismatches (empty if the file matches).
+
+    """
+    return _validate_restart(vs, filename)[0]
+
+
+def _validate_restart(vs, filename):
+    """Mismatches (as returned by :func:`validate_restart`) and names of all diagnostics
+    without restart data in the file."""
+    file_attributes, groups = h5tools.read_restart_metadata(find_restart_file(filename))
+
+    problems, missing_groups = [], []
+    grid_hash = file_attributes.get(GRID_HASH_ATTRIBUTE)
+    if grid_hash is not None and grid_hash != get_grid_hash(vs):
+        problems.append(GRID_MISMATCH)
+
+    for name, diagnostic in vs.diagnostics.items():
+        expected = diagnostic.get_restart_metadata(vs)
+        if not expected.attributes and not expected.variables:
+            continue
+
+        group = groups.get(name)
+        if group is None:
+            problems.append('{}: no restart data'.format(name))
+            missing_groups.append(name)
+            continue
+
+        for key in sorted(set(expected.attributes) - set(group.attributes)):
+            problems.append('{}: attribute {} missing'.format(name, key))
+
+        for key, var in sorted(expected.variables.items()):
+            stored_var = group.variables.get(key)
+            if stored_var is None:
+                problems.append('{}: variable {} missing'.format(name, key))
+            elif stored_var.shape != var.shape:
+                problems.append('{}: variable {} has shape {} (expected {})'
+                                .format(name, key, stored_var.shape, var.shape))
+            elif not numpy.can_cast(stored_var.dtype, var.dtype, casting='same_kind'):
+                problems.append('{}: variable {} has data type {} (expected {})'
+                                .format(name, key, stored_var.dtype, var.dtype))
+
+    return problems, missing_groups
+
+
+def check_restart(vs, filename):
+    """Validate a restart file before it is read (see :func:`validate_restart`).
+
+    Raises a :exc:`RuntimeError` for any mismatch if
+    :ref:`enable_strict_restart_validation <setting-enable_strict_restart_validation>` is set.
+    Otherwise, data that does not match is skipped when reading, and only a grid that
+    differs from the current setup is reported here.
+
+    Returns:
+        Names of all diagnostics without restart data in the file, which are not read
+        and keep their initial state.
+    """
+    problems, missing_groups = _validate_restart(vs, filename)
+    if not problems:
+        return missing_groups
+
+    if vs.enable_strict_restart_validation:
+        raise RuntimeError('Restart file {} does not match the current setup:\n  {}'
+                           .format(filename, '\n  '.join(problems)))
+
+    if GRID_MISMATCH in problems:
+        logger.warning(' Restart file {} was written for a different grid or topography', filename)
+
+    return missing_groups
@@ -0,0 +1,143 @@
+import math
+import weakref
+from collections import namedtuple
+
+from .. import time
+
+"""
+Scheduling of recurring diagnostic events.
+
+Every event (sampling and output of a diagnostic, writing restarts) recurs with a fixed
+period, and is due in every time step that reaches or passes a multiple of that period.
+Instead of checking this for all events after every time step, the iteration at which
+each event is due next is computed in advance (in integer iterations, so that accumulated
+rounding errors in the model time cannot cause missed or duplicate events). Time steps
+without any due event skip the diagnostics altogether.
+"""
+
+#: Occurrence of an event, as returned by :meth:`Schedule.get_calendar`
+ScheduledEvent = namedtuple('ScheduledEvent', ('iteration', 'time', 'name'))
+
+# tolerance (relative to periods and time steps) of comparisons between model times
+_EPS = 1e-6
+
+# schedules per state
+_SCHEDULES = weakref.WeakKeyDictionary()
+
+
+def get_schedule(vs):
+    """The :class:`Schedule` of the given state."""
+    schedule = _SCHEDULES.get(vs)
+    if schedule is None:
+        schedule = _SCHEDULES[vs] = Schedule()
+    return schedule
+
+
+def get_next_iteration(current_time, current_iteration, dt, period):
+    """First iteration (starting at ``current_iteration``) whose time step reaches or
+    passes a multiple of ``period``.
+
+    Arguments:
+        current_time: Model time (in seconds) at the end of ``current_iteration``.
+        dt: Length of a time step (in seconds).
+        period: Period of the event (in seconds).
+
+    """
+    previous_time = current_time - dt
+    # first occurrence after the end of the previous time step
+    next_occurrence = (math.floor(previous_time / period + _EPS) + 1) * period
+    return current_iteration + max(math.ceil((next_occurrence - current_time) / dt - _EPS), 0)
+
+
+class _Event:
+    __slots__ = ('period', 'dt', 'start_iteration', 'start_time', 'next_iteration')
+
+    def __init__(self, period, dt, start_iteration, start_time, next_iteration):
+        self.period = period
+        self.dt = dt
+        self.start_iteration = start_iteration
+        self.start_time = start_time
+        self.next_iteration = next_iteration
+
+    def is_valid(self, vs, period):
+        """Whether the precomputed iteration still applies to the current state."""
+        if self.period != period or self.dt != vs.dt_tracer:
+            return False
+
+        if not self.start_iteration <= vs.itt <= self.next_iteration:
+            return False
+
+        # model time was changed from outside (e.g. by reading a restart)
+        expected_time = self.start_time + (vs.itt - self.start_iteration) * self.dt
+        return abs(vs.time - expected_time) < 0.5 * self.dt
+
+
+class Schedule:
+    """Precomputed iterations of recurring events.
+
+    Events are identified by their name, and their period (in seconds, or as understood
+    by :func:`veros.time.parse_period`) is passed whenever they are checked. Changes of
+    the period or the time step are picked up automatically.
+    """
+    def __init__(self):
+        self._events = {}
+
+    def _get_event(self, vs, name, period):
+        period = time.parse_period(period)
+        if period <= 0:
+            self._events.pop(name, None)
+            return None
+
+        event = self._events.get(name)
+        if event is None or not event.is_valid(vs, period):
+            next_iteration = get_next_iteration(vs.time, vs.itt, vs.dt_tracer, period)
+            event = self._events[name] = _Event(period, vs.dt_tracer, vs.itt, vs.time, next_iteration)
+
+        return event
+
+    def is_due(self, vs, name, period):
+        """Whether the event is due in the current iteration.
+
+        Arguments:
+            name: Name of the event, e.g. ``'snapshot:output'``.
+            period: Period of the event. Events with period 0 or None are never due.
+
+        """
+        event = self._get_event(vs, name, period)
+        return event is not None and event.next_iteration == vs.itt
+
+    def get_next_iteration(self, vs, name, period):
+        """Next iteration (starting with the current one) in which the event is due,
+        or None if it is never due."""
+        event = self._get_event(vs, name, period)
+        if event is None:
+            return None
+        return event.next_iteration
+
+    def get_calendar(self, vs, events, duration):
+        """All occurrences of the given events within ``duration``.
+
+        Arguments:
+            events: Mapping of event name to period.
+            duration: Length of the calendar (in seconds, or as understood by
+                :func:`veros.time.parse_period`), starting at the current iteration.
+
+        Returns:
+            List of :class:`ScheduledEvent`, ordered by iteration.
+
+        """
+        last_iteration = vs.itt + int(math.floor(time.parse_period(duration) / vs.dt_tracer + _EPS))
+
+        calendar = []
+        for name, period in events.items():
+            iteration = self.get_next_iteration(vs, name, period)
+            if iteration is None:
+                continue
+
+            period = time.parse_period(period)
+            while iteration <= last_iteration:
+                event_time = vs.time + (iteration - vs.itt) * vs.dt_tracer
+                calendar.append(ScheduledEvent(iteration, event_time, name))
+                iteration = get_next_iteration(event_time + vs.dt_tracer, iteration + 1, vs.dt_tracer, period)
+
+        return sorted(calendar)
@@ -1,5 +1,3 @@
-import os
-
 from loguru import logger
 
 from .. import veros_method, time
@@ -39,7 +37,7 @@ class Snapshot(VerosDiagnostic):
     def output(self, vs):
         logger.info(' Writing snapshot at {0[0]:.2f} {0[1]}', time.format_time(vs.time))
 
-        if not os.path.isfile(self.get_output_file_name(vs)):
+        if not self.output_file_exists(vs):
             self.initialize(vs)
 
         var_meta = {var: vs.variables[var]
@@ -1,3 +1,7 @@
+import functools
+
+from loguru import logger
+
 from . import runtime_settings as rs, runtime_state as rst
 from .decorators import veros_method, dist_context_only
 
@@ -16,8 +20,7 @@ def ascontiguousarray(arr):
     return arr
 
 
-@veros_method(inline=True)
-def get_array_buffer(vs, arr):
+def get_mpi_type(dtype):
     from mpi4py import MPI
 
     MPI_TYPE_MAP = {
@@ -31,6 +34,11 @@ def get_array_buffer(vs, arr):
         'bool': MPI.BOOL,
     }
 
+    return MPI_TYPE_MAP[str(dtype)]
+
+
+@veros_method(inline=True)
+def get_array_buffer(vs, arr):
     if rs.backend == 'bohrium':
         if np.check(arr):
             buf = np.interop_numpy.get_array(arr)
@@ -39,7 +47,52 @@ def get_array_buffer(vs, arr):
     else:
         buf = arr
 
-    return [buf, arr.size, MPI_TYPE_MAP[str(arr.dtype)]]
+    return [buf, arr.size, get_mpi_type(arr.dtype)]
+
+
+def get_subarray_type(global_shape, local_shape, dtype):
+    """Create a committed MPI datatype describing a block of shape ``local_shape`` inside
+    a C-contiguous array of shape ``global_shape``.
+
+    The extent of the type is resized to a single element, so displacements passed to
+    vector collectives are given in elements of the global array.
+    """
+    base_type = get_mpi_type(dtype)
+    subarray_type = base_type.Create_subarray(
+        list(global_shape), list(local_shape), [0] * len(global_shape)
+    )
+    resized_type = subarray_type.Create_resized(0, base_type.Get_extent()[1])
+    resized_type.Commit()
+    subarray_type.Free()
+    return resized_type
+
+
+def get_even_chunk_sizes(num_cells, num_chunks):
+    """Split ``num_cells`` into ``num_chunks`` chunks of (almost) equal size"""
+    base, remainder = divmod(num_cells, num_chunks)
+    return tuple(base + 1 if i < remainder else base for i in range(num_chunks))
+
+
+def get_chunk_sizes(vs):
+    """Returns the sizes of all chunks along the x and y dimension.
+
+    Defaults to an even split if no explicit decomposition has been set via
+    :attr:`VerosState.chunk_sizes`.
+    """
+    chunk_sizes = getattr(vs, 'chunk_sizes', None)
+    if chunk_sizes is None:
+        return (
+            get_even_chunk_sizes(vs.nx, rs.num_proc[0]),
+            get_even_chunk_sizes(vs.ny, rs.num_proc[1])
+        )
+    return chunk_sizes
+
+
+def _get_offsets(sizes):
+    offsets = [0]
+    for size in sizes[:-1]:
+        offsets.append(offsets[-1] + size)
+    return offsets
 
 
 @veros_method
@@ -47,23 +100,57 @@ def validate_decomposition(vs):
     if rs.mpi_comm is None:
         if (rs.num_proc[0] > 1 or rs.num_proc[1] > 1):
             raise RuntimeError('mpi4py is required for distributed execution')
-        return
+    else:
+        comm_size = rs.mpi_comm.Get_size()
+        proc_num = rs.num_proc[0] * rs.num_proc[1] - len(rs.land_tiles)
+        if proc_num != comm_size:
+            raise RuntimeError('number of processes ({}) does not match size of communicator ({})'
+                               .format(proc_num, comm_size))
+
+    for ix, iy in rs.land_tiles:
+        if not (0 <= ix < rs.num_proc[0] and 0 <= iy < rs.num_proc[1]):
+            raise ValueError('land tile ({}, {}) is outside of the decomposition'.format(ix, iy))
 
-    comm_size = rs.mpi_comm.Get_size()
-    proc_num = rs.num_proc[0] * rs.num_proc[1]
-    if proc_num != comm_size:
-        raise RuntimeError('number of processes ({}) does not match size of communicator ({})'
-                           .format(proc_num, comm_size))
+    if vs.chunk_sizes is None:
+        if vs.nx % rs.num_proc[0]:
+            raise ValueError('processes do not divide domain evenly in x-direction '
+                             '(set chunk_sizes explicitly for uneven decompositions)')
 
-    if vs.nx % rs.num_proc[0]:
-        raise ValueError('processes do not divide domain evenly in x-direction')
+        if vs.ny % rs.num_proc[1]:
+            raise ValueError('processes do not divide domain evenly in y-direction '
+                             '(set chunk_sizes explicitly for uneven decompositions)')
 
-    if vs.ny % rs.num_proc[1]:
-        raise ValueError('processes do not divide domain evenly in y-direction')
+    chunks_x, chunks_y = get_chunk_sizes(vs)
 
+    for chunks, num_proc, total, dim in ((chunks_x, rs.num_proc[0], vs.nx, 'x'),
+                                        (chunks_y, rs.num_proc[1], vs.ny, 'y')):
+        if len(chunks) != num_proc:
+            raise ValueError('number of chunks in {}-direction ({}) does not match number of processes ({})'
+                             .format(dim, len(chunks), num_proc))
 
-def get_chunk_size(vs):
-    return (vs.nx // rs.num_proc[0], vs.ny // rs.num_proc[1])
+        if sum(chunks) != total:
+            raise ValueError('chunk sizes in {}-direction do not add up to domain size'.format(dim))
+
+        if num_proc > 1 and min(chunks) < 2:
+            raise ValueError('chunks in {}-direction must be at least 2 cells wide'.format(dim))
+
+    vs.chunk_sizes = (tuple(int(c) for c in chunks_x), tuple(int(c) for c in chunks_y))
+
+
+def get_chunk_size(vs, proc_idx=None):
+    if proc_idx is None:
+        proc_idx = proc_rank_to_index(rst.proc_rank)
+
+    chunks_x, chunks_y = get_chunk_sizes(vs)
+    return (chunks_x[proc_idx[0]], chunks_y[proc_idx[1]])
+
+
+def get_chunk_offset(vs, proc_idx=None):
+    if proc_idx is None:
+        proc_idx = proc_rank_to_index(rst.proc_rank)
+
+    chunks_x, chunks_y = get_chunk_sizes(vs)
+    return (_get_offsets(chunks_x)[proc_idx[0]], _get_offsets(chunks_y)[proc_idx[1]])
 
 
 def get_global_size(vs, arr_shp, dim_grid, include_overlap=False):
@@ -79,24 +166,313 @@ def get_global_size(vs, arr_shp, dim_grid, include_overlap=False):
     return shape
 
 
-def get_local_size(vs, arr_shp, dim_grid, include_overlap=False):
+def get_local_size(vs, arr_shp, dim_grid, include_overlap=False, proc_idx=None):
     ovl = 4 if include_overlap else 0
+    nx, ny = get_chunk_size(vs, proc_idx)
     shape = []
     for s, dim in zip(arr_shp, dim_grid):
         if dim in SCATTERED_DIMENSIONS[0]:
-            shape.append(vs.nx // rs.num_proc[0] + ovl)
+            shape.append(nx + ovl)
         elif dim in SCATTERED_DIMENSIONS[1]:
-            shape.append(vs.ny // rs.num_proc[1] + ovl)
+            shape.append(ny + ovl)
         else:
             shape.append(s)
     return shape
 
 
+def get_storage_chunk_size(vs, arr_shp, dim_grid):
+    """Chunk shape for datasets in shared output files.
+
+    Identical on all processes (as required for collective I/O), and large enough to hold
+    the biggest local chunk.
+    """
+    chunks_x, chunks_y = get_chunk_sizes(vs)
+    shape = []
+    for s, dim in zip(arr_shp, dim_grid):
+        if dim in SCATTERED_DIMENSIONS[0]:
+            shape.append(max(chunks_x))
+        elif dim in SCATTERED_DIMENSIONS[1]:
+            shape.append(max(chunks_y))
+        else:
+            shape.append(s)
+    return shape
+
+
+def _partition_bottleneck(weights, num_parts, bound, min_size):
+    """Greedily split the rows of ``weights`` into ``num_parts`` contiguous parts so that
+    the column sums of no part exceed ``bound``. Returns part sizes, or None if impossible.
+    """
+    num_rows = weights.shape[0]
+    sizes = []
+    start = 0
+    for part in range(num_parts - 1):
+        end = start + min_size
+        load = weights[start:end].sum(axis=0)
+        if (load > bound).any():
+            return None
+
+        max_end = num_rows - min_size * (num_parts - part - 1)
+        while end < max_end and (load + weights[end] <= bound).all():
+            load += weights[end]
+            end += 1
+
+        sizes.append(end - start)
+        start = end
+
+    if (weights[start:].sum(axis=0) > bound).any():
+        return None
+
+    sizes.append(num_rows - start)
+    return sizes
+
+
+def _partition_1d(weights, num_parts, min_size):
+    """Find contiguous part sizes along the first axis of ``weights`` that minimize the
+    maximum column sum of any part (bisection over the bottleneck value).
+    """
+    lower = 0
+    upper = int(weights.sum(axis=0).max())
+    best = _partition_bottleneck(weights, num_parts, upper, min_size)
+
+    while lower < upper:
+        bound = (lower + upper) // 2
+        sizes = _partition_bottleneck(weights, num_parts, bound, min_size)
+        if sizes is None:
+            lower = bound + 1
+        else:
+            upper = bound
+            best = sizes
+
+    return tuple(best)
+
+
+def get_balanced_chunk_sizes(cell_weights, num_proc, min_size=2, max_iterations=10):
+    """Computes a rectilinear domain decomposition that balances the total weight per chunk.
+
+    Arguments:
+        cell_weights: Array of shape (nx, ny) containing the cost of each water column
+            (e.g. the number of wet cells). Must not contain ghost cells.
+        num_proc: Number of processes in x and y direction.
+        min_size: Minimum chunk width in grid cells.
+        max_iterations: Maximum number of alternating refinement sweeps.
+
+    Returns:
+        Tuple of chunk sizes along x and y, e.g. ``((10, 14, 16), (20, 20))``.
+
+    Example:
+        >>> wet_cells = np.where(kbot > 0, nz - kbot + 1, 0)
+        >>> get_balanced_chunk_sizes(wet_cells, (4, 2))
+
+    """
+    import numpy
+
+    cell_weights = numpy.asarray(cell_weights, dtype='int64')
+    nx, ny = cell_weights.shape
+
+    chunks_x = get_even_chunk_sizes(nx, num_proc[0])
+    chunks_y = get_even_chunk_sizes(ny, num_proc[1])
+
+    def get_max_load(chunks_x, chunks_y):
+        loads = numpy.add.reduceat(
+            numpy.add.reduceat(cell_weights, _get_offsets(chunks_x), axis=0),
+            _get_offsets(chunks_y), axis=1
+        )
+        return loads.max()
+
+    best_load = get_max_load(chunks_x, chunks_y)
+
+    for _ in range(max_iterations):
+        # weights of each column per y-stripe, then of each row per x-stripe
+        stripe_weights = numpy.add.reduceat(cell_weights, _get_offsets(chunks_y), axis=1)
+        new_chunks_x = _partition_1d(stripe_weights, num_proc[0], min_size)
+
+        stripe_weights = numpy.add.reduceat(cell_weights, _get_offsets(new_chunks_x), axis=0)
+        new_chunks_y = _partition_1d(stripe_weights.T, num_proc[1], min_size)
+
+        new_load = get_max_load(new_chunks_x, new_chunks_y)
+        if new_load >= best_load:
+            break
+
+        chunks_x, chunks_y, best_load = new_chunks_x, new_chunks_y, new_load
+
+    return chunks_x, chunks_y
+
+
+def get_land_tiles(cell_weights, chunk_sizes):
+    """Returns the indices of all tiles that do not contain any wet cells.
+
+    One tile per row and column of tiles is always kept, so that quantities that only
+    depend on x or y remain available on some process.
+
+    Arguments:
+        cell_weights: Array of shape (nx, ny) containing the number of wet cells in each
+            water column. Must not contain ghost cells.
+        chunk_sizes: Chunk sizes along x and y (as returned by :func:`get_chunk_sizes`).
+
+    """
+    import numpy
+
+    loads = numpy.add.reduceat(
+        numpy.add.reduceat(numpy.asarray(cell_weights), _get_offsets(chunk_sizes[0]), axis=0),
+        _get_offsets(chunk_sizes[1]), axis=1
+    )
+    is_land = loads == 0
+
+    for ix in range(is_land.shape[0]):
+        if is_land[ix, :].all():
+            is_land[ix, 0] = False
+
+    for iy in range(is_land.shape[1]):
+        if is_land[:, iy].all():
+            is_land[0, iy] = False
+
+    return tuple((int(ix), int(iy)) for ix, iy in zip(*numpy.nonzero(is_land)))
+
+
+def get_auxiliary_num_proc(vs):
+    """Number of processes in x and y direction for a decomposition without land tiles
+    that uses all available processes (as needed to find the land tiles in the first place).
+    """
+    candidates = [
+        (px, rst.proc_num // px) for px in range(1, rst.proc_num + 1)
+        if rst.proc_num % px == 0
+        and vs.nx >= 2 * px and vs.ny >= 2 * (rst.proc_num // px)
+    ]
+
+    if not candidates:
+        raise ValueError('domain is too small to be decomposed into {} chunks'.format(rst.proc_num))
+
+    # minimize the length of chunk boundaries
+    return min(candidates, key=lambda num_proc: vs.nx / num_proc[0] + vs.ny / num_proc[1])
+
+
+@veros_method
+def gather_wet_cells(vs):
+    """Number of wet cells in each water column (according to :attr:`kbot`), without ghost cells.
+
+    Only available on the main process (``None`` elsewhere).
+    """
+    if rst.proc_num > 1:
+        kbot_global = gather(vs, vs.kbot, ('xt', 'yt'))
+    else:
+        kbot_global = vs.kbot
+
+    if rst.proc_rank != 0:
+        return None
+
+    kbot_global = kbot_global[2:-2, 2:-2]
+    try:
+        kbot_global = kbot_global.copy2numpy()
+    except AttributeError:
+        pass
+
+    return (vs.nz - kbot_global + 1) * (kbot_global > 0)
+
+
+@veros_method
+def balance_decomposition(vs, wet_cells):
+    """Chooses chunk sizes that balance the number of wet cells across all processes.
+
+    Arguments:
+        wet_cells: Number of wet cells per water column on the main process (as returned by
+            :func:`gather_wet_cells`).
+
+    Returns:
+        ``True`` if the decomposition has changed (in which case all variables need to be
+        re-allocated), ``False`` otherwise.
+    """
+    if rs.num_proc[0] * rs.num_proc[1] == 1:
+        return False
+
+    if rst.proc_rank == 0:
+        chunk_sizes = get_balanced_chunk_sizes(wet_cells, rs.num_proc)
+    else:
+        chunk_sizes = None
+
+    chunk_sizes = broadcast(vs, chunk_sizes)
+
+    if tuple(chunk_sizes) == tuple(get_chunk_sizes(vs)):
+        return False
+
+    vs.chunk_sizes = chunk_sizes
+
+    # gathered copies refer to the old decomposition
+    from .state_dist import clear_gather_cache
+    clear_gather_cache(vs)
+
+    return True
+
+
+@veros_method
+def eliminate_land_tiles(vs, wet_cells):
+    """Removes all tiles without wet cells from the decomposition (see :func:`get_land_tiles`).
+
+    Land tiles are not assigned to any process, so the run has to be started on fewer
+    processes than given by ``num_proc``. Neighbors of land tiles treat them like a closed
+    boundary. If the number of processes matches the full decomposition instead, all tiles
+    are kept.
+
+    Arguments:
+        wet_cells: Number of wet cells per water column on the main process (as returned by
+            :func:`gather_wet_cells`).
+    """
+    if rst.proc_rank == 0:
+        land_tiles = get_land_tiles(wet_cells, get_chunk_sizes(vs))
+    else:
+        land_tiles = None
+
+    land_tiles = broadcast(vs, land_tiles)
+
+    num_tiles = rs.num_proc[0] * rs.num_proc[1]
+    num_active = num_tiles - len(land_tiles)
+
+    if rst.proc_num == num_active:
+        rs.land_tiles = land_tiles
+        if land_tiles:
+            logger.info(' Eliminated {} land tiles from decomposition', len(land_tiles))
+    elif rst.proc_num == num_tiles:
+        rs.land_tiles = ()
+        if land_tiles:
+            logger.warning(
+                '{} of {} tiles contain only land; this setup can run on {} processes instead',
+                len(land_tiles), num_tiles, num_active
+            )
+    else:
+        raise RuntimeError(
+            'decomposition into {} tiles with {} land tiles requires {} processes (got {})'
+            .format(num_tiles, len(land_tiles), num_active, rst.proc_num)
+        )
+
+
+@functools.lru_cache(maxsize=4)
+def _get_tile_ranks(num_proc, land_tiles):
+    land_tiles = set(land_tiles)
+    active_tiles = tuple(
+        (ix, iy)
+        for iy in range(num_proc[1])
+        for ix in range(num_proc[0])
+        if (ix, iy) not in land_tiles
+    )
+    return active_tiles, {tile: rank for rank, tile in enumerate(active_tiles)}
+
+
+def get_active_tiles():
+    """Returns the indices of all tiles that are assigned to a process, in order of rank"""
+    return list(_get_tile_ranks(rs.num_proc, rs.land_tiles)[0])
+
+
 def proc_rank_to_index(rank):
+    if rs.land_tiles:
+        return _get_tile_ranks(rs.num_proc, rs.land_tiles)[0][rank]
+
     return (rank % rs.num_proc[0], rank // rs.num_proc[0])
 
 
 def proc_index_to_rank(ix, iy):
+    """Returns the rank of the process owning the given tile, or None if it is a land tile"""
+    if rs.land_tiles:
+        return _get_tile_ranks(rs.num_proc, rs.land_tiles)[1].get((ix, iy))
+
     return ix + iy * rs.num_proc[0]
 
 
@@ -105,7 +481,8 @@ def get_chunk_slices(vs, dim_grid, proc_idx=None, include_overlap=False):
         proc_idx = proc_rank_to_index(rst.proc_rank)
 
     px, py = proc_idx
-    nx, ny = get_chunk_size(vs)
+    nx, ny = get_chunk_size(vs, proc_idx)
+    ox, oy = get_chunk_offset(vs, proc_idx)
 
     if include_overlap:
         sxl = 0 if px == 0 else 2
@@ -121,10 +498,10 @@ def get_chunk_slices(vs, dim_grid, proc_idx=None, include_overlap=False):
 
     for dim in dim_grid:
         if dim in SCATTERED_DIMENSIONS[0]:
-            global_slice.append(slice(sxl + px * nx, sxu + px * nx))
+            global_slice.append(slice(sxl + ox, sxu + ox))
             local_slice.append(slice(sxl, sxu))
         elif dim in SCATTERED_DIMENSIONS[1]:
-            global_slice.append(slice(syl + py * ny, syu + py * ny))
+            global_slice.append(slice(syl + oy, syu + oy))
             local_slice.append(slice(syl, syu))
         else:
             global_slice.append(slice(None))
@@ -154,6 +531,7 @@ def get_process_neighbors(vs):
         (west, north),
     ]
 
+    # land tiles have no process, and are thus skipped like domain boundaries
     global_neighbors = [
         proc_index_to_rank(*i) if None not in i else None for i in neighbors
     ]
@@ -268,6 +646,10 @@ def exchange_cyclic_boundaries(vs, arr):
         send_idx = (slice(-4, -2), Ellipsis)
         recv_idx = (slice(-2, None), Ellipsis)
 
+    if other_proc is None:
+        # land tile, treated as closed boundary
+        return
+
     recv_arr = np.empty_like(arr[recv_idx])
     send_arr = ascontiguousarray(arr[send_idx])
 
@@ -279,42 +661,56 @@ def exchange_cyclic_boundaries(vs, arr):
     arr[recv_idx] = recv_arr
 
 
+# communicators of all processes in the same row (axis 0) or column (axis 1) of tiles
+_AXIS_COMMS = {}
+
+
+def get_axis_comm(axis):
+    """Communicator of all processes whose tiles are next to each other along ``axis``.
+
+    Splitting a communicator is a (slow) collective operation, so communicators are
+    created once and re-used until the decomposition or the global communicator changes.
+    """
+    assert axis in (0, 1)
+    decomposition = (rs.mpi_comm, rs.num_proc, tuple(rs.land_tiles or ()), rst.proc_rank)
+
+    cached = _AXIS_COMMS.get(axis)
+    if cached is not None and cached[0] == decomposition:
+        return cached[1]
+
+    pi = proc_rank_to_index(rst.proc_rank)
+    comm = rs.mpi_comm.Split(pi[1 - axis], rst.proc_rank)
+    _AXIS_COMMS[axis] = (decomposition, comm)
+    return comm
+
+
 @dist_context_only
 @veros_method(inline=True)
 def _reduce(vs, arr, op, axis=None):
     if axis is None:
         comm = rs.mpi_comm
-        disconnect_comm = False
     else:
-        assert axis in (0, 1)
-        pi = proc_rank_to_index(rst.proc_rank)
-        other_axis = 1 - axis
-        comm = rs.mpi_comm.Split(pi[other_axis], rst.proc_rank)
-        disconnect_comm = True
+        comm = get_axis_comm(axis)
 
-    try:
-        if np.isscalar(arr):
-            squeeze = True
-            arr = np.array([arr])
-        else:
-            squeeze = False
+    if np.isscalar(arr):
+        squeeze = True
+        arr = np.array([arr])
+    else:
+        squeeze = False
 
-        arr = ascontiguousarray(arr)
-        res = np.empty_like(arr)
+    arr = ascontiguousarray(arr)
+    res = np.empty_like(arr)
 
-        comm.Allreduce(
-            get_array_buffer(vs, arr),
-            get_array_buffer(vs, res),
-            op=op
-        )
+    comm.Allreduce(
+        get_array_buffer(vs, arr),
+        get_array_buffer(vs, res),
+        op=op
+    )
 
-        if squeeze:
-            res = res[0]
+    if squeeze:
+        res = res[0]
 
-        return res
-    finally:
-        if disconnect_comm:
-            comm.Disconnect()
+    return res
 
 
 @dist_context_only
@@ -352,80 +748,108 @@ def global_sum(vs, arr, axis=None):
     return _reduce(vs, arr, MPI.SUM, axis=axis)
 
 
-@dist_context_only
-@veros_method(inline=True)
-def _gather_1d(vs, arr, dim):
-    assert dim in (0, 1)
+def _get_offset(global_shape, index):
+    """Flat offset (in elements) of ``index`` in a C-contiguous array of shape ``global_shape``"""
+    offset = 0
+    for size, idx in zip(global_shape, index):
+        offset = offset * size + idx
+    return offset
 
-    otherdim = 1 - dim
-    pi = proc_rank_to_index(rst.proc_rank)
-    if pi[otherdim] != 0:
-        return arr
 
-    dim_grid = ['xt' if dim == 0 else 'yt'] + [None] * (arr.ndim - 1)
-    gidx, idx = get_chunk_slices(vs, dim_grid, include_overlap=True)
-    sendbuf = ascontiguousarray(arr[idx])
+def _get_local_block_shape(vs, arr_shp, dim_grid, proc):
+    return tuple(get_local_size(vs, arr_shp, dim_grid, include_overlap=True,
+                                proc_idx=proc_rank_to_index(proc)))
+
+
+def _prod(shape):
+    size = 1
+    for s in shape:
+        size *= s
+    return size
 
-    if rst.proc_rank == 0:
-        buffer_list = []
-        for proc in range(1, rst.proc_num):
-            pi = proc_rank_to_index(proc)
-            if pi[otherdim] != 0:
-                continue
-            idx_g, idx_l = get_chunk_slices(vs, dim_grid, include_overlap=True, proc_idx=pi)
-            recvbuf = np.empty_like(arr[idx_l])
-            future = rs.mpi_comm.Irecv(get_array_buffer(vs, recvbuf), source=proc, tag=20)
-            buffer_list.append((future, idx_g, recvbuf))
-
-        out_shape = ((vs.nx + 4, vs.ny + 4)[dim],) + arr.shape[1:]
-        out = np.empty(out_shape, dtype=arr.dtype)
-        out[gidx] = sendbuf
 
-        for future, idx, val in buffer_list:
-            future.wait()
-            out[idx] = val
+@dist_context_only
+@veros_method(inline=True)
+def _gather_blocks(vs, arr, dim_grid, participating_ranks):
+    """Collect the full local arrays (including overlap) of all participating ranks
+    on rank 0 with a single collective, and assemble them into the global array there.
+    """
+    sendbuf = np.ascontiguousarray(arr)
 
-        return out
+    if rst.proc_rank == 0:
+        block_shapes = {
+            proc: _get_local_block_shape(vs, arr.shape, dim_grid, proc)
+            for proc in participating_ranks
+        }
+        counts, displs = [], []
+        offset = 0
+        for proc in range(rst.proc_num):
+            displs.append(offset)
+            if proc in block_shapes:
+                counts.append(_prod(block_shapes[proc]))
+                offset += counts[-1]
+            else:
+                counts.append(0)
+        recvbuf = np.empty(offset, dtype=arr.dtype)
+        recv_spec = [get_array_buffer(vs, recvbuf)[0], counts, displs, get_mpi_type(arr.dtype)]
+    else:
+        recv_spec = None
 
+    if rst.proc_rank in participating_ranks:
+        send_spec = get_array_buffer(vs, sendbuf)
     else:
-        rs.mpi_comm.Send(get_array_buffer(vs, sendbuf), dest=0, tag=20)
+        send_spec = [get_array_buffer(vs, sendbuf)[0], 0, get_mpi_type(arr.dtype)]
+
+    rs.mpi_comm.Gatherv(send_spec, recv_spec, root=0)
+
+    if rst.proc_rank != 0:
         return arr
 
+    out_shape = tuple(get_global_size(vs, arr.shape, dim_grid, include_overlap=True))
+    if rs.land_tiles:
+        # parts of the domain are not covered by any process
+        out = np.zeros(out_shape, dtype=arr.dtype)
+    else:
+        out = np.empty(out_shape, dtype=arr.dtype)
+
+    for proc in participating_ranks:
+        idx_g, idx_l = get_chunk_slices(
+            vs, dim_grid, include_overlap=True, proc_idx=proc_rank_to_index(proc)
+        )
+        block = recvbuf[displs[proc]:displs[proc] + counts[proc]].reshape(block_shapes[proc])
+        out[idx_g] = block[idx_l]
+
+    return out
+
 
 @dist_context_only
 @veros_method(inline=True)
-def _gather_xy(vs, arr):
-    nxi, nyi = get_chunk_size(vs)
-    assert arr.shape[:2] == (nxi + 4, nyi + 4), arr.shape
+def _gather_1d(vs, arr, dim):
+    assert dim in (0, 1)
 
-    dim_grid = ['xt', 'yt'] + [None] * (arr.ndim - 2)
-    gidx, idx = get_chunk_slices(vs, dim_grid, include_overlap=True)
-    sendbuf = ascontiguousarray(arr[idx])
+    dim_grid = ['xt' if dim == 0 else 'yt'] + [None] * (arr.ndim - 1)
 
-    if rst.proc_rank == 0:
-        buffer_list = []
-        for proc in range(1, rst.proc_num):
-            idx_g, idx_l = get_chunk_slices(
-                vs, dim_grid, include_overlap=True,
-                proc_idx=proc_rank_to_index(proc)
-            )
-            recvbuf = np.empty_like(arr[idx_l])
-            future = rs.mpi_comm.Irecv(get_array_buffer(vs, recvbuf), source=proc, tag=30)
-            buffer_list.append((future, idx_g, recvbuf))
+    # one process per chunk along dim (the first one, which is not necessarily at
+    # index 0 along the other dimension if there are land tiles)
+    participating_ranks = []
+    covered_chunks = set()
+    for proc in range(rst.proc_num):
+        chunk_idx = proc_rank_to_index(proc)[dim]
+        if chunk_idx not in covered_chunks:
+            covered_chunks.add(chunk_idx)
+            participating_ranks.append(proc)
 
-        out_shape = (vs.nx + 4, vs.ny + 4) + arr.shape[2:]
-        out = np.empty(out_shape, dtype=arr.dtype)
-        out[gidx] = sendbuf
+    return _gather_blocks(vs, arr, dim_grid, participating_ranks)
 
-        for future, idx, val in buffer_list:
-            future.wait()
-            out[idx] = val
 
-        return out
-    else:
-        rs.mpi_comm.Send(get_array_buffer(vs, sendbuf), dest=0, tag=30)
+@dist_context_only
+@veros_method(inline=True)
+def _gather_xy(vs, arr):
+    nxi, nyi = get_chunk_size(vs)
+    assert arr.shape[:2] == (nxi + 4, nyi + 4), arr.shape
 
-    return arr
+    dim_grid = ['xt', 'yt'] + [None] * (arr.ndim - 2)
+    return _gather_blocks(vs, arr, dim_grid, list(range(rst.proc_num)))
 
 
 @dist_context_only
@@ -472,32 +896,68 @@ def _scatter_constant(vs, arr):
 
 @dist_context_only
 @veros_method(inline=True)
-def _scatter_1d(vs, arr, dim):
-    assert dim in (0, 1)
+def _scatter_blocks(vs, arr, dim_grid, local_shape):
+    """Distribute the full local arrays (including overlap) from the global array on rank 0
+    with a single collective.
 
-    nx = get_chunk_size(vs)[dim]
-    dim_grid = ['xt' if dim == 0 else 'yt'] + [None] * (arr.ndim - 1)
-    _, local_slice = get_chunk_slices(vs, dim_grid, include_overlap=True)
+    If all local blocks have the same shape, they are cut directly out of the global array
+    through a subarray datatype, so no packing is required on rank 0. Otherwise, the blocks
+    are packed into a contiguous buffer first. No overlap exchange is needed afterwards.
+    """
+    recvbuf = np.empty(local_shape, dtype=arr.dtype)
+    block_type = None
 
     if rst.proc_rank == 0:
-        recvbuf = arr[local_slice]
+        sendbuf = np.ascontiguousarray(arr)
+        block_shapes = [
+            _get_local_block_shape(vs, sendbuf.shape, dim_grid, proc)
+            for proc in range(rst.proc_num)
+        ]
+        block_slices = [
+            tuple(
+                slice(s.start or 0, (s.start or 0) + n) if s.start is not None else slice(None)
+                for s, n in zip(
+                    get_chunk_slices(vs, dim_grid, proc_idx=proc_rank_to_index(proc))[0],
+                    block_shape
+                )
+            )
+            for proc, block_shape in enumerate(block_shapes)
+        ]
+
+        if all(shape == block_shapes[0] for shape in block_shapes):
+            block_type = get_subarray_type(sendbuf.shape, block_shapes[0], sendbuf.dtype)
+            displs = [
+                _get_offset(sendbuf.shape, [s.start or 0 for s in block_slice])
+                for block_slice in block_slices
+            ]
+            send_spec = [get_array_buffer(vs, sendbuf)[0], [1] * rst.proc_num, displs, block_type]
+        else:
+            counts = [_prod(shape) for shape in block_shapes]
+            displs = _get_offsets(counts)
+            packed = np.empty(sum(counts), dtype=arr.dtype)
+            for block_slice, count, displ in zip(block_slices, counts, displs):
+                packed[displ:displ + count] = sendbuf[block_slice].reshape(-1)
+            send_spec = [get_array_buffer(vs, packed)[0], counts, displs, get_mpi_type(arr.dtype)]
+    else:
+        send_spec = None
 
-        for proc in range(1, rst.proc_num):
-            global_slice, _ = get_chunk_slices(vs, dim_grid, include_overlap=True, proc_idx=proc_rank_to_index(proc))
-            sendbuf = ascontiguousarray(arr[global_slice])
-            rs.mpi_comm.Send(get_array_buffer(vs, sendbuf), dest=proc, tag=40)
+    try:
+        rs.mpi_comm.Scatterv(send_spec, get_array_buffer(vs, recvbuf), root=0)
+    finally:
+        if block_type is not None:
+            block_type.Free()
 
-        # arr changes shape in main process
-        arr = np.zeros((nx + 4,) + arr.shape[1:], dtype=arr.dtype)
-    else:
-        recvbuf = np.empty_like(arr[local_slice])
-        rs.mpi_comm.Recv(get_array_buffer(vs, recvbuf), source=0, tag=40)
+    return recvbuf
 
-    arr[local_slice] = recvbuf
 
-    exchange_overlap(vs, arr, ['xt' if dim == 0 else 'yt'])
+@dist_context_only
+@veros_method(inline=True)
+def _scatter_1d(vs, arr, dim):
+    assert dim in (0, 1)
 
-    return arr
+    nx = get_chunk_size(vs)[dim]
+    dim_grid = ['xt' if dim == 0 else 'yt'] + [None] * (arr.ndim - 1)
+    return _scatter_blocks(vs, arr, dim_grid, (nx + 4,) + arr.shape[1:])
 
 
 @dist_context_only
@@ -506,27 +966,7 @@ def _scatter_xy(vs, arr):
     nxi, nyi = get_chunk_size(vs)
 
     dim_grid = ['xt', 'yt'] + [None] * (arr.ndim - 2)
-    _, local_slice = get_chunk_slices(vs, dim_grid, include_overlap=True)
-
-    if rst.proc_rank == 0:
-        recvbuf = arr[local_slice]
-
-        for proc in range(1, rst.proc_num):
-            global_slice, _ = get_chunk_slices(vs, dim_grid, include_overlap=True, proc_idx=proc_rank_to_index(proc))
-            sendbuf = ascontiguousarray(arr[global_slice])
-            rs.mpi_comm.Send(get_array_buffer(vs, sendbuf), dest=proc, tag=50)
-
-        # arr changes shape in main process
-        arr = np.empty((nxi + 4, nyi + 4) + arr.shape[2:], dtype=arr.dtype)
-    else:
-        recvbuf = np.empty_like(arr[local_slice])
-        rs.mpi_comm.Recv(get_array_buffer(vs, recvbuf), source=0, tag=50)
-
-    arr[local_slice] = recvbuf
-
-    exchange_overlap(vs, arr, ['xt', 'yt'])
-
-    return arr
+    return _scatter_blocks(vs, arr, dim_grid, (nxi + 4, nyi + 4) + arr.shape[2:])
 
 
 @dist_context_only
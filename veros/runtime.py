@@ -14,6 +14,10 @@ def twoints(v):
     return (int(v[0]), int(v[1]))
 
 
+def tiles(v):
+    return tuple(sorted(twoints(tile) for tile in v))
+
+
 def loglevel(v):
     loglevels = ('trace', 'debug', 'info', 'warning', 'error')
     if v not in loglevels:
@@ -33,6 +37,9 @@ AVAILABLE_SETTINGS = (
     ('backend', str, os.environ.get('VEROS_BACKEND', 'numpy')),
     ('linear_solver', str, os.environ.get('VEROS_LINEAR_SOLVER', 'best')),
     ('num_proc', twoints, (1, 1)),
+    ('land_tiles', tiles, ()),
+    ('num_threads', int, os.environ.get('VEROS_NUM_THREADS', 1)),
+    ('num_io_procs', int, os.environ.get('VEROS_NUM_IO_PROCS', 0)),
     ('profile_mode', parse_bool, os.environ.get('VEROS_PROFILE_MODE', '')),
     ('loglevel', loglevel, os.environ.get('VEROS_LOGLEVEL', 'info')),
     ('mpi_comm', None, _default_mpi_comm()),
@@ -46,6 +53,9 @@ class RuntimeSettings:
         self.__setting_types__ = {}
 
         for setting, typ, default in AVAILABLE_SETTINGS:
+            # defaults may be read from environment variables
+            if typ is not None:
+                default = typ(default)
             setattr(self, setting, default)
             self.__setting_types__[setting] = typ
 
@@ -102,6 +112,11 @@ class RuntimeState:
 
         return comm.Get_size()
 
+    @property
+    def is_io_proc(self):
+        from .diagnostics.io_tools import io_server
+        return io_server.is_io_proc()
+
     @property
     def proc_idx(self):
         from . import distributed
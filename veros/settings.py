@@ -1,5 +1,7 @@
 from collections import namedtuple, OrderedDict
 
+from .time import parse_period
+
 Setting = namedtuple('setting', ('default', 'type', 'description'))
 
 SETTINGS = OrderedDict([
@@ -120,13 +122,29 @@ SETTINGS = OrderedDict([
     ('Prandtl_tke0', Setting(10., float, 'Constant Prandtl number when stratification is neglected for kappaH computation in TKE routine')),
     ('use_io_threads', Setting(False, bool, 'Start extra threads for disk writes')),
     ('io_timeout', Setting(20, float, 'Timeout in seconds while waiting for IO locks to be released')),
+    ('output_backend', Setting('netcdf', str, 'File format of diagnostic output. Either "netcdf" (one HDF5-based netCDF4 file per diagnostic) or "zarr" (one Zarr directory store per diagnostic, written by all processes independently; requires the zarr package).')),
+    ('enable_async_output', Setting(False, bool, 'Write diagnostic output and restart files in a background thread. Output data is copied and queued, so the simulation only waits for the disk if too many writes are pending.')),
+    ('io_queue_size', Setting(2, int, 'Maximum number of pending output writes if enable_async_output is set (the default of 2 amounts to double buffering).')),
+    ('keep_output_files_open', Setting(False, bool, 'Keep output files open between writes instead of re-opening them for every output step. All files are closed at the end of the run. Other programs may not be able to read open files before they are flushed.')),
+    ('output_flush_frequency', Setting(1, int, 'Number of writes after which open output files are flushed to disk if keep_output_files_open is set.')),
     ('enable_hdf5_gzip_compression', Setting(True, bool, 'Use h5py\'s native gzip interface, which leads to smaller restart files (but carries some computational overhead).')),
+    ('enable_restart_memmap', Setting(False, bool, 'Write restart data contiguous and uncompressed (ignoring enable_hdf5_gzip_compression), and read it through memory maps. This speeds up reading restart files and reduces peak memory consumption, especially for large single-process runs.')),
+    ('output_compression', Setting('gzip', str, 'Compression codec for diagnostic output, one of "none", "gzip", "lzf", "blosc" (Blosc with Zstandard), or "zstd". Zarr output does not support "lzf". For netCDF output, "blosc" and "zstd" require the hdf5plugin package, and files compressed with anything but gzip can only be read through HDF5 libraries with the corresponding filter. Only used if enable_hdf5_gzip_compression is set.')),
+    ('output_compression_level', Setting(1, int, 'Compression level of diagnostic output (ignored by lzf).')),
+    ('output_shuffle', Setting(False, bool, 'Apply the byte shuffle filter to diagnostic output before compressing, which usually leads to much smaller files.')),
+    ('output_significant_digits', Setting(0, int, 'Lossy compression: round floating point output to this many significant decimal digits before compressing it (0 to disable).')),
+    ('enable_per_process_output', Setting(False, bool, 'In distributed runs, let every process write compressed output and restart files of its own (with the process rank appended to the file name) instead of shared files, which are uncompressed with HDF5 versions before 1.10.2. Use "veros merge-output" to reassemble them. Restarts from such files are merged automatically. Has no effect with dedicated I/O processes, which always compress, or on Zarr output.')),
+    ('restart_static_filename', Setting('', str, 'File name of static restart data. If given, the first restart file of a run is also written to this file, and later restart files only contain data that changed since then, with links to the static file for everything else. Existing static files are re-used, but never modified. The static file must be kept next to all restart files that refer to it. May contain Python format syntax that is substituted with Veros attributes.')),
     ('restart_input_filename', Setting('', str, 'File name of restart input. If not given, no restart data will be read.')),
+    ('enable_strict_restart_validation', Setting(False, bool, 'Abort if the restart input does not match the current setup (different grid or topography, missing variables or attributes, or mismatching shapes), instead of skipping data that does not match. Restart files are validated from their metadata before any data is read.')),
     ('restart_output_filename', Setting('{identifier}_{itt:0>4d}.restart.h5', str, 'File name of restart output. May contain Python format syntax that is substituted with Veros attributes.')),
-    ('restart_frequency', Setting(0, float, 'Frequency (in seconds) to write restart data')),
+    ('restart_frequency', Setting(0, parse_period, 'Frequency (in seconds, or as a period like ``"1 month"``) to write restart data')),
     ('force_overwrite', Setting(False, bool, 'Overwrite existing output files')),
     ('pyom_compatibility_mode', Setting(False, bool, 'Force compatibility to pyOM2 (even reproducing bugs and other quirks). For testing purposes only.')),
     ('diskless_mode', Setting(False, bool, 'Suppress all output to disk. Mainly used for testing purposes.')),
+    ('sanity_check_interval', Setting(1, int, 'Number of iterations between checks whether the solution diverged (0 to disable). Divergence is detected at most this many iterations after it occurred, and the solution is always checked before diagnostics are sampled or written.')),
+    ('enable_load_balanced_decomposition', Setting(False, bool, 'Choose uneven chunk sizes for distributed runs so that every process holds roughly the same number of wet cells (according to the topography set in set_topography).')),
+    ('enable_land_tile_elimination', Setting(False, bool, 'Do not assign processes to chunks that contain only land in distributed runs. Requires starting Veros on fewer processes than given by num_proc.')),
     ('default_float_type', Setting('float64', str, 'Default type to use for floating point arrays (e.g. ``float32`` or ``float64``).')),
 ])
 
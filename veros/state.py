@@ -24,6 +24,7 @@ class VerosState(VerosStateBase):
         self.diagnostics = {}
         self.poisson_solver = None
         self.nisle = 0 # to be overriden during streamfunction_init
+        self.chunk_sizes = None # to be overriden in validate_decomposition
         self.taum1, self.tau, self.taup1 = 0, 1, 2 # pointers to last, current, and next time step
         self.time, self.itt = 0., 0 # current time and iteration
 
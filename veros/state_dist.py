@@ -1,37 +1,114 @@
+import weakref
+import zlib
+
 from loguru import logger
 
 from .state import VerosStateBase
 
+#: Gathered copies of time-invariant variables, per parent state
+_GATHER_CACHE = weakref.WeakKeyDictionary()
+
+
+def clear_gather_cache(vs):
+    """Drop all cached copies of gathered variables of the given state"""
+    _GATHER_CACHE.pop(vs, None)
+
+
+def _checksum(arr):
+    import numpy
+
+    try:
+        arr = arr.copy2numpy()
+    except AttributeError:
+        pass
+
+    return zlib.crc32(memoryview(numpy.ascontiguousarray(arr)).cast('B'))
+
 
 class DistributedVerosState(VerosStateBase):
     """A proxy wrapper to temporarily synchronize a distributed state.
 
     Use `gather_arrays` to retrieve distributed variables from parent VerosState object,
     and `scatter_arrays` to sync changes back.
+
+    Variables retrieved as read-only are never scattered back. Gathered copies of read-only,
+    time-invariant variables are cached and re-used as long as none of their local chunks
+    has changed since.
     """
     def __init__(self, parent_state):
         object.__setattr__(self, '_vs', parent_state)
         object.__setattr__(self, '_gathered', set())
+        object.__setattr__(self, '_read_only', set())
+
+    def _get_cache(self):
+        try:
+            return _GATHER_CACHE[self._vs]
+        except KeyError:
+            cache = _GATHER_CACHE[self._vs] = {}
+            return cache
+
+    def _is_cacheable(self, arr):
+        return not self._vs.variables[arr].time_dependent
 
-    def gather_arrays(self, arrays):
+    def gather_arrays(self, arrays, read_only=()):
         """Gather given variables from parent state object"""
-        from .distributed import gather
-        for arr in arrays:
-            if not hasattr(self._vs, arr):
-                continue
-            self._gathered.add(arr)
-            logger.trace(' Gathering {}', arr)
-            gathered_arr = gather(
-                self._vs,
-                getattr(self._vs, arr),
-                self._vs.variables[arr].dims
+        from .distributed import gather, global_and
+
+        arrays = [arr for arr in arrays if hasattr(self._vs, arr)]
+        read_only = [arr for arr in read_only if hasattr(self._vs, arr) and arr not in arrays]
+
+        cache = self._get_cache()
+        checksums = {}
+        for arr in read_only:
+            if self._is_cacheable(arr):
+                checksums[arr] = _checksum(getattr(self._vs, arr))
+
+        # a single reduction decides which cached copies are still valid on all processes
+        cached = [arr for arr in checksums if arr in cache]
+        if cached:
+            import numpy
+            is_valid = global_and(
+                self._vs, numpy.array([cache[arr][0] == checksums[arr] for arr in cached])
             )
-            setattr(self, arr, gathered_arr)
+        else:
+            is_valid = []
+
+        valid_cache = {arr for arr, valid in zip(cached, is_valid) if valid}
+
+        for arr in arrays + read_only:
+            self._gathered.add(arr)
+
+            if arr in valid_cache:
+                logger.trace(' Using cached copy of {}', arr)
+                gathered_arr = cache[arr][1]
+            else:
+                logger.trace(' Gathering {}', arr)
+                gathered_arr = gather(
+                    self._vs,
+                    getattr(self._vs, arr),
+                    self._vs.variables[arr].dims
+                )
+
+            if arr in read_only:
+                self._read_only.add(arr)
+                if gathered_arr is not getattr(self._vs, arr):
+                    # guard against accidental writes, which would not be scattered back
+                    try:
+                        gathered_arr.flags.writeable = False
+                    except AttributeError:
+                        pass
+
+                if arr in checksums:
+                    cache[arr] = (checksums[arr], gathered_arr)
+
+            object.__setattr__(self, arr, gathered_arr)
 
     def scatter_arrays(self):
         """Sync all changes with parent state object"""
         from .distributed import scatter
-        for arr in sorted(self._gathered):
+
+        cache = self._get_cache()
+        for arr in sorted(self._gathered - self._read_only):
             if not hasattr(self._vs, arr):
                 continue
             logger.trace(' Scattering {}', arr)
@@ -40,9 +117,11 @@ class DistributedVerosState(VerosStateBase):
                 getattr(self, arr),
                 self._vs.variables[arr].dims
             )
+            cache.pop(arr, None)
 
     def __getattribute__(self, attr):
-        if attr in ('_vs', '_gathered', 'gather_arrays', 'scatter_arrays'):
+        if attr in ('_vs', '_gathered', '_read_only', '_get_cache', '_is_cacheable',
+                    'gather_arrays', 'scatter_arrays'):
             return object.__getattribute__(self, attr)
 
         gathered = self._gathered
@@ -57,6 +136,9 @@ class DistributedVerosState(VerosStateBase):
         raise AttributeError('Cannot access distributed variable %s since it was not retrieved' % attr)
 
     def __setattr__(self, attr, val):
+        if attr in self._read_only:
+            raise AttributeError('Cannot modify distributed variable %s since it was retrieved as read-only' % attr)
+
         if attr in self._gathered:
             return object.__setattr__(self, attr, val)
 
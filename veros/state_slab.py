@@ -0,0 +1,61 @@
+from .state import VerosStateBase
+
+
+class SlabVerosState(VerosStateBase):
+    """A proxy wrapper that restricts a state to a slab of rows (plus overlap),
+    as used by :func:`veros.threads.slab_parallel`.
+
+    Variables in ``outputs`` are private copies, all others are views into the parent state.
+    """
+    def __init__(self, parent_state, start, stop, outputs):
+        from . import runtime_state as rst
+        from .distributed import get_chunk_sizes, proc_rank_to_index
+
+        object.__setattr__(self, '_vs', parent_state)
+        object.__setattr__(self, '_slice', slice(start, stop + 4))
+        object.__setattr__(self, '_cache', {})
+
+        for var in outputs:
+            self._cache[var] = self._get_slab(var).copy()
+
+        # make sure that allocated arrays have the shape of the slab
+        chunks_x, chunks_y = get_chunk_sizes(parent_state)
+        chunks_y = list(chunks_y)
+        chunks_y[proc_rank_to_index(rst.proc_rank)[1]] = stop - start
+        object.__setattr__(self, 'chunk_sizes', (chunks_x, tuple(chunks_y)))
+
+    def _get_slab(self, attr):
+        from .threads import get_y_axis
+
+        arr = getattr(self._vs, attr)
+        axis = get_y_axis(self._vs.variables[attr].dims)
+        if axis is None:
+            return arr
+        return arr[(slice(None),) * axis + (self._slice,)]
+
+    def __getattribute__(self, attr):
+        if attr in ('_vs', '_slice', '_cache', '_get_slab', 'chunk_sizes'):
+            return object.__getattribute__(self, attr)
+
+        cache = self._cache
+        if attr in cache:
+            return cache[attr]
+
+        parent_state = self._vs
+        if attr not in parent_state.variables:
+            # not a variable: pass through
+            return parent_state.__getattribute__(attr)
+
+        cache[attr] = arr = self._get_slab(attr)
+        return arr
+
+    def __setattr__(self, attr, val):
+        if attr in self._vs.variables:
+            raise AttributeError('Cannot re-assign variable %s in a slab-parallel kernel' % attr)
+
+        return self._vs.__setattr__(attr, val)
+
+    def __repr__(self):
+        return '{}(parent_state={}, slice={})'.format(
+            self.__class__.__name__, repr(self._vs), self._slice
+        )
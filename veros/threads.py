@@ -0,0 +1,233 @@
+"""Thread-parallel execution of kernels within a process.
+
+Kernels decorated with :func:`slab_parallel` are split into slabs along the y-dimension,
+which are processed concurrently by a pool of ``num_threads`` threads (see
+:class:`veros.runtime.RuntimeSettings`). Like a process in a distributed run, every slab
+sees its own rows plus an overlap of 2 cells to each side, so every kernel that is safe for
+distributed execution without communication can be split this way.
+
+Since NumPy releases the GIL during most array operations, this allows to use several
+cores per process without the communication overhead of additional MPI processes.
+"""
+
+import collections
+import functools
+import inspect
+import threading
+
+from . import runtime_settings as rs, runtime_state as rst
+from .decorators import CONTEXT
+
+#: Slabs thinner than this many rows are not worth the overhead
+MIN_SLAB_SIZE = 4
+
+_POOL_LOCK = threading.Lock()
+_POOL = (None, 0)
+
+
+def _init_worker():
+    CONTEXT.is_dist_safe = True
+    CONTEXT.stack_level = 0
+    CONTEXT.is_slab_worker = True
+
+
+def get_thread_pool():
+    """Returns a thread pool with ``num_threads`` workers (created on first use)"""
+    global _POOL
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with _POOL_LOCK:
+        pool, pool_size = _POOL
+        if pool is None or pool_size != rs.num_threads:
+            if pool is not None:
+                pool.shutdown()
+            pool = ThreadPoolExecutor(
+                max_workers=rs.num_threads,
+                thread_name_prefix='veros-slab',
+                initializer=_init_worker
+            )
+            _POOL = (pool, rs.num_threads)
+
+    return pool
+
+
+def get_slab_bounds(num_rows, num_slabs):
+    """Splits ``num_rows`` rows into ``num_slabs`` contiguous slabs of (almost) equal size.
+
+    Returns:
+        List of (start, stop) tuples of row indices (without overlap).
+    """
+    from .distributed import get_even_chunk_sizes
+
+    bounds = []
+    start = 0
+    for size in get_even_chunk_sizes(num_rows, num_slabs):
+        bounds.append((start, start + size))
+        start += size
+    return bounds
+
+
+def _get_num_slabs(ny_local):
+    if rs.num_threads <= 1 or rs.backend != 'numpy':
+        return 1
+
+    if getattr(CONTEXT, 'is_slab_worker', False) or not CONTEXT.is_dist_safe:
+        # no nested parallelism, and no parallelism on gathered arrays
+        return 1
+
+    return max(1, min(rs.num_threads, ny_local // MIN_SLAB_SIZE))
+
+
+def get_y_axis(dims):
+    """Position of the y-dimension in the given dimensions (or None)"""
+    for axis, dim in enumerate(dims[:2]):
+        if dim in ('yt', 'yu'):
+            return axis
+    return None
+
+
+def _has_rows(arr, ny):
+    """Whether an argument declared to depend on y has all local rows as second dimension
+    (True), is broadcast along y (False), or only covers some of the rows (None)."""
+    if getattr(arr, 'ndim', 0) < 2 or arr.shape[1] == 1:
+        return False
+    if arr.shape[1] == ny + 4:
+        return True
+    return None
+
+
+def _get_write_slices(ny, start, stop):
+    """Rows of a slab result that are written back: its own rows, plus the outer overlap
+    at the edges of the local domain."""
+    lower = 0 if start == 0 else 2
+    upper = stop - start + (4 if stop == ny else 2)
+    return slice(start + lower, start + upper), slice(lower, upper)
+
+
+def slab_parallel(function=None, outputs=(), y_args=()):
+    """Decorator that splits a kernel into slabs along y and processes them in parallel
+    if ``num_threads`` is larger than 1.
+
+    All arguments in ``y_args`` and ``outputs`` (and the state's variables with y in their
+    dimensions) are passed to the kernel as views restricted to the current slab plus an
+    overlap of 2 rows. All other arguments are passed unchanged. The kernel may only
+    modify its output arrays, and arrays returned by it are assembled into the full result
+    (with y as second dimension).
+
+    Note:
+
+      Apply this decorator *on top* of :func:`veros.decorators.veros_method`. Kernels must
+      not communicate (e.g. call :func:`veros.core.utilities.enforce_boundaries`).
+
+    Arguments:
+        outputs: Names of arguments and state variables that are modified by the kernel.
+            Each slab operates on a private copy of these, of which only its own rows are
+            copied back.
+        y_args: Names of array arguments that have y as second dimension. Arguments with
+            fewer than 2 dimensions or a second dimension of length 1 are broadcast along
+            y and passed unchanged. If an argument only covers some of the rows, the
+            kernel is not split.
+
+    Example:
+       >>> @slab_parallel(outputs=['K_11'])
+       >>> @veros_method
+       >>> def my_kernel(vs):
+       >>>     vs.K_11[1:-1, 1:-1] = vs.K_iso[2:, 1:-1] - vs.K_iso[:-2, 1:-1]
+
+    """
+    if function is None:
+        return functools.partial(slab_parallel, outputs=outputs, y_args=y_args)
+
+    signature = inspect.signature(function)
+    first_arg = next(iter(signature.parameters))
+    output_args = [arg for arg in outputs if arg in signature.parameters]
+    output_vars = [arg for arg in outputs if arg not in signature.parameters]
+
+    for arg in y_args:
+        if arg not in signature.parameters or arg == first_arg:
+            raise ValueError('{} is not an array argument of {}'.format(arg, function.__name__))
+
+    y_args = list(y_args) + [arg for arg in output_args if arg not in y_args]
+
+    @functools.wraps(function)
+    def slab_parallel_wrapper(vs, *args, **kwargs):
+        from .distributed import get_chunk_size
+        from .state import VerosStateBase
+        from .state_slab import SlabVerosState
+
+        if not isinstance(vs, VerosStateBase):
+            return function(vs, *args, **kwargs)
+
+        ny = get_chunk_size(vs)[1]
+        num_slabs = _get_num_slabs(ny)
+
+        if num_slabs == 1:
+            return function(vs, *args, **kwargs)
+
+        bound_args = signature.bind(vs, *args, **kwargs)
+
+        is_sliced = {
+            name: _has_rows(bound_args.arguments[name], ny)
+            for name in y_args if name in bound_args.arguments
+        }
+
+        for name in output_args:
+            if not is_sliced.get(name):
+                raise ValueError('output argument {} does not depend on y'.format(name))
+
+        if any(sliced is None for sliced in is_sliced.values()):
+            # arguments that only cover some rows cannot be split
+            return function(vs, *args, **kwargs)
+
+        if not output_vars and not any(is_sliced.values()):
+            # nothing depends on y
+            return function(vs, *args, **kwargs)
+
+        for var in output_vars:
+            if get_y_axis(vs.variables[var].dims) is None:
+                raise ValueError('output variable {} does not depend on y'.format(var))
+
+        def run_slab(start, stop):
+            slab_args = collections.OrderedDict()
+            for name, val in bound_args.arguments.items():
+                if name == first_arg:
+                    val = SlabVerosState(vs, start, stop, output_vars)
+                elif is_sliced.get(name):
+                    val = val[:, start:stop + 4]
+                    if name in output_args:
+                        val = val.copy()
+                slab_args[name] = val
+
+            slab_bound_args = inspect.BoundArguments(signature, slab_args)
+            res = function(*slab_bound_args.args, **slab_bound_args.kwargs)
+            return res, [slab_args[name] for name in output_args], slab_args[first_arg]
+
+        bounds = get_slab_bounds(ny, num_slabs)
+        futures = [get_thread_pool().submit(run_slab, start, stop) for start, stop in bounds]
+        results = [future.result() for future in futures]
+
+        np = rst.backend_module
+        out = None
+
+        for (start, stop), (res, slab_outputs, slab_state) in zip(bounds, results):
+            idx_full, idx_slab = _get_write_slices(ny, start, stop)
+
+            for name, slab_arr in zip(output_args, slab_outputs):
+                bound_args.arguments[name][:, idx_full] = slab_arr[:, idx_slab]
+
+            for var in output_vars:
+                pre = (slice(None),) * get_y_axis(vs.variables[var].dims)
+                getattr(vs, var)[pre + (idx_full,)] = slab_state._cache[var][pre + (idx_slab,)]
+
+            if res is None:
+                continue
+
+            if out is None:
+                out = np.empty(res.shape[:1] + (ny + 4,) + res.shape[2:], dtype=res.dtype)
+
+            out[:, idx_full] = res[:, idx_slab]
+
+        return out
+
+    return slab_parallel_wrapper
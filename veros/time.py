@@ -23,3 +23,42 @@ def format_time(time_value, in_unit='seconds'):
     else:
         best_unit = 'seconds'
     return val_in_all_units[best_unit], best_unit
+
+
+#: Length of a month in days (of the 360-day model calendar)
+MONTH_LENGTH = YEAR_LENGTH / 12.
+
+# units that can be used in periods, in seconds
+PERIOD_UNITS = dict(X_TO_SECONDS, months=MONTH_LENGTH * X_TO_SECONDS['days'])
+
+
+def parse_period(period):
+    """Convert a period to seconds.
+
+    Periods are either given in seconds, or as a string of a number and a unit,
+    e.g. ``'6 hours'``, ``'1 month'``, or ``'10 years'``. Valid units are seconds,
+    minutes, hours, days, months, and years (of the 360-day model calendar, so
+    every month has 30 days).
+    """
+    if not isinstance(period, str):
+        return float(period or 0.)
+
+    parts = period.split()
+    if len(parts) == 1:
+        return float(parts[0])
+
+    try:
+        value, unit = parts
+        value = float(value)
+    except ValueError:
+        raise ValueError('invalid period "{}" (expected e.g. "6 hours")'.format(period))
+
+    unit = unit.lower()
+    if not unit.endswith('s'):
+        unit += 's'
+
+    if unit not in PERIOD_UNITS:
+        raise ValueError('unknown unit in period "{}" (must be one of {})'
+                         .format(period, ', '.join(sorted(PERIOD_UNITS))))
+
+    return value * PERIOD_UNITS[unit]
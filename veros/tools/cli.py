@@ -62,6 +62,10 @@ def cli(run):
                                         (default: false)
         -n, --num-proc INTEGER...       Number of processes in x and y dimension
                                         (requires execution via mpirun)
+        -t, --num-threads INTEGER       Number of threads per process for
+                                        slab-parallel kernels (default: 1)
+        --num-io-procs INTEGER          Number of additional processes dedicated
+                                        to writing output (default: 0)
         --help                          Show this message and exit.
 
     """
@@ -77,13 +81,17 @@ def cli(run):
                   help='Write a performance profile for debugging (default: false)')
     @click.option('-n', '--num-proc', nargs=2, default=[1, 1], type=click.INT,
                   help='Number of processes in x and y dimension')
+    @click.option('-t', '--num-threads', default=1, type=click.INT, envvar='VEROS_NUM_THREADS',
+                  help='Number of threads per process for slab-parallel kernels (default: 1)')
+    @click.option('--num-io-procs', default=0, type=click.INT, envvar='VEROS_NUM_IO_PROCS',
+                  help='Number of additional processes dedicated to writing output (default: 0)')
     @click.option('--slave', default=False, is_flag=True, hidden=True,
                   help='Indicates that this process is an MPI worker (for internal use)')
     @functools.wraps(run)
     def wrapped(*args, slave, **kwargs):
         from veros import runtime_settings, runtime_state
 
-        total_proc = kwargs['num_proc'][0] * kwargs['num_proc'][1]
+        total_proc = kwargs['num_proc'][0] * kwargs['num_proc'][1] + kwargs['num_io_procs']
 
         if total_proc > 1 and runtime_state.proc_num == 1 and not slave:
             from mpi4py import MPI
@@ -110,7 +118,7 @@ def cli(run):
 
         kwargs['override'] = dict(kwargs['override'])
 
-        for setting in ('backend', 'profile_mode', 'num_proc', 'loglevel'):
+        for setting in ('backend', 'profile_mode', 'num_proc', 'num_threads', 'num_io_procs', 'loglevel'):
             setattr(runtime_settings, setting, kwargs.pop(setting))
 
         try:
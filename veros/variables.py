@@ -1,6 +1,6 @@
 from collections import OrderedDict
 
-from . import veros_method, runtime_settings
+from . import veros_method
 
 
 class Variable:
@@ -78,7 +78,7 @@ ZETA_HOR_ERODED = lambda vs: vs.maskZ[:, :, -1] | vs.boundary_mask.sum(axis=2)
 
 
 def get_dimensions(vs, grid, include_ghosts=True, local=True):
-    px, py = runtime_settings.num_proc
+    from .distributed import get_chunk_size
 
     dimensions = {
         'xt': vs.nx,
@@ -94,11 +94,12 @@ def get_dimensions(vs, grid, include_ghosts=True, local=True):
     }
 
     if local:
+        nx_local, ny_local = get_chunk_size(vs)
         dimensions.update({
-            'xt': dimensions['xt'] // px,
-            'xu': dimensions['xu'] // px,
-            'yt': dimensions['yt'] // py,
-            'yu': dimensions['yt'] // py
+            'xt': nx_local,
+            'xu': nx_local,
+            'yt': ny_local,
+            'yu': ny_local
         })
 
     if include_ghosts: